@@ -1,13 +1,13 @@
+import os
 import streamlit as st
 import json
 import pandas as pd
 from datetime import datetime
 
-from rag.loader import load_regulatory_documents
-from rag.retriever import build_vector_store, retrieve_relevant_context
-from llm.generator import ReportGenerator
 from core.schemas import COREPReport
+from core.templates import validate_reports
 from utils._init_ import validate_scenario, format_currency, create_audit_log
+from utils.tracing import span_rows, trace, tracer
 
 # Page config
 st.set_page_config(
@@ -16,8 +16,58 @@ st.set_page_config(
     layout="wide"
 )
 
-if 'report_history' not in st.session_state:
-    st.session_state.report_history = []
+# URL of a running service.py; empty runs the pipeline in this process
+SERVICE_URL = os.getenv("COREP_SERVICE_URL", "")
+
+@st.cache_resource(show_spinner=False)
+def get_service_client():
+    from utils.client import ServiceClient
+    return ServiceClient(SERVICE_URL)
+
+@st.cache_resource(show_spinner=False)
+def get_vector_store():
+    """
+    Load the persisted FAISS index once per process.
+    Rebuilt on disk only when the regulatory sources change.
+    Imported here so the UI renders before torch and FAISS are loaded.
+    """
+    from rag.retriever import load_or_build_vector_store
+    return load_or_build_vector_store()
+
+@st.cache_resource(show_spinner=False)
+def get_generator():
+    """One ReportGenerator per process, sharing its LLM client across reruns."""
+    from llm.generator import ReportGenerator
+    return ReportGenerator()
+
+def retrieve(question):
+    """Context for question as {"text", "tokens", "tokens_saved"}, from the service when configured."""
+    if SERVICE_URL:
+        return get_service_client().retrieve(question)
+    from rag.retriever import retrieve_context
+    result = retrieve_context(get_vector_store(), question)
+    return {"text": result.text, "tokens": result.tokens, "tokens_saved": result.tokens_saved}
+
+def generate_report(context, scenario, on_field):
+    if SERVICE_URL:
+        return get_service_client().generate_report(context, scenario, on_field=on_field)
+    return get_generator().generate_report(context, scenario, on_field=on_field)
+
+def field_row(field):
+    """Table row for one extracted field."""
+    return {
+        "Field": field.field_code,
+        "Description": field.description,
+        "Value": format_currency(field.value) if field.value is not None else "Not specified",
+        "Confidence": f"{field.confidence:.0%}",
+        "Source": field.source_rule[:50] + "..." if len(field.source_rule) > 50 else field.source_rule
+    }
+
+@st.cache_resource(show_spinner=False)
+def get_history_store():
+    """Persistent report history shared by every session (COREP_HISTORY_PATH)."""
+    from core.history import HistoryStore
+    return HistoryStore()
 
 # Title and description
 st.title("🏛️ COREP Own Funds Reporting Assistant")
@@ -37,6 +87,8 @@ with st.sidebar:
         "Complex Scenario": "Post-regulation adjustments: CET1 = 180M (after 20M goodwill deduction), AT1 = 65M, Tier 2 instruments = 90M with 5-year maturity."
     }
     
+    show_trace = st.checkbox("Show pipeline trace", help="Per-stage timings, tokens and cache hits of the last report")
+    
     selected_example = st.selectbox("Load example:", list(examples.keys()))
     if st.button("Use This Example"):
         st.session_state.example_scenario = examples[selected_example]
@@ -76,6 +128,12 @@ with col2:
         placeholder="E.g., 'What are the CET1, AT1, and Tier 2 amounts?'"
     )
     
+    entity_col, date_col = st.columns(2)
+    with entity_col:
+        entity = st.text_input("Reporting entity", value="My Bank")
+    with date_col:
+        reference_date = st.date_input("Reference date")
+    
     st.info("💡 Include specific field names (CET1, AT1, Tier 2) for better results")
 
 st.divider()
@@ -87,15 +145,19 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
         st.error(f"⚠️ {message}")
         st.stop()
     
-    with st.spinner("🔄 Processing... Retrieving regulations and extracting values"):
+    with st.spinner("🔄 Processing... Retrieving regulations and extracting values"), trace("report_request") as request_span:
+        st.session_state.last_trace_id = request_span.trace_id
+        st.session_state.service_trace_ids = []
         
         try:
-            docs = load_regulatory_documents()
-            db = build_vector_store(docs)
-            context = retrieve_relevant_context(db, question)
+            retrieved = retrieve(question)
+            context = retrieved["text"]
+            if retrieved.get("trace_id"):
+                st.session_state.service_trace_ids.append(retrieved["trace_id"])
             
             # Show context in expander
             with st.expander("📚 Regulatory Context Retrieved", expanded=False):
+                st.caption(f"{retrieved['tokens']} tokens ({retrieved['tokens_saved']} saved by merging and deduplication)")
                 st.text(context[:1000] + ("..." if len(context) > 1000 else ""))
                 
         except Exception as e:
@@ -103,8 +165,18 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
             st.stop()
         
         try:
-            generator = ReportGenerator()
-            result = generator.generate_report(context, scenario)
+            # Stream fields into a live table as the LLM produces them
+            live_table = st.empty()
+            streamed_rows = []
+            
+            def show_field(field):
+                streamed_rows.append(field_row(field))
+                live_table.dataframe(pd.DataFrame(streamed_rows), use_container_width=True, hide_index=True)
+            
+            result = generate_report(context, scenario, show_field)
+            live_table.empty()
+            if result.get("trace_id"):
+                st.session_state.service_trace_ids.append(result["trace_id"])
             
             # Handle errors
             if "error" in result:
@@ -123,6 +195,10 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
             
             # Get the report
             report = result["report"]
+            if result.get("method") == "rules":
+                st.caption("⚡ Values stated unambiguously; extracted by rules without an LLM call")
+            elif result.get("cached"):
+                st.caption(f"⚡ Served from response cache ({result['cache_level']} match)")
             
             # Check if report is empty
             if report.is_empty:
@@ -144,15 +220,7 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
             st.subheader("📋 Extracted COREP Report")
             
             # Create table
-            table_data = []
-            for field in report.fields:
-                table_data.append({
-                    "Field": field.field_code,
-                    "Description": field.description,
-                    "Value": format_currency(field.value) if field.value is not None else "Not specified",
-                    "Confidence": f"{field.confidence:.0%}",
-                    "Source": field.source_rule[:50] + "..." if len(field.source_rule) > 50 else field.source_rule
-                })
+            table_data = [field_row(field) for field in report.fields]
             
             df = pd.DataFrame(table_data)
             st.dataframe(df, use_container_width=True, hide_index=True)
@@ -171,25 +239,8 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
                 st.metric("Average Confidence", f"{avg_confidence:.0%}")
             
             with col3:
-                # Basic validation
-                errors = []
-                field_map = {f.field_code: f for f in report.fields}
-                
-                # Check for negative values
-                for field in report.fields:
-                    if field.value is not None and field.value < 0:
-                        errors.append(f"{field.field_code} cannot be negative")
-                
-                # Check total calculation
-                cet1 = field_map.get("OF_010")
-                at1 = field_map.get("OF_020")
-                tier2 = field_map.get("OF_030")
-                total = field_map.get("OF_040")
-                
-                if all(f and f.value is not None for f in [cet1, at1, tier2, total]):
-                    expected = cet1.value + at1.value + tier2.value
-                    if abs(total.value - expected) > 0.01:
-                        errors.append(f"Total ({total.value}) doesn't match sum ({expected})")
+                # Rules declared for the template in core.templates
+                errors = [failure["message"] for failure in validate_reports({report.template: report})]
                 
                 if errors:
                     st.error(f"{len(errors)} issues found")
@@ -234,44 +285,61 @@ if st.button("🚀 Generate COREP Report", type="primary", use_container_width=T
                     use_container_width=True
                 )
             
-            # Add to history
-            st.session_state.report_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "scenario": scenario[:100] + "...",
-                "question": question,
-                "confidence": avg_confidence,
-                "fields_extracted": extracted_count
-            })
+            # Add to the persistent history
+            get_history_store().add(
+                report, entity.strip() or "Unnamed entity", reference_date, scenario=scenario, method=result.get("method")
+            )
             
         except Exception as e:
             st.error(f"❌ An unexpected error occurred: {str(e)}")
             st.exception(e)
 
-# History section
-if st.session_state.report_history:
+# Debug panel: spans of this session's last report request, and of the
+# service requests it made when running as a client
+if show_trace and st.session_state.get("last_trace_id"):
+    rows = span_rows(tracer.get_trace(st.session_state.last_trace_id))
+    for trace_id in st.session_state.get("service_trace_ids", []):
+        rows.extend(get_service_client().trace_rows(trace_id))
+    if rows:
+        with st.expander("🔍 Pipeline Trace", expanded=True):
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+# History section: stored submissions of one entity, across sessions
+history = get_history_store()
+history_entities = history.entities()
+if history_entities:
     st.divider()
-    st.subheader("📜 Generation History")
+    st.subheader("📜 Report History")
     
-    history_df = pd.DataFrame(st.session_state.report_history)
+    selected_entity = st.selectbox(
+        "Entity:", history_entities,
+        index=history_entities.index(entity) if entity in history_entities else 0
+    )
+    movements = history.movements(entity=selected_entity)
     st.dataframe(
-        history_df.tail(5),  # Show last 5 entries
+        movements[["reference_date", "created_at", "method", "confidence", "OF_010", "OF_020", "OF_030", "OF_040"]].tail(20),
         use_container_width=True,
         hide_index=True,
         column_config={
-            "timestamp": "Time",
-            "scenario": "Scenario",
-            "question": "Question",
-            "confidence": st.column_config.NumberColumn(
-                "Confidence",
-                format="%.0f%%"
-            ),
-            "fields_extracted": "Fields"
+            "reference_date": "Reference Date",
+            "created_at": "Generated",
+            "method": "Method",
+            "confidence": st.column_config.NumberColumn("Confidence", format="%.2f")
         }
     )
     
-    if st.button("Clear History"):
-        st.session_state.report_history = []
-        st.rerun()
+    if len(movements) > 1:
+        with st.expander("📈 Period-over-Period Movements (%)"):
+            changes = movements.set_index("reference_date")[[f"{code}_pct" for code in ("OF_010", "OF_020", "OF_030", "OF_040")]]
+            changes.columns = ["OF_010", "OF_020", "OF_030", "OF_040"]
+            st.dataframe((changes.iloc[1:] * 100).round(1).tail(20), use_container_width=True)
+    
+    # Unusual movements across every entity
+    outliers = history.outliers()
+    if len(outliers):
+        with st.expander(f"⚠️ Unusual Movements ({len(outliers)})"):
+            st.caption("Changes far from the typical movement of the same field across all entities")
+            st.dataframe(outliers, use_container_width=True, hide_index=True)
 
 # Footer
 st.divider()
@@ -0,0 +1,224 @@
+"""
+Headless batch extraction of COREP reports.
+
+Usage:
+    python batch.py scenarios.jsonl -o results.jsonl
+    python batch.py scenarios.csv -o results.jsonl --concurrency 16
+
+Each input row needs a "scenario" and may have "id" and "question".
+Results are appended to the output file as they complete; rerunning the
+same command skips rows whose id is already in the output. With
+--retry-errors, failed rows are redone and their old error records are
+removed from the output once the run finishes.
+With --history, reports are also stored in the report history
+(core.history) under the row's "entity" and "reference_date".
+"""
+import os
+import csv
+import sys
+import json
+import asyncio
+import argparse
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Set
+
+from rag.loader import DEFAULT_DATA_DIR
+from rag.retriever import load_or_build_vector_store, retrieve_relevant_context
+from core.history import HISTORY_PATH, HistoryStore
+from core.templates import TEMPLATES
+from llm.generator import DEFAULT_QUESTION, MAX_CONCURRENCY, ReportGenerator
+from utils._init_ import validate_scenario
+
+
+def iter_scenarios(path: str) -> Iterator[Dict]:
+    """Stream rows from a JSONL or CSV file, assigning ids to rows without one."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, 1):
+            row = dict(row)
+            row["id"] = str(row.get("id") or f"row-{number}")
+            yield row
+
+
+def read_checkpoint(output_path: str, retry_errors: bool = False) -> Set[str]:
+    """Ids already written to the output file; errored rows too unless retry_errors."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Truncated last line from an interrupted run
+                continue
+            if retry_errors and "error" in record:
+                continue
+            done.add(record["id"])
+    return done
+
+
+def truncate_partial_line(output_path: str) -> None:
+    """
+    Cut a record left half-written by an interrupted run, so the next
+    appended record starts on a line of its own.
+    """
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            block = f.read(position - start)
+            if position == end and block.endswith(b"\n"):
+                return
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def compact_output(output_path: str) -> int:
+    """
+    Rewrite the output file keeping only the last record per id, so rows
+    redone with --retry-errors do not leave their old error record behind.
+    Returns the number of records removed.
+    """
+    last = {}
+    with open(output_path, encoding="utf-8") as f:
+        for number, line in enumerate(f):
+            try:
+                last[json.loads(line)["id"]] = number
+            except ValueError:
+                continue
+    keep = set(last.values())
+    removed = 0
+    tmp_path = f"{output_path}.tmp-{os.getpid()}"
+    with open(output_path, encoding="utf-8") as f, open(tmp_path, "w", encoding="utf-8") as out:
+        for number, line in enumerate(f):
+            if number in keep:
+                out.write(line)
+            else:
+                removed += 1
+    os.replace(tmp_path, output_path)
+    return removed
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = MAX_CONCURRENCY,
+    data_dir: str = DEFAULT_DATA_DIR,
+    retry_errors: bool = False,
+    templates: Optional[List[str]] = None,
+    history: Optional[HistoryStore] = None
+) -> Dict[str, int]:
+    """
+    Generate reports for every pending row, writing each result as soon
+    as it completes. Retrieval runs once per distinct question.
+    With several templates, each row fills all of them in one LLM call.
+    Reports are also added to history when given.
+    Returns counts of processed, skipped and failed rows.
+    """
+    multi = bool(templates) and list(templates) != ["C 01.00"]
+    truncate_partial_line(output_path)
+    done = read_checkpoint(output_path, retry_errors)
+    db = load_or_build_vector_store(data_dir)
+    generator = ReportGenerator()
+    contexts = {}
+    counts = {"processed": 0, "skipped": 0, "failed": 0}
+
+    async def process(row):
+        scenario = row.get("scenario", "")
+        is_valid, message = validate_scenario(scenario)
+        if not is_valid:
+            return row, {"error": message}
+        if multi:
+            return row, await generator.agenerate_reports(contexts[row["question"]], scenario, templates)
+        return row, await generator.agenerate_report(contexts[row["question"]], scenario)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        def write(row, result):
+            record = {"id": row["id"], "input": row}
+            if "error" in result:
+                record["error"] = result["error"]
+                counts["failed"] += 1
+            elif "reports" in result:
+                record["reports"] = {code: report.model_dump() for code, report in result["reports"].items()}
+                record["violations"] = result["violations"]
+            else:
+                record["report"] = result["report"].model_dump()
+            if history is not None and "error" not in result:
+                reports = result.get("reports") or {result["report"].template: result["report"]}
+                try:
+                    history.add_many(
+                        list(reports.values()),
+                        [row.get("entity") or "Unnamed entity"] * len(reports),
+                        [row.get("reference_date") or date.today()] * len(reports),
+                        [row["scenario"]] * len(reports),
+                        [result.get("method")] * len(reports)
+                    )
+                except ValueError as e:
+                    record["history_error"] = f"Not stored in history: {str(e)}"
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            counts["processed"] += 1
+
+        pending = set()
+        for row in iter_scenarios(input_path):
+            if row["id"] in done:
+                counts["skipped"] += 1
+                continue
+            row["question"] = row.get("question") or DEFAULT_QUESTION
+            if row["question"] not in contexts:
+                contexts[row["question"]] = retrieve_relevant_context(db, row["question"])
+
+            pending.add(asyncio.ensure_future(process(row)))
+            if len(pending) >= concurrency:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    write(*task.result())
+
+        for task in asyncio.as_completed(pending):
+            write(*await task)
+
+    if retry_errors and counts["processed"]:
+        compact_output(output_path)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk COREP extraction from a JSONL or CSV scenario file.")
+    parser.add_argument("input", help="JSONL or CSV file with a 'scenario' column")
+    parser.add_argument("-o", "--output", required=True, help="Output JSONL file, also used as checkpoint")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="Concurrent LLM calls")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Regulatory documents directory")
+    parser.add_argument("--retry-errors", action="store_true", help="Redo rows that previously failed")
+    parser.add_argument(
+        "--templates", nargs="+", default=["C 01.00"], choices=list(TEMPLATES),
+        help="COREP templates to fill, e.g. --templates 'C 01.00' 'C 03.00'"
+    )
+    parser.add_argument(
+        "--history", nargs="?", const=HISTORY_PATH, metavar="PATH",
+        help="Also store reports in the report history (default path: COREP_HISTORY_PATH)"
+    )
+    args = parser.parse_args(argv)
+
+    history = HistoryStore(args.history) if args.history else None
+    counts = asyncio.run(run_batch(
+        args.input, args.output, args.concurrency, args.data_dir, args.retry_errors, args.templates, history
+    ))
+    print(f"Processed {counts['processed']} rows ({counts['failed']} failed), skipped {counts['skipped']} already done")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
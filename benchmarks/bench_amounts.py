@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for llm.amounts.find_amounts.
+
+    python -m benchmarks.bench_amounts
+
+Times extraction on board-pack style text from 1 KB to 64 KB and prints
+microseconds per KB, which should stay flat (linear-time matching).
+The previous per-call lazy regex loop is timed alongside for comparison;
+on commentary where labels have no amounts its cost per KB grows with size.
+"""
+import re
+import timeit
+
+from llm.amounts import find_amounts
+
+LEGACY_PATTERNS = {
+    'cet1': r'(?:CET1|Common Equity Tier 1|common equity).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
+    'at1': r'(?:AT1|Additional Tier 1|additional tier).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
+    'tier2': r'(?:Tier 2|tier two).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
+    'total': r'(?:Total|total own funds|total capital).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
+}
+
+PARAGRAPHS = [
+    "The Board reviewed the capital position at the quarter end. ",
+    "CET1 capital of £1,250 million was reported after regulatory deductions. ",
+    "Liquidity remained within risk appetite and the funding plan is on track for the 5-year horizon. ",
+    "Additional Tier 1 instruments of €400 million were issued in March. ",
+    "Tier 2 subordinated debt stands at 620M with maturities beyond 2030. ",
+    "Credit risk weighted assets increased by 3.2% owing to mortgage growth in the period. ",
+]
+
+
+def legacy_extract(text):
+    amounts = {}
+    for key, pattern in LEGACY_PATTERNS.items():
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            amounts[key] = float(matches[-1].replace(',', ''))
+    return amounts
+
+
+# Labels with no amount after them: the legacy lazy spans rescan the rest
+# of the text from every label, which is quadratic
+COMMENTARY = [
+    "The CET1 ratio and Tier 2 headroom were discussed; no new issuance is planned. ",
+    "Total capital buffers remain above the combined buffer requirement. ",
+]
+
+
+def board_pack(size_bytes, paragraphs=PARAGRAPHS):
+    text, i = [], 0
+    while sum(map(len, text)) < size_bytes:
+        text.append(paragraphs[i % len(paragraphs)])
+        i += 1
+    return "".join(text)
+
+
+def run(title, paragraphs):
+    print(title)
+    print(f"{'size_kb':>8} {'find_amounts_us':>16} {'us_per_kb':>10} {'legacy_us':>12} {'legacy_us_per_kb':>17}")
+    for size_kb in (1, 2, 4, 8, 16, 32, 64):
+        text = board_pack(size_kb * 1024, paragraphs)
+        runs = max(3, 2000 // size_kb)
+        new = min(timeit.repeat(lambda: find_amounts(text), number=runs, repeat=3)) / runs * 1e6
+        legacy = min(timeit.repeat(lambda: legacy_extract(text), number=3, repeat=3)) / 3 * 1e6
+        print(f"{size_kb:>8} {new:>16.1f} {new / size_kb:>10.1f} {legacy:>12.1f} {legacy / size_kb:>17.1f}")
+    print()
+
+
+def main():
+    run("Board pack with amounts", PARAGRAPHS)
+    run("Commentary without amounts", COMMENTARY)
+
+
+if __name__ == "__main__":
+    main()
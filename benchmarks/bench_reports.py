@@ -0,0 +1,62 @@
+"""
+Benchmark for core.batch.ReportBatch against lists of COREPReport models.
+
+    python -m benchmarks.bench_reports
+
+Compares memory held (tracemalloc) and JSONL serialisation throughput for
+batches of C 01.00 reports: per-report dict + json.dumps (the old to_json
+path), per-report model_dump_json, and ReportBatch.to_jsonl.
+Parquet export is timed when pyarrow is installed.
+"""
+import io
+import json
+import os
+import time
+import tempfile
+import tracemalloc
+
+from benchmarks.bench_validation import synthetic_reports
+from core.batch import ReportBatch
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 1e6
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    try:
+        import pyarrow  # noqa: F401
+        has_arrow = True
+    except ImportError:
+        has_arrow = False
+
+    header = f"{'reports':>8} {'models_mb':>10} {'batch_mb':>9} {'dict_rps':>9} {'models_rps':>11} {'batch_rps':>10}"
+    print(header + (f" {'parquet_rps':>12}" if has_arrow else ""))
+    for n in (1000, 10000, 50000):
+        reports, models_mb = measure(lambda: synthetic_reports(n))
+        batch, batch_mb = measure(lambda: ReportBatch.from_reports(reports))
+
+        dict_s = timed(lambda: io.StringIO().write("".join(json.dumps(r.model_dump()) + "\n" for r in reports)))
+        models_s = timed(lambda: io.StringIO().write("".join(r.model_dump_json() + "\n" for r in reports)))
+        batch_s = timed(lambda: batch.to_jsonl(io.StringIO()))
+        line = f"{n:>8} {models_mb:>10.1f} {batch_mb:>9.1f} {n / dict_s:>9.0f} {n / models_s:>11.0f} {n / batch_s:>10.0f}"
+
+        if has_arrow:
+            with tempfile.TemporaryDirectory() as tmp:
+                parquet_s = timed(lambda: batch.to_parquet(os.path.join(tmp, "reports.parquet")))
+            line += f" {n / parquet_s:>12.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
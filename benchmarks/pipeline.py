@@ -0,0 +1,237 @@
+"""
+End-to-end pipeline benchmark.
+
+    python -m benchmarks.pipeline --scale 1 10 100 --scenarios 500
+    python -m benchmarks.pipeline --embeddings hash -o results.json --compare baseline.json
+
+Generates synthetic corpora (benchmarks.synthetic) and times each stage
+separately:
+- load_split: process-pool loading and splitting of the corpus
+- embedding: chunk embedding (the sentence-transformers model, or a
+  hashed bag of words with --embeddings hash for offline runs)
+- index_build: FAISS index of the configured COREP_INDEX_TYPE plus BM25
+- query: hybrid retrieval and context assembly, caches cleared
+- extraction: find_amounts per scenario
+- generation: ReportGenerator against the replay backend, sequentially
+  and at --concurrency with --llm-latency per call
+- validation: vectorised RuleEngine and per-report validate_reports
+
+Each stage reports items, throughput, p50/p95/p99 latency where items
+are timed one by one, and the peak RSS of the process so far. Results
+are written as JSON with the git commit; --compare prints the change of
+every metric against an earlier results file.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.synthetic import generate_corpus, generate_queries, generate_scenarios
+from core.templates import validate_reports
+from core.validation import RuleEngine
+from llm.amounts import find_amounts
+from llm.backends import ReplayChatModel
+from llm.generator import ReportGenerator
+from rag import retriever
+from rag.ann import build_index
+from rag.embeddings import EMBEDDING_MODEL, CachedEmbeddings
+from rag.loader import LOADER_WORKERS, iter_chunk_batches
+from rag.sparse import SparseIndex
+
+HASH_DIM = 384
+
+
+class HashEmbeddings(CachedEmbeddings):
+    """Hashed bag-of-words vectors: deterministic, offline and model-free."""
+
+    def __init__(self, dim: int = HASH_DIM):
+        super().__init__(model_name=f"hash-{dim}")
+        self.dim = dim
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def stage_result(items: int, total_s: float, latencies_ms: Optional[List[float]] = None) -> Dict:
+    result = {
+        "items": items,
+        "total_s": round(total_s, 4),
+        "throughput_per_s": round(items / total_s, 2) if total_s > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if latencies_ms:
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        result.update({"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)})
+    return result
+
+
+def time_each(items, fn: Callable) -> Dict:
+    """Run fn on every item, timing each call."""
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        began = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - began) * 1000)
+    return stage_result(len(latencies), time.perf_counter() - start, latencies)
+
+
+def run_scale(scale: int, args, embeddings: CachedEmbeddings) -> Dict:
+    stages = {}
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        generate_corpus(corpus_dir, scale)
+
+        start = time.perf_counter()
+        chunks = [chunk for batch, _ in iter_chunk_batches(corpus_dir, workers=args.workers) for chunk in batch]
+        stages["load_split"] = stage_result(len(chunks), time.perf_counter() - start)
+
+    texts = [chunk.page_content for chunk in chunks]
+    start = time.perf_counter()
+    vectors = embeddings.embed_array(texts)
+    stages["embedding"] = stage_result(len(texts), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ids = [str(i) for i in range(len(chunks))]
+    db = FAISS.from_embeddings(zip(texts, vectors), embeddings, metadatas=[c.metadata for c in chunks], ids=ids)
+    db.index = build_index(vectors)
+    db.sparse_index = SparseIndex.build(zip(ids, texts))
+    db.index_version = f"bench-{scale}"
+    stages["index_build"] = stage_result(len(chunks), time.perf_counter() - start)
+
+    def query(text):
+        retriever._retrieval_cache.clear()
+        retriever._query_embedding_cache.clear()
+        retriever.retrieve_context(db, text)
+
+    stages["query"] = time_each(generate_queries(args.queries, args.seed), query)
+    return stages
+
+
+def run_generation(args) -> Dict:
+    stages = {}
+    scenarios = generate_scenarios(args.scenarios, args.seed)
+    context = "--- Excerpt from data/regulatory/pra_crr_extract.txt ---\nARTICLE 72 - OWN FUNDS"
+
+    stages["extraction"] = time_each(scenarios, find_amounts)
+
+    generator = ReportGenerator(llm=ReplayChatModel(), rules_first=False, cache=None)
+    reports = []
+    stages["generation"] = time_each(scenarios, lambda s: reports.append(generator.generate_report(context, s)))
+    failed = sum("error" in result for result in reports)
+    stages["generation"]["failed"] = failed
+
+    slow = ReportGenerator(llm=ReplayChatModel(latency=args.llm_latency), rules_first=False, cache=None)
+    start = time.perf_counter()
+    asyncio.run(slow.generate_many(scenarios, context, max_concurrency=args.concurrency))
+    stages["generation_concurrent"] = stage_result(len(scenarios), time.perf_counter() - start)
+    stages["generation_concurrent"].update({"concurrency": args.concurrency, "llm_latency_s": args.llm_latency})
+
+    valid = [result["report"] for result in reports if "report" in result]
+    engine = RuleEngine.from_templates(["C 01.00"])
+    start = time.perf_counter()
+    engine.evaluate_reports(valid)
+    stages["validation"] = stage_result(len(valid), time.perf_counter() - start)
+    stages["validation_per_report"] = time_each(valid, lambda report: validate_reports({report.template: report}))
+    return stages
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict) -> None:
+    """Print the relative change of every shared numeric metric."""
+    print(f"\nChange against baseline {baseline.get('commit') or ''}")
+    for section, stages in results["runs"].items():
+        for stage, metrics in stages.items():
+            before = baseline.get("runs", {}).get(section, {}).get(stage, {})
+            for metric in ("throughput_per_s", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+                old, new = before.get(metric), metrics.get(metric)
+                if old and new is not None:
+                    print(f"{section:>12} {stage:<22} {metric:<17} {old:>12} -> {new:<12} {100 * (new - old) / old:+.1f}%")
+
+
+def print_stages(section: str, stages: Dict) -> None:
+    print(f"\n{section}")
+    print(f"{'stage':<22} {'items':>7} {'total_s':>9} {'per_s':>11} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'rss_mb':>8}")
+    for stage, m in stages.items():
+        print(
+            f"{stage:<22} {m['items']:>7} {m['total_s']:>9.3f} {m['throughput_per_s'] or 0:>11.1f} "
+            f"{m.get('p50_ms', float('nan')):>9.3f} {m.get('p95_ms', float('nan')):>9.3f} "
+            f"{m.get('p99_ms', float('nan')):>9.3f} {m['peak_rss_mb']:>8.1f}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the COREP pipeline.")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100], help="Corpus sizes, multiples of data/regulatory")
+    parser.add_argument("--scenarios", type=int, default=500, help="Synthetic scenarios for extraction, generation, validation")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per corpus size")
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model", help="Real model or offline hashed vectors")
+    parser.add_argument("--workers", type=int, default=LOADER_WORKERS, help="Loader processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent fake LLM calls")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per fake LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmarks/results/pipeline.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    embeddings = HashEmbeddings() if args.embeddings == "hash" else CachedEmbeddings(EMBEDDING_MODEL)
+    runs = {}
+    for scale in args.scale:
+        runs[f"corpus_{scale}x"] = run_scale(scale, args, embeddings)
+        print_stages(f"corpus_{scale}x", runs[f"corpus_{scale}x"])
+    runs["scenarios"] = run_generation(args)
+    print_stages("scenarios", runs["scenarios"])
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {**vars(args), "embedding_model": embeddings.model_name},
+        "runs": runs,
+    }
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
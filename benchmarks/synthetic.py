@@ -0,0 +1,85 @@
+"""
+Synthetic inputs for the pipeline benchmark.
+
+Scenarios follow the app's example scenarios (complete, partial, with
+calculation, complex) with random amounts, currencies and wording.
+Corpora are copies of data/regulatory scaled 1x to 1000x, with article
+numbers and field codes shifted per copy so chunks are not identical.
+"""
+import os
+import re
+import random
+from typing import List
+
+from rag.loader import DEFAULT_DATA_DIR, list_source_files
+
+CURRENCIES = [("£", " million"), ("€", "M"), ("", " million GBP"), ("", " million euros"), ("$", "m")]
+
+SCENARIO_TEMPLATES = [
+    # Simple complete
+    "Our bank has CET1 capital of {cet1}, AT1 capital of {at1}, and Tier 2 capital of {tier2}.",
+    # Partial information
+    "We have Common Equity Tier 1 of {cet1}. Additional Tier 1 instruments are worth {at1}.",
+    # With calculation
+    "CET1 is {cet1} after deductions. AT1 capital instruments total {at1}. Tier 2 is {tier2}.",
+    # Complex
+    "Post-regulation adjustments: CET1 = {cet1} (after {deduction} goodwill deduction), AT1 = {at1}, "
+    "Tier 2 instruments = {tier2} with 5-year maturity.",
+    # Complete with total
+    "CET1 capital of {cet1}, AT1 of {at1} and Tier 2 of {tier2}, giving total own funds of {total}.",
+]
+
+
+def _amount(value: float, style) -> str:
+    prefix, suffix = style
+    return f"{prefix}{value:,g}{suffix}"
+
+
+def generate_scenarios(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    scenarios = []
+    for i in range(n):
+        style = rng.choice(CURRENCIES)
+        values = {key: round(rng.uniform(5, 2000), rng.choice([0, 1])) for key in ("cet1", "at1", "tier2", "deduction")}
+        values["total"] = values["cet1"] + values["at1"] + values["tier2"]
+        template = SCENARIO_TEMPLATES[i % len(SCENARIO_TEMPLATES)]
+        scenarios.append(template.format(**{key: _amount(value, style) for key, value in values.items()}))
+    return scenarios
+
+
+def generate_queries(n: int, seed: int = 0) -> List[str]:
+    """Distinct retrieval questions, some naming articles or field codes."""
+    rng = random.Random(seed)
+    topics = ["CET1 capital", "Additional Tier 1 instruments", "Tier 2 subordinated debt",
+              "total own funds", "deductions from CET1", "goodwill and intangible assets"]
+    forms = ["What is {topic}?", "How should {topic} be reported?", "Article {article} {topic}",
+             "Which row holds {topic}? OF_0{row}0", "Extract {topic} for COREP Own Funds reporting ({i})"]
+    return [
+        rng.choice(forms).format(topic=rng.choice(topics), article=rng.choice([26, 36, 51, 61, 72]), row=rng.randint(1, 4), i=i)
+        for i in range(n)
+    ]
+
+
+def generate_corpus(out_dir: str, scale: int, data_dir: str = DEFAULT_DATA_DIR) -> List[str]:
+    """
+    Write scale copies of the regulatory sources to out_dir/copy_<n>/.
+    Article numbers and field codes are offset per copy. Returns the paths.
+    """
+    sources = []
+    for path in list_source_files(data_dir):
+        with open(path, encoding="utf-8") as f:
+            sources.append((os.path.basename(path), f.read()))
+
+    paths = []
+    for copy in range(scale):
+        directory = os.path.join(out_dir, f"copy_{copy:04d}")
+        os.makedirs(directory, exist_ok=True)
+        for name, text in sources:
+            if copy:
+                text = re.sub(r"(ARTICLE|Article) (\d+)", lambda m: f"{m.group(1)} {int(m.group(2)) + 100 * copy}", text)
+                text = re.sub(r"\bOF_(\d{3})\b", lambda m: f"OF_{copy % 100:02d}{m.group(1)[-1]}", text)
+            path = os.path.join(directory, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            paths.append(path)
+    return paths
@@ -0,0 +1,218 @@
+"""
+Columnar form of many COREP reports for bulk runs.
+
+COREPReport/COREPField validate every field and keep one Python object
+per field, which is the right shape for a single report in the app but
+costs memory and time for tens of thousands of reports. ReportBatch
+holds the same data as a handful of NumPy arrays (one row per report,
+one column per field code); reports are validated once, when they are
+parsed, and the batch is trusted afterwards.
+"""
+from json.encoder import encode_basestring
+from typing import IO, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pydantic_core import to_json
+
+from core.schemas import COREPField, COREPReport
+
+# Rows converted at a time by iter_json, bounding the encoded cells held
+JSON_BLOCK = 4096
+
+
+def _json_numbers(column: np.ndarray) -> List[str]:
+    """JSON token per float, as model_dump_json writes it (null for NaN)."""
+    return to_json(column.tolist(), inf_nan_mode="null").decode()[1:-1].split(",")
+
+
+class ReportBatch:
+    """
+    Reports as arrays:
+    - templates: template code per report
+    - codes: field codes, one column each
+    - values: float64 values, NaN where missing
+    - present: whether the report has the field at all
+    - confidence: float64 confidences
+    - justification, source_rule: object arrays of strings
+    - descriptions: one description per field code
+    """
+
+    __slots__ = ("templates", "codes", "descriptions", "values", "present", "confidence", "justification", "source_rule")
+
+    def __init__(
+        self,
+        templates: np.ndarray,
+        codes: List[str],
+        descriptions: List[str],
+        values: np.ndarray,
+        present: np.ndarray,
+        confidence: np.ndarray,
+        justification: np.ndarray,
+        source_rule: np.ndarray
+    ):
+        self.templates = templates
+        self.codes = codes
+        self.descriptions = descriptions
+        self.values = values
+        self.present = present
+        self.confidence = confidence
+        self.justification = justification
+        self.source_rule = source_rule
+
+    @classmethod
+    def from_reports(cls, reports: Sequence[COREPReport]) -> "ReportBatch":
+        """Columnar copy of already validated reports."""
+        descriptions = {}
+        for report in reports:
+            for field in report.fields:
+                descriptions.setdefault(field.field_code, field.description)
+        codes = list(descriptions)
+        position = {code: i for i, code in enumerate(codes)}
+
+        shape = (len(reports), len(codes))
+        values = np.full(shape, np.nan)
+        present = np.zeros(shape, dtype=bool)
+        confidence = np.zeros(shape)
+        justification = np.full(shape, "", dtype=object)
+        source_rule = np.full(shape, "", dtype=object)
+        for row, report in enumerate(reports):
+            for field in report.fields:
+                column = position[field.field_code]
+                present[row, column] = True
+                if field.value is not None:
+                    values[row, column] = field.value
+                confidence[row, column] = field.confidence
+                justification[row, column] = field.justification
+                source_rule[row, column] = field.source_rule
+
+        templates = np.array([report.template for report in reports], dtype=object)
+        return cls(templates, codes, list(descriptions.values()), values, present, confidence, justification, source_rule)
+
+    @classmethod
+    def from_jsonl(cls, lines: Iterable[str]) -> "ReportBatch":
+        """Parse and validate report JSON lines (the to_jsonl format) once, at the boundary."""
+        return cls.from_reports([COREPReport.model_validate_json(line) for line in lines if line.strip()])
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def report(self, i: int) -> COREPReport:
+        """Rebuild report i without re-running validation."""
+        values = self.values[i].tolist()
+        confidence = self.confidence[i].tolist()
+        justification = self.justification[i]
+        source_rule = self.source_rule[i]
+        present = self.present[i].tolist()
+        fields = [
+            COREPField.model_construct(
+                field_code=code,
+                description=self.descriptions[j],
+                value=None if values[j] != values[j] else values[j],
+                confidence=confidence[j],
+                justification=justification[j],
+                source_rule=source_rule[j]
+            )
+            for j, code in enumerate(self.codes) if present[j]
+        ]
+        return COREPReport.model_construct(template=self.templates[i], fields=fields)
+
+    def __iter__(self) -> Iterator[COREPReport]:
+        return (self.report(i) for i in range(len(self)))
+
+    def is_empty(self) -> np.ndarray:
+        """Per report: no field has a value."""
+        return np.isnan(self.values).all(axis=1)
+
+    def confidence_scores(self) -> np.ndarray:
+        """Per report: average confidence of populated fields, 0 if none."""
+        populated = ~np.isnan(self.values)
+        counts = populated.sum(axis=1)
+        totals = np.where(populated, self.confidence, 0.0).sum(axis=1)
+        return np.divide(totals, counts, out=np.zeros(len(self)), where=counts > 0)
+
+    def to_frame(self, index: Optional[Sequence] = None) -> pd.DataFrame:
+        """Reports-by-field-code values frame, as core.validation.reports_to_frame."""
+        order = np.argsort(self.codes)
+        return pd.DataFrame(self.values[:, order], columns=[self.codes[j] for j in order], index=index)
+
+    def iter_json(self) -> Iterator[str]:
+        """
+        One report JSON object per report, byte for byte as
+        COREPReport.model_dump_json. Rows are grouped by the fields they
+        have; per group each column is encoded once (numbers by pydantic's
+        encoder, null for NaN) and each report is one %-format of the
+        group's row template. JSON_BLOCK rows are converted at a time.
+        """
+        for start in range(0, len(self), JSON_BLOCK):
+            block = slice(start, start + JSON_BLOCK)
+            present = self.present[block]
+            templates = self.templates[block]
+            # Group rows by presence pattern, packed into one bytes key per row
+            if self.codes:
+                packed = np.ascontiguousarray(np.packbits(present, axis=1))
+                keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+                _, first, group_of_row = np.unique(keys, return_index=True, return_inverse=True)
+                group_of_row = group_of_row.ravel()
+            else:
+                first, group_of_row = np.zeros(1, dtype=int), np.zeros(len(templates), dtype=int)
+
+            lines = [None] * len(templates)
+            for group, row in enumerate(first.tolist()):
+                rows = np.flatnonzero(group_of_row == group)
+                fields = np.flatnonzero(present[row]).tolist()
+                columns = [[encode_basestring(t) for t in templates[rows].tolist()]]
+                for j in fields:
+                    columns.append(_json_numbers(self.values[block][rows, j]))
+                    columns.append(_json_numbers(self.confidence[block][rows, j]))
+                    columns.append([encode_basestring(t) for t in self.justification[block][rows, j].tolist()])
+                    columns.append([encode_basestring(t) for t in self.source_rule[block][rows, j].tolist()])
+                row_format = self._row_format(fields)
+                for i, cells in zip(rows.tolist(), zip(*columns)):
+                    lines[i] = row_format % cells
+            yield from lines
+
+    def _row_format(self, fields: List[int]) -> str:
+        # Template, then value, confidence, justification and source_rule per field
+        def literal(text):
+            return encode_basestring(text).replace("%", "%%")
+
+        parts = [
+            '{"field_code":%s,"description":%s,"value":%%s,"confidence":%%s,"justification":%%s,"source_rule":%%s}'
+            % (literal(self.codes[j]), literal(self.descriptions[j]))
+            for j in fields
+        ]
+        return '{"template":%s,"fields":[' + ",".join(parts) + "]}"
+
+    def to_jsonl(self, out: IO[str]) -> int:
+        """Write one report per line; returns the number of lines."""
+        count = 0
+        for line in self.iter_json():
+            out.write(line)
+            out.write("\n")
+            count += 1
+        return count
+
+    def to_arrow(self):
+        """
+        Wide Arrow table: a template column, then per field code its value
+        (null where missing) and <code>_confidence, <code>_justification,
+        <code>_source_rule columns. Requires the optional pyarrow
+        package (pip install pyarrow).
+        """
+        import pyarrow as pa
+
+        columns = {"template": pa.array(self.templates, type=pa.string())}
+        for j, code in enumerate(self.codes):
+            absent = ~self.present[:, j]
+            columns[code] = pa.array(self.values[:, j], mask=np.isnan(self.values[:, j]))
+            columns[f"{code}_confidence"] = pa.array(self.confidence[:, j], mask=absent)
+            columns[f"{code}_justification"] = pa.array(self.justification[:, j], type=pa.string(), mask=absent)
+            columns[f"{code}_source_rule"] = pa.array(self.source_rule[:, j], type=pa.string(), mask=absent)
+        return pa.table(columns)
+
+    def to_parquet(self, path: str) -> None:
+        """Write the to_arrow table to a Parquet file. Requires pyarrow (see to_arrow)."""
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path)
@@ -0,0 +1,260 @@
+"""
+Persistent history of generated COREP reports.
+
+Every report is stored in SQLite with its entity, reference date and
+template. Each field code of the template registry also gets its own
+REAL column, so comparing periods or entities is a single indexed query
+read straight into a DataFrame. The full report JSON is kept alongside
+so any submission can be restored exactly.
+
+    store = HistoryStore()
+    store.add(report, entity="Bank A", reference_date="2025-12-31")
+    store.movements(entity="Bank A")   # period-over-period changes
+    store.outliers()                   # unusual movements across entities
+"""
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from core.batch import ReportBatch
+from core.schemas import COREPReport
+from core.templates import TEMPLATES
+
+HISTORY_PATH = os.getenv("COREP_HISTORY_PATH", ".corep_history/history.sqlite")
+
+# Fields compared across periods by default
+MOVEMENT_FIELDS = ("OF_010", "OF_020", "OF_030", "OF_040")
+# Modified z-score above which a movement is flagged
+OUTLIER_THRESHOLD = float(os.getenv("COREP_OUTLIER_THRESHOLD", "3.5"))
+# Smallest spread (MAD of relative changes) scores are measured against, so
+# a small change among identical movements does not score as extreme
+OUTLIER_MAD_FLOOR = float(os.getenv("COREP_OUTLIER_MAD_FLOOR", "0.01"))
+
+_BASE_COLUMNS = ["id", "entity", "reference_date", "template", "created_at", "method", "confidence", "scenario"]
+
+
+def field_columns() -> List[str]:
+    """One value column per row code of the template registry."""
+    return [code for template in TEMPLATES.values() for code in template.rows]
+
+
+def _date(value: Union[str, date]) -> str:
+    # ISO dates sort and compare correctly as text
+    return value.isoformat() if isinstance(value, date) else date.fromisoformat(value).isoformat()
+
+
+class HistoryStore:
+    """
+    Reports by entity, reference date and template, in SQLite.
+    Resubmitting an entity/date/template pair keeps both rows; queries
+    use the most recent submission unless all_submissions=True.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "id INTEGER PRIMARY KEY, entity TEXT NOT NULL, reference_date TEXT NOT NULL, "
+            "template TEXT NOT NULL, created_at TEXT NOT NULL, method TEXT, confidence REAL, "
+            "scenario TEXT, report_json TEXT NOT NULL)"
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+        # Templates added to the registry since the store was created
+        for code in field_columns():
+            if code not in existing:
+                self._conn.execute(f'ALTER TABLE reports ADD COLUMN "{code}" REAL')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_entity ON reports (entity, template, reference_date)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_date ON reports (reference_date, template)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_template ON reports (template, reference_date)")
+        self._conn.commit()
+
+    def add(
+        self,
+        report: COREPReport,
+        entity: str,
+        reference_date: Union[str, date],
+        scenario: str = "",
+        method: Optional[str] = None
+    ) -> int:
+        """Store one report. Returns its id."""
+        return self.add_many([report], [entity], [reference_date], [scenario], [method])[0]
+
+    def add_many(
+        self,
+        reports: Sequence[COREPReport],
+        entities: Sequence[str],
+        reference_dates: Sequence[Union[str, date]],
+        scenarios: Optional[Sequence[str]] = None,
+        methods: Optional[Sequence[Optional[str]]] = None
+    ) -> List[int]:
+        """Store many reports in one transaction. Returns their ids in order."""
+        if not reports:
+            return []
+        batch = ReportBatch.from_reports(reports)
+        columns = field_columns()
+        position = {code: i for i, code in enumerate(batch.codes)}
+        values = np.full((len(reports), len(columns)), np.nan)
+        for j, code in enumerate(columns):
+            if code in position:
+                values[:, j] = batch.values[:, position[code]]
+        confidence = batch.confidence_scores()
+        created_at = datetime.now(timezone.utc).isoformat()
+        scenarios = scenarios or [""] * len(reports)
+        methods = methods or [None] * len(reports)
+
+        rows = [
+            (
+                entity, _date(reference_date), report.template, created_at, method, float(score), scenario,
+                report.model_dump_json(), *(None if np.isnan(v) else float(v) for v in row)
+            )
+            for report, entity, reference_date, scenario, method, score, row
+            in zip(reports, entities, reference_dates, scenarios, methods, confidence, values)
+        ]
+        names = ", ".join(["entity", "reference_date", "template", "created_at", "method", "confidence", "scenario", "report_json"]
+                          + [f'"{code}"' for code in columns])
+        placeholders = ", ".join("?" * (8 + len(columns)))
+        sql = f"INSERT INTO reports ({names}) VALUES ({placeholders})"
+        with self._lock, self._conn:
+            return [self._conn.execute(sql, row).lastrowid for row in rows]
+
+    def get(self, report_id: int) -> Optional[COREPReport]:
+        """The stored report, exactly as generated."""
+        with self._lock:
+            row = self._conn.execute("SELECT report_json FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return COREPReport.model_validate_json(row[0]) if row else None
+
+    def entities(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT entity FROM reports ORDER BY entity")]
+
+    def query(
+        self,
+        entity: Optional[str] = None,
+        template: Optional[str] = "C 01.00",
+        start: Optional[Union[str, date]] = None,
+        end: Optional[Union[str, date]] = None,
+        fields: Optional[Iterable[str]] = None,
+        all_submissions: bool = False,
+        limit: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Submissions as a DataFrame with one column per field code (NaN where
+        missing), ordered by entity and reference date. Only the latest
+        submission per entity, date and template unless all_submissions.
+        """
+        fields = list(fields) if fields is not None else (
+            list(TEMPLATES[template].rows) if template in TEMPLATES else field_columns()
+        )
+        conditions, params = [], []
+        for column, operator, value in (
+            ("entity", "=", entity), ("template", "=", template),
+            ("reference_date", ">=", start and _date(start)), ("reference_date", "<=", end and _date(end)),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        if not all_submissions:
+            conditions.append(
+                "id IN (SELECT MAX(id) FROM reports GROUP BY entity, template, reference_date)"
+            )
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        selected = ", ".join(_BASE_COLUMNS + [f'"{code}"' for code in fields])
+        order = "ORDER BY entity, template, reference_date, id"
+        sql = f"SELECT {selected} FROM reports {where} {order}"
+        if limit:
+            # Most recent submissions, still in entity and date order
+            sql = f"SELECT * FROM (SELECT {selected} FROM reports {where} ORDER BY id DESC LIMIT {int(limit)}) {order}"
+        with self._lock:
+            frame = pd.read_sql_query(sql, self._conn, params=params)
+        frame[fields] = frame[fields].astype(float)
+        return frame
+
+    def movements(self, entity: Optional[str] = None, template: str = "C 01.00", fields: Sequence[str] = MOVEMENT_FIELDS, **filters) -> pd.DataFrame:
+        """
+        Period-over-period change of each field per entity: for every field
+        a "<code>_prev", "<code>_change" and "<code>_pct" column (NaN for an
+        entity's first period or a missing value).
+        """
+        frame = self.query(entity=entity, template=template, fields=fields, **filters)
+        previous = frame.groupby(["entity", "template"], sort=False)[list(fields)].shift(1)
+        for code in fields:
+            frame[f"{code}_prev"] = previous[code]
+            frame[f"{code}_change"] = frame[code] - previous[code]
+            frame[f"{code}_pct"] = frame[f"{code}_change"] / previous[code].where(previous[code] != 0)
+        return frame
+
+    def outliers(
+        self,
+        entity: Optional[str] = None,
+        template: str = "C 01.00",
+        fields: Sequence[str] = MOVEMENT_FIELDS,
+        threshold: float = OUTLIER_THRESHOLD,
+        mad_floor: float = OUTLIER_MAD_FLOOR,
+        **filters
+    ) -> pd.DataFrame:
+        """
+        Movements whose relative change is unusual among all movements of
+        the same field, by modified z-score (median and MAD, so a few large
+        outliers do not hide each other). The MAD is at least mad_floor
+        (0.01 = one percentage point). One row per flagged field.
+        """
+        frame = self.movements(entity=entity, template=template, fields=fields, **filters)
+        flagged = []
+        for code in fields:
+            pct = frame[f"{code}_pct"]
+            valid = pct.notna()
+            if valid.sum() < 3:
+                continue
+            median = pct[valid].median()
+            mad = max((pct[valid] - median).abs().median(), mad_floor)
+            if mad == 0:
+                # Identical movements and no floor: nothing to measure against
+                continue
+            scores = 0.6745 * (pct[valid] - median) / mad
+            hits = scores[scores.abs() > threshold].index
+            flagged.append(pd.DataFrame({
+                "id": frame.loc[hits, "id"],
+                "entity": frame.loc[hits, "entity"],
+                "reference_date": frame.loc[hits, "reference_date"],
+                "field_code": code,
+                "value": frame.loc[hits, code],
+                "previous": frame.loc[hits, f"{code}_prev"],
+                "change_pct": pct[hits],
+                "score": scores[hits],
+            }))
+        if not flagged:
+            return pd.DataFrame(columns=["id", "entity", "reference_date", "field_code", "value", "previous", "change_pct", "score"])
+        return pd.concat(flagged, ignore_index=True).sort_values(["entity", "reference_date", "field_code"], ignore_index=True)
+
+    def diff(self, first_id: int, second_id: int) -> pd.DataFrame:
+        """Field-by-field comparison of two stored reports."""
+        first, second = self.get(first_id), self.get(second_id)
+        if first is None or second is None:
+            raise KeyError(f"No stored report with id {first_id if first is None else second_id}")
+        before = {f.field_code: f.value for f in first.fields}
+        after = {f.field_code: f.value for f in second.fields}
+        codes = list(dict.fromkeys([*before, *after]))
+        frame = pd.DataFrame({
+            "field_code": codes,
+            "before": [before.get(code) for code in codes],
+            "after": [after.get(code) for code in codes],
+        })
+        frame[["before", "after"]] = frame[["before", "after"]].astype(float)
+        frame["change"] = frame["after"] - frame["before"]
+        return frame
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
@@ -0,0 +1,129 @@
+import re
+import ast
+import operator
+from functools import reduce
+from typing import Callable, Dict, FrozenSet, Mapping, Optional
+
+# A single "=" as used in the COREP instructions means equality
+_SINGLE_EQUALS = re.compile(r"(?<![<>=!])=(?!=)")
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+_UNARY = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+_COMPARE = {
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+class Expression:
+    """
+    Arithmetic or comparison formula over field codes, e.g.
+    "OF_040 = OF_010 + OF_020 + OF_030" or "CA_010 <= CA_020".
+    Parsed once into a tree of closures that works on scalars and, through
+    evaluate_columns, on NumPy arrays; equality allows an absolute
+    tolerance so rounded inputs still pass.
+    """
+
+    def __init__(self, source: str, tolerance: float = 0.01):
+        self.source = source.strip()
+        self.tolerance = tolerance
+        tree = ast.parse(_SINGLE_EQUALS.sub("==", self.source), mode="eval")
+        fields = set()
+        self._divisors = []
+        self._fn = self._compile(tree.body, fields)
+        self.fields: FrozenSet[str] = frozenset(fields)
+        self.is_comparison = isinstance(tree.body, ast.Compare)
+
+    def _compile(self, node: ast.AST, fields: set) -> Callable[[Mapping], object]:
+        if isinstance(node, ast.Name):
+            name = node.id
+            fields.add(name)
+            return lambda values: values[name]
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda values: value
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            op = _BINARY[type(node.op)]
+            left, right = self._compile(node.left, fields), self._compile(node.right, fields)
+            if isinstance(node.op, ast.Div):
+                self._divisors.append(right)
+            return lambda values: op(left(values), right(values))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+            op = _UNARY[type(node.op)]
+            operand = self._compile(node.operand, fields)
+            return lambda values: op(operand(values))
+
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(node.left, fields)] + [self._compile(c, fields) for c in node.comparators]
+            checks = []
+            for i, op in enumerate(node.ops):
+                left, right = operands[i], operands[i + 1]
+                if isinstance(op, ast.Eq):
+                    checks.append(self._equals(left, right))
+                elif type(op) in _COMPARE:
+                    checks.append(self._compare(_COMPARE[type(op)], left, right))
+                else:
+                    raise ValueError(f"Unsupported comparison in rule '{self.source}'")
+            if len(checks) == 1:
+                return checks[0]
+            # "&" rather than all() so the same closure works on NumPy columns
+            return lambda values: reduce(operator.and_, (check(values) for check in checks))
+
+        raise ValueError(f"Unsupported syntax in rule '{self.source}'")
+
+    def _equals(self, left, right):
+        tolerance = self.tolerance
+        return lambda values: abs(left(values) - right(values)) <= tolerance
+
+    @staticmethod
+    def _compare(op, left, right):
+        return lambda values: op(left(values), right(values))
+
+    def evaluate(self, values: Mapping[str, Optional[float]]) -> Optional[object]:
+        """
+        Value of the expression, or None if a referenced field is missing
+        or a divisor is zero (the rule does not apply).
+        """
+        if any(values.get(field) is None for field in self.fields):
+            return None
+        try:
+            return self._fn(values)
+        except ZeroDivisionError:
+            return None
+
+    def evaluate_columns(self, columns: Mapping[str, object]) -> object:
+        """
+        Evaluate on whole columns (NumPy arrays or pandas Series) at once.
+        Missing values must be NaN; callers mask rows where inputs are missing
+        and, as evaluate does, rows outside defined_columns.
+        """
+        return self._fn(columns)
+
+    def defined_columns(self, columns: Mapping[str, object]) -> object:
+        """Boolean column: True where no divisor in the expression is zero."""
+        defined = True
+        for divisor in self._divisors:
+            defined = defined & (divisor(columns) != 0)
+        return defined
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+def field_values(reports) -> Dict[str, Optional[float]]:
+    """Field code -> value across one or more COREPReports."""
+    return {f.field_code: f.value for report in reports for f in report.fields}
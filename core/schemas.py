@@ -1,6 +1,5 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
-import json
 
 class COREPField(BaseModel):
     field_code: str = Field(description="COREP template field code (e.g., OF_010)")
@@ -10,11 +9,13 @@ class COREPField(BaseModel):
     justification: str = Field("", description="Regulatory justification")
     source_rule: str = Field("", description="Source regulatory rule")
     
-    @validator('confidence')
+    @field_validator('confidence')
+    @classmethod
     def validate_confidence(cls, v):
         return max(0.0, min(1.0, v))
     
-    @validator('value')
+    @field_validator('value')
+    @classmethod
     def validate_value(cls, v):
         if v is not None and v < 0:
             raise ValueError(f"Negative value {v} not allowed for COREP reporting")
@@ -25,7 +26,7 @@ class COREPReport(BaseModel):
     fields: List[COREPField] = Field(default_factory=list)
     
     def to_json(self):
-        return json.dumps(self.dict(), indent=2)
+        return self.model_dump_json(indent=2)
     
     @property
     def is_empty(self) -> bool:
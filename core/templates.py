@@ -0,0 +1,279 @@
+"""
+Declarative registry of COREP templates.
+
+Each template declares its rows (code, description, data type and an
+optional formula for derived rows) and its validation rules. Pydantic
+report models, prompt sections, derived-value filling and validators are
+generated from the declarations once, when the template is registered.
+Formulas may reference rows of other templates (e.g. capital ratios use
+own funds from C 01.00 and the risk exposure amount from C 02.00).
+"""
+from typing import Dict, List, Literal, Mapping, Optional, Type
+
+from pydantic import BaseModel, Field, create_model, model_validator
+
+from core.rules import Expression, field_values
+from core.schemas import COREPField, COREPReport
+
+MONETARY = "monetary"
+PERCENTAGE = "percentage"
+
+
+class TemplateRow(BaseModel):
+    code: str = Field(description="Field code, unique across templates (e.g., OF_010)")
+    description: str
+    data_type: Literal["monetary", "percentage"] = MONETARY
+    formula: Optional[str] = Field(None, description="Arithmetic over other codes for derived rows")
+    source_rule: str = ""
+    derived_justification: str = ""
+
+
+class ValidationRule(BaseModel):
+    rule_id: str
+    expression: str
+    tolerance: float = 0.01
+    message: str = ""
+
+
+class TemplateSpec(BaseModel):
+    code: str
+    name: str
+    rows: List[TemplateRow]
+    rules: List[ValidationRule] = Field(default_factory=list)
+
+
+class CompiledTemplate:
+    """Artifacts generated from a TemplateSpec at registration."""
+
+    def __init__(self, spec: TemplateSpec):
+        self.spec = spec
+        self.rows = {row.code: row for row in spec.rows}
+        self.rules = [(rule, Expression(rule.expression, rule.tolerance)) for rule in self._all_rules(spec)]
+        self.derived = {row.code: Expression(row.formula) for row in spec.rows if row.formula}
+        self.model = self._build_model(spec)
+        self.prompt_section = self._build_prompt_section(spec)
+
+    @staticmethod
+    def _all_rules(spec: TemplateSpec) -> List[ValidationRule]:
+        rules = []
+        for row in spec.rows:
+            if row.data_type == MONETARY:
+                rules.append(ValidationRule(
+                    rule_id=f"{row.code}_non_negative",
+                    expression=f"{row.code} >= 0",
+                    message=f"{row.code} cannot be negative"
+                ))
+            else:
+                rules.append(ValidationRule(
+                    rule_id=f"{row.code}_range",
+                    expression=f"0 <= {row.code} <= 100",
+                    message=f"{row.code} must be a percentage between 0 and 100"
+                ))
+            if row.formula:
+                rules.append(ValidationRule(
+                    rule_id=f"{row.code}_formula",
+                    expression=f"{row.code} = {row.formula}",
+                    tolerance=0.01 if row.data_type == MONETARY else 0.05,
+                    message=f"{row.code} must equal {row.formula}"
+                ))
+        return rules + list(spec.rules)
+
+    @staticmethod
+    def _build_model(spec: TemplateSpec) -> Type[COREPReport]:
+        rows = spec.rows
+        codes = {row.code for row in rows}
+
+        def complete_rows(report):
+            unknown = [f.field_code for f in report.fields if f.field_code not in codes]
+            if unknown:
+                raise ValueError(f"Fields {unknown} are not rows of template {spec.code}")
+            by_code = {f.field_code: f for f in report.fields}
+            report.fields = [
+                by_code.get(row.code) or COREPField(field_code=row.code, description=row.description)
+                for row in rows
+            ]
+            return report
+
+        name = "Report_" + spec.code.replace(" ", "_").replace(".", "_")
+        return create_model(
+            name,
+            __base__=COREPReport,
+            __validators__={"complete_rows": model_validator(mode="after")(complete_rows)},
+            template=(Literal[spec.code], spec.code)
+        )
+
+    @staticmethod
+    def _build_prompt_section(spec: TemplateSpec) -> str:
+        lines = [f"TEMPLATE {spec.code} - {spec.name}:"]
+        for row in spec.rows:
+            unit = "in millions" if row.data_type == MONETARY else "percentage 0-100"
+            line = f"- {row.code}: {row.description} ({unit})"
+            if row.formula:
+                line += f" = {row.formula}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+TEMPLATES: Dict[str, CompiledTemplate] = {}
+
+
+def register_template(spec: TemplateSpec) -> CompiledTemplate:
+    """Compile and register a template; row codes must be unique across templates."""
+    taken = {code for compiled in TEMPLATES.values() for code in compiled.rows if compiled.spec.code != spec.code}
+    clashes = taken & {row.code for row in spec.rows}
+    if clashes:
+        raise ValueError(f"Row codes {sorted(clashes)} already registered by another template")
+    compiled = CompiledTemplate(spec)
+    TEMPLATES[spec.code] = compiled
+    return compiled
+
+
+def get_template(code: str) -> CompiledTemplate:
+    try:
+        return TEMPLATES[code]
+    except KeyError:
+        raise ValueError(f"Unknown COREP template '{code}', expected one of {list(TEMPLATES)}")
+
+
+def fill_derived_values(reports: Mapping[str, COREPReport]) -> None:
+    """
+    Fill missing derived rows whose formula inputs are all present,
+    across the given reports (keyed by template code), in place.
+    Confidence is the lowest confidence of the inputs.
+    """
+    fields = {f.field_code: f for report in reports.values() for f in report.fields}
+    values = field_values(reports.values())
+
+    changed = True
+    while changed:
+        changed = False
+        for code in reports:
+            compiled = TEMPLATES.get(code)
+            if compiled is None:
+                continue
+            for row_code, expression in compiled.derived.items():
+                field = fields.get(row_code)
+                if field is None or field.value is not None:
+                    continue
+                value = expression.evaluate(values)
+                if value is None:
+                    continue
+                row = compiled.rows[row_code]
+                field.value = value
+                field.justification = row.derived_justification or f"Calculated as {row.formula}"
+                field.source_rule = row.source_rule
+                field.confidence = min(fields[name].confidence for name in expression.fields)
+                values[row_code] = value
+                changed = True
+
+
+def validate_reports(reports: Mapping[str, COREPReport]) -> List[Dict[str, str]]:
+    """
+    Evaluate every rule of the given templates against the values of all
+    given reports, so inter-template rules apply when both templates are
+    present. Rules with a missing input are skipped.
+    Returns one entry per failed rule.
+    """
+    values = field_values(reports.values())
+    failures = []
+    for code in reports:
+        compiled = TEMPLATES.get(code)
+        if compiled is None:
+            continue
+        for rule, expression in compiled.rules:
+            if expression.evaluate(values) is False:
+                failures.append({
+                    "template": code,
+                    "rule_id": rule.rule_id,
+                    "expression": rule.expression,
+                    "message": rule.message or f"{rule.expression} does not hold",
+                })
+    return failures
+
+
+register_template(TemplateSpec(
+    code="C 01.00",
+    name="Own funds",
+    rows=[
+        TemplateRow(code="OF_010", description="Common Equity Tier 1 (CET1) capital", source_rule="CRR Article 26"),
+        TemplateRow(code="OF_020", description="Additional Tier 1 (AT1) capital", source_rule="CRR Article 51"),
+        TemplateRow(code="OF_030", description="Tier 2 capital", source_rule="CRR Article 61"),
+        TemplateRow(
+            code="OF_040",
+            description="Total Own Funds",
+            formula="OF_010 + OF_020 + OF_030",
+            source_rule="CRR Article 72",
+            derived_justification="Calculated as sum of CET1 + AT1 + Tier 2"
+        ),
+    ]
+))
+
+register_template(TemplateSpec(
+    code="C 02.00",
+    name="Own funds requirements",
+    rows=[
+        TemplateRow(code="OFR_010", description="Total risk exposure amount", source_rule="CRR Article 92(3)"),
+        TemplateRow(code="OFR_020", description="Risk weighted exposure amounts for credit risk", source_rule="CRR Article 92(3)(a)"),
+        TemplateRow(code="OFR_030", description="Total risk exposure amount for market risk", source_rule="CRR Article 92(3)(b)"),
+        TemplateRow(code="OFR_040", description="Total risk exposure amount for operational risk", source_rule="CRR Article 92(3)(e)"),
+    ],
+    rules=[
+        ValidationRule(
+            rule_id="OFR_010_covers_components",
+            expression="OFR_010 >= OFR_020 + OFR_030 + OFR_040",
+            message="OFR_010 must be at least the sum of credit, market and operational risk"
+        ),
+    ]
+))
+
+register_template(TemplateSpec(
+    code="C 03.00",
+    name="Capital ratios",
+    rows=[
+        TemplateRow(
+            code="CA_010", description="CET1 capital ratio", data_type=PERCENTAGE,
+            formula="100 * OF_010 / OFR_010", source_rule="CRR Article 92(2)(a)"
+        ),
+        TemplateRow(
+            code="CA_020", description="Tier 1 capital ratio", data_type=PERCENTAGE,
+            formula="100 * (OF_010 + OF_020) / OFR_010", source_rule="CRR Article 92(2)(b)"
+        ),
+        TemplateRow(
+            code="CA_030", description="Total capital ratio", data_type=PERCENTAGE,
+            formula="100 * OF_040 / OFR_010", source_rule="CRR Article 92(2)(c)"
+        ),
+    ],
+    rules=[
+        ValidationRule(
+            rule_id="CA_ratio_order",
+            expression="CA_010 <= CA_020 <= CA_030",
+            message="Capital ratios must satisfy CET1 <= Tier 1 <= Total capital ratio"
+        ),
+    ]
+))
+
+register_template(TemplateSpec(
+    code="C 04.00",
+    name="Memorandum items",
+    rows=[
+        TemplateRow(code="MI_010", description="Deferred tax assets", source_rule="CRR Article 36(1)(c)"),
+        TemplateRow(code="MI_020", description="Deferred tax liabilities", source_rule="CRR Article 38"),
+        TemplateRow(code="MI_030", description="Goodwill and other intangible assets deducted", source_rule="CRR Article 36(1)(b)"),
+    ]
+))
+
+register_template(TemplateSpec(
+    code="C 47.00",
+    name="Leverage ratio calculation",
+    rows=[
+        TemplateRow(
+            code="LR_010", description="Tier 1 capital", formula="OF_010 + OF_020",
+            source_rule="CRR Article 429(3)"
+        ),
+        TemplateRow(code="LR_020", description="Total exposure measure", source_rule="CRR Article 429(4)"),
+        TemplateRow(
+            code="LR_030", description="Leverage ratio", data_type=PERCENTAGE,
+            formula="100 * LR_010 / LR_020", source_rule="CRR Article 429(2)"
+        ),
+    ]
+))
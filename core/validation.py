@@ -0,0 +1,143 @@
+"""
+Vectorised validation of many COREP reports at once.
+
+Rules are compiled once into core.rules.Expression graphs and evaluated
+as NumPy column operations over a reports-by-field frame, producing a
+reports-by-rule violations matrix instead of looping per report.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from core.rules import Expression
+from core.schemas import COREPReport
+from core.templates import TEMPLATES, ValidationRule
+
+_FIELD_CODE = re.compile(r"\b[A-Z]{2,3}_\d{3}\b")
+
+# Wording in the instructions, longest first, mapped to operators
+_PHRASES = [
+    (r"must be greater than or equal to", ">="),
+    (r"must be less than or equal to", "<="),
+    (r"must be greater than", ">"),
+    (r"must be less than", "<"),
+    (r"must (?:be )?equal(?: to)?", "="),
+    (r"\bzero\b", "0"),
+]
+
+
+def parse_rules(text: str, field_codes: Optional[Iterable[str]] = None) -> List[ValidationRule]:
+    """
+    Parse arithmetic and inequality rules from instruction text, e.g. the
+    VALIDATION RULES and formula lines of corep_instructions.txt:
+        "OF_040 must equal OF_010 + OF_020 + OF_030."
+        "CET1 (OF_010) must be greater than or equal to zero."
+        "- OF_040 = OF_010 + OF_020 + OF_030"
+        "All values must be non-negative."  (one rule per field code)
+    Lines that are not rules are skipped.
+    """
+    codes = sorted(set(field_codes or _FIELD_CODE.findall(text)))
+    rules, seen = [], set()
+
+    def add(expression, message):
+        try:
+            compiled = Expression(expression)
+        except (SyntaxError, ValueError):
+            return
+        if not compiled.fields or compiled.source in seen:
+            return
+        seen.add(compiled.source)
+        rules.append(ValidationRule(rule_id=f"rule_{len(rules) + 1:03d}", expression=compiled.source, message=message))
+
+    for raw in text.splitlines():
+        line = re.sub(r"^\s*(?:\d+\.|-)\s*", "", raw).strip().rstrip(".")
+        if not line:
+            continue
+        if re.search(r"\ball values must be non-negative\b", line, re.IGNORECASE):
+            for code in codes:
+                add(f"{code} >= 0", f"{code} cannot be negative")
+            continue
+
+        expression = line
+        for phrase, symbol in _PHRASES:
+            expression = re.sub(phrase, symbol, expression, flags=re.IGNORECASE)
+        # "CET1 (OF_010)" -> "OF_010"
+        expression = re.sub(r"[A-Za-z0-9 ]+\((" + _FIELD_CODE.pattern + r")\)", r"\1", expression)
+        start = _FIELD_CODE.search(expression)
+        if start is None or not re.search(r"[=<>]", expression):
+            continue
+        add(expression[start.start():].strip(), line)
+    return rules
+
+
+def reports_to_frame(reports: Sequence[COREPReport], index: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    Reports-by-field-code frame of values, NaN where a value is missing.
+    Filled column by column into one float64 block.
+    """
+    codes = sorted({f.field_code for report in reports for f in report.fields})
+    position = {code: i for i, code in enumerate(codes)}
+    values = np.full((len(reports), len(codes)), np.nan)
+    for row, report in enumerate(reports):
+        for field in report.fields:
+            if field.value is not None:
+                values[row, position[field.field_code]] = field.value
+    return pd.DataFrame(values, columns=codes, index=index)
+
+
+class RuleEngine:
+    """
+    Compiled set of validation rules evaluated over a frame of reports.
+    """
+
+    def __init__(self, rules: Iterable[ValidationRule]):
+        self.rules = list(rules)
+        self.expressions = [Expression(rule.expression, rule.tolerance) for rule in self.rules]
+
+    @classmethod
+    def from_templates(cls, templates: Optional[Iterable[str]] = None) -> "RuleEngine":
+        """All rules of the given registry templates (default: every template)."""
+        codes = templates or list(TEMPLATES)
+        return cls(rule for code in codes for rule, _ in TEMPLATES[code].rules)
+
+    @classmethod
+    def from_instructions(cls, path: str = "data/regulatory/corep_instructions.txt") -> "RuleEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(parse_rules(f.read()))
+
+    def evaluate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Violations matrix: one row per report, one column per rule id.
+        True = violated, False = passed, <NA> = not applicable because an
+        input field is missing (or absent from the frame) or a divisor is zero.
+        """
+        columns = {code: frame[code].to_numpy(dtype=float) for code in frame.columns}
+        missing = np.full(len(frame), np.nan)
+        result = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for rule, expression in zip(self.rules, self.expressions):
+                inputs = {code: columns.get(code, missing) for code in expression.fields}
+                applicable = np.logical_and.reduce([~np.isnan(col) for col in inputs.values()]) \
+                    if inputs else np.ones(len(frame), dtype=bool)
+                applicable = applicable & expression.defined_columns(inputs)
+                passed = np.asarray(expression.evaluate_columns(inputs), dtype=bool)
+                violations = pd.array(~passed, dtype="boolean")
+                violations[~applicable] = pd.NA
+                result[rule.rule_id] = violations
+        return pd.DataFrame(result, index=frame.index)
+
+    def evaluate_reports(self, reports: Sequence[COREPReport], index: Optional[Sequence] = None) -> pd.DataFrame:
+        return self.evaluate(reports_to_frame(reports, index))
+
+    def summary(self, violations: pd.DataFrame) -> Dict[str, Dict[str, int]]:
+        """Violated / passed / not applicable counts per rule."""
+        return {
+            rule_id: {
+                "violated": int(column.sum()),
+                "passed": int((column == False).sum()),
+                "not_applicable": int(column.isna().sum()),
+            }
+            for rule_id, column in violations.items()
+        }
@@ -0,0 +1,115 @@
+"""
+Single-pass extraction of capital amounts from scenario text.
+
+One compiled pattern tokenises the text into capital-type labels and
+amounts. Each amount is attached to the closest preceding label, with
+currency and magnitude normalised so values are comparable in millions.
+The pattern has no lazy spans between labels and amounts, so matching is
+linear in the length of the text.
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+# Capital-type labels; longer phrases first so they win over their prefixes.
+# The AT1 abbreviation is case-sensitive and must not run into a number,
+# so "stood at 1,200" or "as at 1 January" are not labels.
+LABELS = {
+    "cet1": r"common\s+equity\s+tier\s*1|common\s+equity|CET\s*1",
+    "at1": r"additional\s+tier\s*1|additional\s+tier|(?-i:AT\s?1)(?![,.]?\d)",
+    "tier2": r"tier\s*2|tier\s+two|T2",
+    "total": r"total\s+own\s+funds|total\s+regulatory\s+capital|total\s+capital|total",
+}
+
+CURRENCIES = {
+    "£": "GBP", "gbp": "GBP", "pound": "GBP", "pounds": "GBP", "sterling": "GBP",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD",
+}
+
+MAGNITUDES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "millions": 1e6, "mn": 1e6, "mln": 1e6, "m": 1e6,
+    "billion": 1e9, "billions": 1e9, "bn": 1e9,
+}
+
+_CURRENCY_PREFIX = r"£|€|\$|EUR|GBP|USD"
+_CURRENCY_SUFFIX = r"euros?|pounds?(?:\s+sterling)?|sterling|dollars?|EUR|GBP|USD"
+_MAGNITUDE = r"thousand|k|millions?|mn|mln|m|billions?|bn"
+# Minus sign before or after the currency; not a range like "150-200"
+_MINUS = r"(?<![\w.,)])[-\u2212]"
+# A number starts a token, or follows a currency code with no space ("GBP150m")
+_NUMBER_START = r"(?:(?<=EUR)|(?<=GBP)|(?<=USD)|(?<![\w.,]))"
+
+TOKEN_PATTERN = re.compile(
+    # Cheap first-character check so most positions fail immediately
+    r"(?=[cat£€$egu\d\-\u2212])(?:"
+    + "|".join(rf"(?P<{key}>\b(?:{pattern})\b)" for key, pattern in LABELS.items())
+    + rf"|(?:(?P<sign>{_MINUS})\s?)?(?:(?P<prefix>{_CURRENCY_PREFIX})\s?)?(?P<inner_sign>{_MINUS})?"
+    rf"(?P<number>{_NUMBER_START}\d{{1,3}}(?:,\d{{3}})+(?:\.\d+)?|{_NUMBER_START}\d+(?:\.\d+)?)"
+    rf"(?:\s?(?P<magnitude>{_MAGNITUDE})\b)?"
+    rf"(?:\s?(?P<suffix>{_CURRENCY_SUFFIX})\b)?)",
+    re.IGNORECASE
+)
+
+
+class AmountMention(NamedTuple):
+    key: str                  # cet1, at1, tier2 or total
+    value: float              # normalised to millions, negative if signed
+    currency: Optional[str]   # ISO code, None if not stated
+    scale: float              # multiplier implied by the magnitude word
+    start: int                # span of the amount in the text
+    end: int
+    primary: bool             # first amount after its label
+
+
+def _currency(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    return CURRENCIES.get(token.lower().split()[0], CURRENCIES.get(token))
+
+
+def find_amounts(text: str) -> List[AmountMention]:
+    """
+    All amounts attached to a capital-type label, in text order.
+    Numbers with neither a currency nor a magnitude (e.g. "5-year") are
+    ignored. Amounts after the first one for the same label occurrence
+    are marked primary=False; they usually describe adjustments.
+    """
+    mentions = []
+    label = None
+    label_has_amount = False
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind in LABELS:
+            label, label_has_amount = kind, False
+            continue
+
+        groups = match.groupdict()
+        magnitude = groups["magnitude"]
+        currency = _currency(groups["prefix"]) or _currency(groups["suffix"])
+        if label is None or (magnitude is None and currency is None):
+            continue
+
+        scale = MAGNITUDES[magnitude.lower()] if magnitude else 1.0
+        value = float(groups["number"].replace(",", "")) * scale / 1e6
+        if groups["sign"] or groups["inner_sign"]:
+            value = -value
+        mentions.append(AmountMention(
+            key=label,
+            value=value,
+            currency=currency,
+            scale=scale,
+            start=match.start(),
+            end=match.end(),
+            primary=not label_has_amount
+        ))
+        label_has_amount = True
+    return mentions
+
+
+def amounts_by_type(text: str) -> Dict[str, List[AmountMention]]:
+    """Mentions from find_amounts grouped by capital type."""
+    grouped = {}
+    for mention in find_amounts(text):
+        grouped.setdefault(mention.key, []).append(mention)
+    return grouped
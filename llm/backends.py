@@ -0,0 +1,228 @@
+"""
+Chat model backends for ReportGenerator, selected by COREP_LLM_BACKEND:
+- groq: hosted llama-3.3-70b-versatile (default)
+- local: a GGUF model run on CPU by llama.cpp (needs llama-cpp-python)
+- replay: recorded responses, deterministic and offline, for tests and
+  load tests; optionally records a real backend's responses on a miss
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from llm.amounts import find_amounts
+
+BACKENDS = ("groq", "local", "replay")
+LLM_BACKEND = os.getenv("COREP_LLM_BACKEND", "groq")
+
+MODEL_NAME = "llama-3.3-70b-versatile"
+TEMPERATURE = 0.1
+# Pool size of the shared Groq HTTP clients (sync and async); matches the generator's concurrency
+HTTP_CONNECTIONS = int(os.getenv("COREP_LLM_CONCURRENCY", "8"))
+
+# llama.cpp settings
+LOCAL_MODEL_PATH = os.getenv("COREP_LOCAL_MODEL_PATH", "models/model.gguf")
+LOCAL_CONTEXT_SIZE = int(os.getenv("COREP_LOCAL_CONTEXT_SIZE", "4096"))
+LOCAL_THREADS = int(os.getenv("COREP_LOCAL_THREADS", str(os.cpu_count() or 1)))
+LOCAL_MAX_TOKENS = int(os.getenv("COREP_LOCAL_MAX_TOKENS", "1024"))
+
+# Replay settings
+REPLAY_PATH = os.getenv("COREP_REPLAY_PATH", "data/replay/responses.jsonl")
+# Backend called (and recorded) on a replay miss; empty = synthesise a response
+REPLAY_RECORD_BACKEND = os.getenv("COREP_REPLAY_RECORD_BACKEND", "")
+# Simulated latency per call in seconds, for load tests
+REPLAY_LATENCY = float(os.getenv("COREP_REPLAY_LATENCY", "0"))
+
+# Extraction key -> (field code, description) of the synthesised C 01.00 report
+_SYNTHETIC_FIELDS = {
+    "cet1": ("OF_010", "Common Equity Tier 1 capital"),
+    "at1": ("OF_020", "Additional Tier 1 capital"),
+    "tier2": ("OF_030", "Tier 2 capital"),
+    "total": ("OF_040", "Total Own Funds"),
+}
+
+
+def messages_key(messages: List[BaseMessage]) -> str:
+    """Hash of the role and content of every message of a call."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(message.content).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def synthesize_response(messages: List[BaseMessage]) -> str:
+    """
+    Plausible C 01.00 JSON for the scenario in the prompt, built from the
+    amounts it states, so an unrecorded call still exercises parsing,
+    derived values and validation.
+    """
+    prompt = str(messages[-1].content) if messages else ""
+    start = prompt.find("REPORTING SCENARIO:")
+    end = prompt.find("Extract the values", start)
+    scenario = prompt[start:end if end >= 0 else None] if start >= 0 else prompt
+
+    values = {}
+    for mention in find_amounts(scenario):
+        if mention.primary:
+            values[mention.key] = mention.value
+    fields = [
+        {
+            "field_code": code,
+            "description": description,
+            "value": values.get(key),
+            "confidence": 0.9 if key in values else 0.0,
+            "justification": "Stated in scenario" if key in values else "",
+            "source_rule": "",
+        }
+        for key, (code, description) in _SYNTHETIC_FIELDS.items()
+    ]
+    return json.dumps({"template": "C 01.00", "fields": fields}, indent=2)
+
+
+_record_lock = threading.Lock()
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Answers each call with the response recorded for the same messages.
+    On a miss it calls record_llm and appends the answer to path, or
+    synthesises one (synthesize_response) when there is no record_llm.
+    Responses stream in small chunks like a real model.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    path: Optional[str] = None
+    responses: Dict[str, str] = {}
+    record_llm: Optional[Any] = None
+    latency: float = 0.0
+    chunk_size: int = 16
+    model_name: str = "replay"
+    misses: int = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayChatModel":
+        responses = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        responses[record["key"]] = record["response"]
+        return cls(path=path, responses=responses, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        key = messages_key(messages)
+        response = self.responses.get(key)
+        if response is not None:
+            return response
+        self.misses += 1
+        if self.record_llm is None:
+            return synthesize_response(messages)
+        return self._record(key, self.record_llm.invoke(messages).content)
+
+    async def _arespond(self, messages: List[BaseMessage]) -> str:
+        """_respond, awaiting the recording model so the event loop is not blocked."""
+        key = messages_key(messages)
+        response = self.responses.get(key)
+        if response is not None:
+            return response
+        self.misses += 1
+        if self.record_llm is None:
+            return synthesize_response(messages)
+        return self._record(key, (await self.record_llm.ainvoke(messages)).content)
+
+    def _record(self, key: str, response: str) -> str:
+        self.responses[key] = response
+        if self.path:
+            with _record_lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "response": response}) + "\n")
+        return response
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=await self._arespond(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if self.latency:
+            time.sleep(self.latency)
+        response = self._respond(messages)
+        for start in range(0, len(response), self.chunk_size):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=response[start:start + self.chunk_size]))
+
+
+def _groq_llm():
+    from langchain_groq import ChatGroq
+
+    limits = httpx.Limits(max_connections=HTTP_CONNECTIONS, max_keepalive_connections=HTTP_CONNECTIONS)
+    return ChatGroq(
+        api_key=os.getenv("GROQ_API_KEY"),
+        model_name=MODEL_NAME,
+        temperature=TEMPERATURE,
+        max_retries=0,
+        http_client=httpx.Client(limits=limits),
+        http_async_client=httpx.AsyncClient(limits=limits)
+    )
+
+
+def _local_llm():
+    from langchain_community.chat_models import ChatLlamaCpp
+
+    return ChatLlamaCpp(
+        model_path=LOCAL_MODEL_PATH,
+        n_ctx=LOCAL_CONTEXT_SIZE,
+        n_threads=LOCAL_THREADS,
+        max_tokens=LOCAL_MAX_TOKENS,
+        temperature=TEMPERATURE,
+        verbose=False
+    )
+
+
+def _replay_llm():
+    record_llm = get_llm(REPLAY_RECORD_BACKEND) if REPLAY_RECORD_BACKEND else None
+    return ReplayChatModel.from_file(REPLAY_PATH, record_llm=record_llm, latency=REPLAY_LATENCY)
+
+
+def get_llm(backend: Optional[str] = None) -> BaseChatModel:
+    """
+    Chat model of the given backend (default COREP_LLM_BACKEND), one per
+    process so every ReportGenerator shares its client and connection pool.
+    Retries are handled by ReportGenerator.
+    """
+    return _create_llm(backend or LLM_BACKEND)
+
+
+@lru_cache(maxsize=None)
+def _create_llm(backend: str) -> BaseChatModel:
+    if backend == "groq":
+        return _groq_llm()
+    if backend == "local":
+        return _local_llm()
+    if backend == "replay":
+        return _replay_llm()
+    raise ValueError(f"Unknown LLM backend '{backend}', expected one of {BACKENDS}")
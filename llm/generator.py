@@ -1,162 +1,718 @@
 import os
 import json
 import re
-from typing import Dict, Any
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+import time
+import random
+import asyncio
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from langchain_core.messages import AIMessage, HumanMessage
 from core.schemas import COREPReport, COREPField
+from core.templates import TEMPLATES, fill_derived_values, get_template, validate_reports
+from llm.amounts import amounts_by_type, find_amounts
+from llm.backends import get_llm
+from llm.prompts import build_report_prompt
+from llm.repair import RepairError, load_json, parse_fields_reply, retry_prompt, validate_fields
+from llm.response_cache import SIMILARITY_THRESHOLD, ResponseCache
+from llm.streaming import ReportStreamParser, StreamError
+from utils.tracing import current_span, span
 import dotenv
 
 dotenv.load_dotenv()
 
+# Bump when REPORT_PROMPT changes so cached responses are not reused
+PROMPT_VERSION = "2"
+RESPONSE_CACHE_ENABLED = os.getenv("COREP_RESPONSE_CACHE_ENABLED", "1") == "1"
+# Default of ReportGenerator(cache=...): the process-wide response cache
+# when enabled. Pass cache=None for no cache at all.
+SHARED_CACHE = object()
+
+# Retrieval question of batch rows and service requests that do not set one
+DEFAULT_QUESTION = "Extract capital values for COREP Own Funds reporting"
+
+# Concurrency and backoff for batch generation
+MAX_CONCURRENCY = int(os.getenv("COREP_LLM_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("COREP_LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Output mode: "text" (prompted JSON) or a with_structured_output method
+# ("json_mode", "function_calling", "json_schema") that passes the
+# COREPReport schema to the model
+OUTPUT_MODE = os.getenv("COREP_OUTPUT_MODE", "text")
+# Follow-up calls asking again only for fields that failed validation
+FIELD_RETRIES = int(os.getenv("COREP_FIELD_RETRIES", "1"))
+
+# Skip the LLM when regex extraction is unambiguous
+RULES_FIRST = os.getenv("COREP_RULES_FIRST", "1") == "1"
+RULES_CONFIDENCE = 0.95
+
+# Wording that means stated amounts may need adjusting or interpreting
+HEDGE_PATTERN = re.compile(
+    r'\b(?:deduct\w*|adjust\w*|after|before|less|minus|net of|excluding|including|plus|'
+    r'approximately|approx|around|about|roughly|estimated?|expected|planned|pending|subject to|'
+    # Requirements and limits are not amounts held
+    r'requir\w*|ratios?|minimum|maximum|buffers?|thresholds?|targets?|limits?|floors?|'
+    r'at least|at most|up to|between|ranges?)\b|%|percent|'
+    # Ranges such as "150-200", "150 to 200" or "£150m or £200m"
+    r'\d\s*(?:[mk]|mn|bn|million|billion)?\s*(?:[-\u2013\u2014]|\bto\b|\bor\b)\s*(?:[£€$]|EUR|GBP|USD)?\s?\d|'
+    # Parenthesised amounts may be accounting negatives
+    r'\(\s*(?:[£€$]|EUR|GBP|USD)?\s?[-\u2212]?\d',
+    re.IGNORECASE
+)
+
+# (field code, extraction key, description, CRR article)
+RULE_FIELDS = [
+    ("OF_010", "cet1", "Common Equity Tier 1 capital", "Article 26"),
+    ("OF_020", "at1", "Additional Tier 1 capital", "Article 51"),
+    ("OF_030", "tier2", "Tier 2 capital", "Article 61"),
+    ("OF_040", "total", "Total Own Funds", "Article 72"),
+]
+
+# C 01.00 prompt generated from the template registry
+REPORT_PROMPT = build_report_prompt(("C 01.00",))
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache; uses the retriever's embeddings for near-duplicate hits."""
+    embeddings = None
+    if SIMILARITY_THRESHOLD > 0:
+        from rag.retriever import get_embeddings
+        embeddings = get_embeddings()
+    return ResponseCache(embeddings=embeddings)
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying after error, or None if it is not
+    retryable. Honours the provider's Retry-After header on rate limits.
+    """
+    status = getattr(error, "status_code", None)
+    transient = type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    if status != 429 and not (status and status >= 500) and not transient:
+        return None
+    
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), BACKOFF_MAX)
+    except (TypeError, ValueError):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)
+
+
+def _raw_content(message) -> str:
+    """Text of a structured-output reply: tool call arguments or message content."""
+    if getattr(message, "tool_calls", None):
+        return json.dumps(message.tool_calls[0]["args"])
+    if getattr(message, "invalid_tool_calls", None):
+        return message.invalid_tool_calls[0].get("args") or ""
+    return message.content
+
+
+def _record_usage(message) -> None:
+    """Add a reply's token counts, when the backend reports them, to the current span."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        current = current_span()
+        current.add("prompt_tokens", usage.get("input_tokens", 0))
+        current.add("completion_tokens", usage.get("output_tokens", 0))
+
+
+def _emit_fields(result: Dict[str, Any], on_field: Callable[[COREPField], None]) -> Dict[str, Any]:
+    if "report" in result:
+        for field in result["report"].fields:
+            on_field(field)
+    return result
+
+
+def _annotate(current, result: Dict[str, Any]) -> None:
+    """Record how a report was produced on its generate_report span."""
+    current.set("method", result.get("method"))
+    current.set("cached", bool(result.get("cached")))
+    if "error" in result:
+        current.set("error", result["error"])
+
+
+def _required_rows(template: str) -> List[str]:
+    """Rows the LLM must answer; derived rows are filled in afterwards."""
+    compiled = TEMPLATES.get(template)
+    return [code for code in compiled.rows if code not in compiled.derived] if compiled else []
+
+
+def _source_rule_from_context(context: str, article: str, field_code: str) -> str:
+    """Heading of the article or line naming the field code in the retrieved context."""
+    for pattern in (rf"^.*\b{article}\b.*$", rf"^.*\b{field_code}\b.*$"):
+        match = re.search(pattern, context, re.IGNORECASE | re.MULTILINE)
+        if match:
+            return match.group().strip(" -")
+    return f"CRR {article}"
+
+
 class ReportGenerator:
-    def __init__(self):
-        self.llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model_name="llama-3.3-70b-versatile",
-            temperature=0.1
+    def __init__(
+        self,
+        llm=None,
+        rules_first: Optional[bool] = None,
+        cache: Union[ResponseCache, None, object] = SHARED_CACHE,
+        output_mode: Optional[str] = None
+    ):
+        # Backend chosen by COREP_LLM_BACKEND unless a model is passed in
+        self.llm = llm or get_llm()
+        self.rules_first = RULES_FIRST if rules_first is None else rules_first
+        self.output_mode = output_mode or OUTPUT_MODE
+        self._structured = None
+        if self.output_mode != "text":
+            try:
+                self._structured = self.llm.with_structured_output(
+                    COREPReport, method=self.output_mode, include_raw=True
+                )
+            except (NotImplementedError, ValueError, TypeError):
+                # Model without structured output support: prompted JSON
+                self.output_mode = "text"
+        if cache is SHARED_CACHE:
+            cache = get_response_cache() if RESPONSE_CACHE_ENABLED else None
+        self.cache = cache
+        self.model_name = (
+            getattr(self.llm, "model_name", None) or getattr(self.llm, "model_path", None) or type(self.llm).__name__
         )
+        # Shared pause after a rate limit so concurrent calls back off together
+        self._resume_at = 0.0
         
     def extract_amounts_from_text(self, text: str) -> Dict[str, float]:
         """
-        Extract financial amounts from text using regex.
+        Extract financial amounts from text, normalised to millions.
         Helps the LLM by pre-extracting numbers.
         """
-        amounts = {}
-        
-        # Patterns for different capital types
-        patterns = {
-            'cet1': r'(?:CET1|Common Equity Tier 1|common equity).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
-            'at1': r'(?:AT1|Additional Tier 1|additional tier).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
-            'tier2': r'(?:Tier 2|tier two).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
-            'total': r'(?:Total|total own funds|total capital).*?(\d[,\d]*(?:\.\d+)?)\s*(?:million|m|M|£|€|EUR|GBP|USD)',
-        }
-        
-        for key, pattern in patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                # Take the last match (most specific)
-                amount_str = matches[-1].replace(',', '')
-                try:
-                    amount = float(amount_str)
-                    amounts[key] = amount
-                except:
-                    pass
-        
-        return amounts
+        # Take the last primary mention (most specific)
+        return {mention.key: mention.value for mention in find_amounts(text) if mention.primary}
     
-    def generate_report(self, context: str, scenario: str) -> Dict[str, Any]:
+    def try_rules_report(self, context: str, scenario: str) -> Optional[COREPReport]:
         """
-        Generate COREP report from scenario and regulatory context.
-        Returns dict with either report or error.
+        Build the report without the LLM when every component is stated
+        exactly once, in one currency, and nothing in the scenario
+        qualifies the amounts. Returns None when the scenario needs the LLM.
         """
+        if HEDGE_PATTERN.search(scenario):
+            return None
+        
+        mentions = amounts_by_type(scenario)
+        # Secondary amounts after a label usually describe adjustments
+        if any(not m.primary for group in mentions.values() for m in group):
+            return None
+        if len({m.currency for group in mentions.values() for m in group if m.currency}) > 1:
+            return None
+        # "150 GBP" with no magnitude probably means millions; let the LLM decide
+        if any(m.scale == 1.0 and abs(m.value) < 1 for group in mentions.values() for m in group):
+            return None
+        # Never publish a negative or sign-flipped amount without the LLM
+        if any(m.value < 0 for group in mentions.values() for m in group):
+            return None
+        
+        found = {}
+        for code, key, _, _ in RULE_FIELDS[:3]:
+            matches = mentions.get(key, [])
+            if len({m.value for m in matches}) != 1:
+                return None
+            found[code] = matches[-1]
+        
+        total_matches = mentions.get("total", [])
+        if total_matches:
+            component_sum = sum(m.value for m in found.values())
+            if len({m.value for m in total_matches}) != 1 or abs(total_matches[-1].value - component_sum) > 0.01:
+                return None
+            found["OF_040"] = total_matches[-1]
+        
+        fields = []
+        for code, _, description, article in RULE_FIELDS:
+            field = COREPField(field_code=code, description=description)
+            if code in found:
+                mention = found[code]
+                field.value = mention.value
+                field.confidence = RULES_CONFIDENCE
+                field.justification = f"Stated explicitly in scenario: '{scenario[mention.start:mention.end]}'"
+                field.source_rule = _source_rule_from_context(context, article, code)
+            fields.append(field)
         
+        report = COREPReport(fields=fields)
+        self._calculate_missing_total(report)
+        total = fields[-1]
+        if "OF_040" not in found and total.value is not None:
+            total.source_rule = _source_rule_from_context(context, RULE_FIELDS[-1][3], "OF_040")
+        return report
+    
+    def _build_messages(self, context: str, scenario: str, templates: Tuple[str, ...] = ("C 01.00",)):
         # Pre-extract amounts to help LLM
         extracted_amounts = self.extract_amounts_from_text(scenario)
         amounts_str = json.dumps(extracted_amounts, indent=2)
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a COREP regulatory reporting assistant for UK banks.
-            Extract capital values from the scenario and map to COREP Own Funds template fields.
+        return build_report_prompt(templates).format_messages(
+            context=context,
+            scenario=scenario,
+            amounts_found=amounts_str
+        )
+    
+    def _parse_response(self, content: str) -> Dict[str, Any]:
+        """
+        Parse a report completion, repairing near-valid JSON locally.
+        Valid fields are kept when others fail validation or are missing; the
+        result is then an error carrying "failed_fields" ({code: error}) and
+        "partial_report" so _merge_fields can complete it from a follow-up answer.
+        """
+        try:
+            data, repaired = load_json(content)
             
-            COREP FIELDS:
-            - OF_010: Common Equity Tier 1 (CET1) capital
-            - OF_020: Additional Tier 1 (AT1) capital  
-            - OF_030: Tier 2 capital
-            - OF_040: Total Own Funds (sum of OF_010 + OF_020 + OF_030)
+            # Validate required structure
+            if not isinstance(data.get("fields"), list):
+                return {"error": "Invalid response: missing 'fields' key"}
             
-            RULES:
-            1. Extract ONLY values explicitly stated in the scenario.
-            2. If a value is calculated/implied but not stated, set it to null.
-            3. If CET1, AT1, or Tier 2 are stated but Total is not, calculate Total.
-            4. All values must be non-negative.
-            5. Values are in millions (e.g., "150 million" = 150).
+            template = data.get("template", "C 01.00")
+            fields, failed = validate_fields(data["fields"], _required_rows(template))
+            report = COREPReport(template=template, fields=fields)
+            if failed:
+                errors = "; ".join(f"{code}: {error}" for code, error in failed.items())
+                return {"error": f"Invalid fields in response: {errors}", "failed_fields": failed, "partial_report": report}
+            return self._finish_report(report, "local" if repaired else None)
             
-            I found these amounts in the text: {amounts_found}
-            """),
+        except RepairError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Generation failed: {str(e)}"}
+    
+    def _finish_report(self, report: COREPReport, repaired: Optional[str] = None) -> Dict[str, Any]:
+        # Derived rows are not required from the LLM; add them to be filled
+        compiled = TEMPLATES.get(report.template)
+        if compiled is not None:
+            present = {field.field_code for field in report.fields}
+            missing = [code for code in compiled.derived if code not in present]
+            if missing:
+                report.fields.extend(COREPField(field_code=code, description=compiled.rows[code].description) for code in missing)
+                rows = list(compiled.rows)
+                report.fields.sort(key=lambda f: rows.index(f.field_code) if f.field_code in rows else len(rows))
+        self._calculate_missing_total(report)
+        result = {"success": True, "report": report, "method": "llm"}
+        if repaired:
+            result["repaired"] = repaired
+        return result
+    
+    def _retry_messages(self, messages: List, content: str, result: Dict[str, Any]) -> List:
+        return list(messages) + [AIMessage(content=content), HumanMessage(content=retry_prompt(result["failed_fields"]))]
+    
+    def _merge_fields(self, result: Dict[str, Any], reply: str) -> Dict[str, Any]:
+        """
+        Merge the corrected fields of a follow-up reply into the partial report.
+        Failures without a field code (entries that were not objects) are
+        dropped after the follow-up; others stay failed until answered.
+        """
+        entries = parse_fields_reply(reply)
+        if entries is None:
+            return result
+        fields, _ = validate_fields(entries)
+        report = result["partial_report"]
+        rows = list(TEMPLATES[report.template].rows) if report.template in TEMPLATES else []
+        by_code = {f.field_code: f for f in report.fields}
+        # New codes must be rows of the template, as a reply may answer several templates
+        fixed = {
+            f.field_code: f for f in fields
+            if f.field_code in result["failed_fields"] or (f.field_code not in by_code and (not rows or f.field_code in rows))
+        }
+        by_code.update(fixed)
+        # Back in template row order
+        report.fields = sorted(by_code.values(), key=lambda f: rows.index(f.field_code) if f.field_code in rows else len(rows))
+        
+        failed = {
+            code: error for code, error in result["failed_fields"].items()
+            if code not in fixed and not code.startswith("fields[")
+        }
+        if failed:
+            errors = "; ".join(f"{code}: {error}" for code, error in failed.items())
+            return {"error": f"Invalid fields in response: {errors}", "failed_fields": failed, "partial_report": report}
+        return self._finish_report(report, "retry")
+    
+    def _complete(self, messages: List) -> Dict[str, Any]:
+        """
+        One report from the LLM: schema-constrained when output_mode allows,
+        locally repaired, then at most FIELD_RETRIES follow-ups for fields
+        that still fail validation.
+        """
+        if self._structured is not None:
+            output = self._invoke(messages, self._structured)
+            parsed = output.get("parsed")
+            if isinstance(parsed, COREPReport) and self._has_required_rows(parsed):
+                return self._finish_report(parsed)
+            content = _raw_content(output["raw"])
+        else:
+            content = self._invoke(messages).content
+        return self._parse_with_retries(messages, content)
+    
+    async def _acomplete(self, messages: List) -> Dict[str, Any]:
+        """Async version of _complete."""
+        if self._structured is not None:
+            output = await self._ainvoke(messages, self._structured)
+            parsed = output.get("parsed")
+            if isinstance(parsed, COREPReport) and self._has_required_rows(parsed):
+                return self._finish_report(parsed)
+            content = _raw_content(output["raw"])
+        else:
+            content = (await self._ainvoke(messages)).content
+        return await self._aparse_with_retries(messages, content)
+    
+    def _has_required_rows(self, report: COREPReport) -> bool:
+        present = {field.field_code for field in report.fields}
+        return all(code in present for code in _required_rows(report.template))
+    
+    def _parse_with_retries(self, messages: List, content: str, templates: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """
+        Parse content, then ask up to FIELD_RETRIES times for failed or missing
+        fields. With templates, content is a multi-template response.
+        """
+        with span("parse"):
+            result = self._parse_multi_response(content, templates) if templates else self._parse_response(content)
+        for _ in range(FIELD_RETRIES):
+            if "failed_fields" not in result:
+                break
+            reply = self._invoke(self._retry_messages(messages, content, result)).content
+            with span("parse", retry=True):
+                result = self._merge_multi_fields(result, reply) if templates else self._merge_fields(result, reply)
+        return result
+    
+    async def _aparse_with_retries(self, messages: List, content: str, templates: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """Async version of _parse_with_retries."""
+        with span("parse"):
+            result = self._parse_multi_response(content, templates) if templates else self._parse_response(content)
+        for _ in range(FIELD_RETRIES):
+            if "failed_fields" not in result:
+                break
+            reply = (await self._ainvoke(self._retry_messages(messages, content, result))).content
+            with span("parse", retry=True):
+                result = self._merge_multi_fields(result, reply) if templates else self._merge_fields(result, reply)
+        return result
+    
+    def _stream_report(self, messages: List, on_field: Callable[[COREPField], None]) -> Dict[str, Any]:
+        """
+        Report streamed to on_field, with the same repair and retries as
+        _complete: fields that fail validation are asked for again by a
+        follow-up. Structured output cannot be streamed field by field, so
+        it runs _complete and passes on the fields afterwards. Output that
+        is not a report JSON object (StreamError) or cannot be parsed falls
+        back to one _complete call.
+        """
+        if self._structured is not None:
+            return _emit_fields(self._complete(messages), on_field)
+        try:
+            parser = self._stream(messages, on_field)
+        except StreamError:
+            return self._complete(messages)
+        result = self._parse_with_retries(messages, parser.text)
+        if "error" in result and "failed_fields" not in result:
+            result = self._complete(messages)
+        return result
+    
+    async def _astream_report(self, messages: List, on_field: Callable[[COREPField], None]) -> Dict[str, Any]:
+        """Async version of _stream_report."""
+        if self._structured is not None:
+            return _emit_fields(await self._acomplete(messages), on_field)
+        try:
+            parser = await self._astream(messages, on_field)
+        except StreamError:
+            return await self._acomplete(messages)
+        result = await self._aparse_with_retries(messages, parser.text)
+        if "error" in result and "failed_fields" not in result:
+            result = await self._acomplete(messages)
+        return result
+    
+    def _parse_multi_response(self, content: str, templates: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        Parse a multi-template completion. Each template's fields are
+        validated like _parse_response, after dropping codes that are not
+        rows of that template; failures of all templates are combined in
+        "failed_fields" so one follow-up can ask for just those fields.
+        """
+        try:
+            data, repaired = load_json(content)
             
-            ("human", """REGULATORY CONTEXT:
-            {context}
+            if not isinstance(data.get("reports"), list):
+                return {"error": "Invalid response: missing 'reports' key"}
             
-            REPORTING SCENARIO:
-            {scenario}
+            entries = {}
+            for entry in data["reports"]:
+                if isinstance(entry, dict) and entry.get("template") in templates and isinstance(entry.get("fields"), list):
+                    entries[entry["template"]] = entry["fields"]
             
-            Extract the values and return ONLY JSON matching this exact format:
-            {{
-                "template": "C 01.00",
-                "fields": [
-                    {{
-                        "field_code": "OF_010",
-                        "description": "Common Equity Tier 1 capital",
-                        "value": <number or null>,
-                        "confidence": <0.0 to 1.0>,
-                        "justification": "<why you extracted this value>",
-                        "source_rule": "<regulatory rule from context>"
-                    }},
-                    ... repeat for OF_020, OF_030, OF_040
+            partials = {}
+            for code in templates:
+                rows = TEMPLATES[code].rows
+                known = [
+                    field for field in entries.get(code, [])
+                    if not (isinstance(field, dict) and field.get("field_code") and field["field_code"] not in rows)
                 ]
-            }}
+                fields, failed = validate_fields(known, _required_rows(code))
+                report = COREPReport(template=code, fields=fields)
+                partials[code] = (
+                    {"error": "Invalid fields", "failed_fields": failed, "partial_report": report}
+                    if failed else self._finish_report(report)
+                )
+            return self._combine_reports(partials, "local" if repaired else None)
             
-            Return ONLY the JSON, no other text.""")
-        ])
+        except RepairError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Generation failed: {str(e)}"}
+    
+    def _merge_multi_fields(self, result: Dict[str, Any], reply: str) -> Dict[str, Any]:
+        """Merge a follow-up reply into each template that still has failed fields."""
+        partials = {
+            code: self._merge_fields(partial, reply) if "failed_fields" in partial else partial
+            for code, partial in result["partials"].items()
+        }
+        return self._combine_reports(partials, "retry")
+    
+    def _combine_reports(self, partials: Dict[str, Dict[str, Any]], repaired: Optional[str] = None) -> Dict[str, Any]:
+        failed = {code: error for partial in partials.values() for code, error in partial.get("failed_fields", {}).items()}
+        if failed:
+            errors = "; ".join(f"{code}: {error}" for code, error in failed.items())
+            return {"error": f"Invalid fields in response: {errors}", "failed_fields": failed, "partials": partials}
         
+        # Validate each report against the model generated for its template
+        reports = {
+            code: get_template(code).model(template=code, fields=partial["report"].fields)
+            for code, partial in partials.items()
+        }
+        fill_derived_values(reports)
+        result = {"success": True, "reports": reports, "violations": validate_reports(reports), "method": "llm"}
+        if repaired:
+            result["repaired"] = repaired
+        return result
+    
+    def _cached_report(self, context: str, scenario: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        with span("response_cache") as current:
+            hit = self.cache.get(scenario, context, PROMPT_VERSION, self.model_name)
+            current.set("cache_hit", hit is not None)
+            if hit is None:
+                return None
+            report, level = hit
+            current.set("cache_level", level)
+        return {"success": True, "report": report, "method": "llm", "cached": True, "cache_level": level}
+    
+    def _store_report(self, context: str, scenario: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.cache is not None and "report" in result:
+            self.cache.put(scenario, context, PROMPT_VERSION, self.model_name, result["report"])
+        return result
+    
+    def _invoke(self, messages, runnable=None):
+        runnable = runnable or self.llm
+        with span("llm_call", model=self.model_name) as current:
+            for attempt in range(MAX_RETRIES + 1):
+                current.set("attempts", attempt + 1)
+                try:
+                    response = runnable.invoke(messages)
+                    # Structured output returns {"raw", "parsed", ...}
+                    _record_usage(response["raw"] if isinstance(response, dict) else response)
+                    return response
+                except Exception as e:
+                    delay = _retry_delay(e, attempt)
+                    if delay is None or attempt == MAX_RETRIES:
+                        raise
+                    time.sleep(delay)
+    
+    def _stream(self, messages, on_field: Callable[[COREPField], None]) -> ReportStreamParser:
+        """
+        Stream the completion through ReportStreamParser, calling on_field
+        for each field as it closes. Stops reading once the JSON is complete;
+        StreamError cancels the request. Only failures before the first
+        field are retried.
+        """
+        with span("llm_call", model=self.model_name, streamed=True) as current:
+            for attempt in range(MAX_RETRIES + 1):
+                current.set("attempts", attempt + 1)
+                parser = ReportStreamParser()
+                stream = self.llm.stream(messages)
+                try:
+                    for chunk in stream:
+                        _record_usage(chunk)
+                        for field in parser.feed(chunk.content):
+                            on_field(field)
+                        if parser.done:
+                            break
+                    return parser
+                except StreamError:
+                    raise
+                except Exception as e:
+                    delay = _retry_delay(e, attempt)
+                    if parser.fields or delay is None or attempt == MAX_RETRIES:
+                        raise
+                    time.sleep(delay)
+                finally:
+                    stream.close()
+    
+    async def _astream(self, messages, on_field: Callable[[COREPField], None]) -> ReportStreamParser:
+        """Async version of _stream, sharing the rate-limit pause with _ainvoke."""
+        with span("llm_call", model=self.model_name, streamed=True) as current:
+            for attempt in range(MAX_RETRIES + 1):
+                current.set("attempts", attempt + 1)
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                parser = ReportStreamParser()
+                stream = self.llm.astream(messages)
+                try:
+                    async for chunk in stream:
+                        _record_usage(chunk)
+                        for field in parser.feed(chunk.content):
+                            on_field(field)
+                        if parser.done:
+                            break
+                    return parser
+                except StreamError:
+                    raise
+                except Exception as e:
+                    delay = _retry_delay(e, attempt)
+                    if parser.fields or delay is None or attempt == MAX_RETRIES:
+                        raise
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                finally:
+                    await stream.aclose()
+    
+    async def _ainvoke(self, messages, runnable=None):
+        runnable = runnable or self.llm
+        with span("llm_call", model=self.model_name) as current:
+            for attempt in range(MAX_RETRIES + 1):
+                current.set("attempts", attempt + 1)
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                try:
+                    response = await runnable.ainvoke(messages)
+                    _record_usage(response["raw"] if isinstance(response, dict) else response)
+                    return response
+                except Exception as e:
+                    delay = _retry_delay(e, attempt)
+                    if delay is None or attempt == MAX_RETRIES:
+                        raise
+                    self._resume_at = max(self._resume_at, time.monotonic() + delay)
+    
+    def _report_without_llm(
+        self, context: str, scenario: str, on_field: Optional[Callable[[COREPField], None]]
+    ) -> Optional[Dict[str, Any]]:
+        """Rules-first or cached result, passing its fields to on_field."""
+        result = None
+        if self.rules_first:
+            with span("rules_first") as current:
+                report = self.try_rules_report(context, scenario)
+                current.set("matched", report is not None)
+            if report is not None:
+                result = {"success": True, "report": report, "method": "rules"}
+        if result is None:
+            result = self._cached_report(context, scenario)
+        if result is not None and on_field is not None:
+            _emit_fields(result, on_field)
+        return result
+    
+    def generate_report(
+        self, context: str, scenario: str, on_field: Optional[Callable[[COREPField], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate COREP report from scenario and regulatory context.
+        Returns dict with either report or error.
+        Unambiguous scenarios are answered by try_rules_report without the LLM,
+        repeated ones from the response cache (marked "cached": True).
+        With on_field, the completion is streamed and each field is passed to
+        on_field as soon as it is parsed (see _stream_report); failed or
+        missing fields are retried as without streaming.
+        Derived values are filled in the returned report only.
+        Traced as a "generate_report" span with rules, cache, prompt,
+        LLM call and parse stages.
+        """
+        with span("generate_report", output_mode=self.output_mode) as current:
+            result = self._report_without_llm(context, scenario, on_field)
+            if result is None:
+                with span("prompt"):
+                    messages = self._build_messages(context, scenario)
+                try:
+                    if on_field is None:
+                        result = self._complete(messages)
+                    else:
+                        result = self._stream_report(messages, on_field)
+                except Exception as e:
+                    result = {"error": f"Generation failed: {str(e)}"}
+                else:
+                    result = self._store_report(context, scenario, result)
+            _annotate(current, result)
+            return result
+    
+    async def agenerate_report(
+        self, context: str, scenario: str, on_field: Optional[Callable[[COREPField], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate_report.
+        Rate-limited calls are retried with backoff shared across calls.
+        """
+        with span("generate_report", output_mode=self.output_mode) as current:
+            result = self._report_without_llm(context, scenario, on_field)
+            if result is None:
+                with span("prompt"):
+                    messages = self._build_messages(context, scenario)
+                try:
+                    if on_field is None:
+                        result = await self._acomplete(messages)
+                    else:
+                        result = await self._astream_report(messages, on_field)
+                except Exception as e:
+                    result = {"error": f"Generation failed: {str(e)}"}
+                else:
+                    result = self._store_report(context, scenario, result)
+            _annotate(current, result)
+            return result
+    
+    def generate_reports(self, context: str, scenario: str, templates: List[str]) -> Dict[str, Any]:
+        """
+        Fill several COREP templates from one scenario with a single LLM call.
+        Returns {"success", "reports": {template: COREPReport}, "violations"}
+        or {"error"}. Violations include inter-template rules.
+        """
+        templates = tuple(get_template(code).spec.code for code in templates)
+        messages = self._build_messages(context, scenario, templates)
         try:
-            response = self.llm.invoke(
-                prompt.format_messages(
-                    context=context,
-                    scenario=scenario,
-                    amounts_found=amounts_str
-                )
-            )
-            
-            # Clean the response
-            content = response.content.strip()
-            
-            # Extract JSON if wrapped in markdown or other text
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                content = json_match.group()
-            
-            # Parse and validate
-            data = json.loads(content)
-            
-            # Validate required structure
-            if "fields" not in data:
-                return {"error": "Invalid response: missing 'fields' key"}
-            
-            # Convert to Pydantic model for validation
-            report = COREPReport(**data)
-
-            self._calculate_missing_total(report)
-            
-            return {"success": True, "report": report}
-            
-        except json.JSONDecodeError as e:
-            return {"error": f"Failed to parse LLM response as JSON: {str(e)}"}
+            return self._parse_with_retries(messages, self._invoke(messages).content, templates)
         except Exception as e:
             return {"error": f"Generation failed: {str(e)}"}
     
-    def _calculate_missing_total(self, report: COREPReport):
+    async def agenerate_reports(self, context: str, scenario: str, templates: List[str]) -> Dict[str, Any]:
+        """Async version of generate_reports."""
+        templates = tuple(get_template(code).spec.code for code in templates)
+        messages = self._build_messages(context, scenario, templates)
+        try:
+            return await self._aparse_with_retries(messages, (await self._ainvoke(messages)).content, templates)
+        except Exception as e:
+            return {"error": f"Generation failed: {str(e)}"}
+    
+    async def generate_many(
+        self,
+        scenarios: List[str],
+        contexts: Union[str, List[str]],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Calculate total own funds if components exist but total is missing.
+        Generate reports for many scenarios concurrently.
+        contexts is one context for all scenarios or one per scenario.
+        At most max_concurrency calls are in flight; results keep input order.
         """
-        field_map = {f.field_code: f for f in report.fields}
+        if isinstance(contexts, str):
+            contexts = [contexts] * len(scenarios)
+        semaphore = asyncio.Semaphore(max_concurrency or MAX_CONCURRENCY)
         
-        # Get component values
-        cet1 = field_map.get("OF_010")
-        at1 = field_map.get("OF_020")
-        tier2 = field_map.get("OF_030")
-        total = field_map.get("OF_040")
+        async def run(context, scenario):
+            async with semaphore:
+                return await self.agenerate_report(context, scenario)
         
-        if total and total.value is None:
-            components = []
-            for comp in [cet1, at1, tier2]:
-                if comp and comp.value is not None:
-                    components.append(comp.value)
-            
-            if len(components) == 3:
-                total_value = sum(components)
-                total.value = total_value
-                total.justification = "Calculated as sum of CET1 + AT1 + Tier 2"
-                total.source_rule = "CRR Article 72"
-                total.confidence = min(cet1.confidence, at1.confidence, tier2.confidence)
+        return await asyncio.gather(*(run(c, s) for c, s in zip(contexts, scenarios)))
+    
+    def _calculate_missing_total(self, report: COREPReport):
+        """
+        Calculate total own funds if components exist but total is missing.
+        Derived rows and their justification come from the template registry.
+        """
+        fill_derived_values({report.template: report})
@@ -0,0 +1,74 @@
+from functools import lru_cache
+from typing import Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from core.templates import get_template
+
+SYSTEM_PROMPT = """You are a COREP regulatory reporting assistant for UK banks.
+Extract values from the scenario and map them to the COREP template fields below.
+
+{sections}
+
+RULES:
+1. Extract ONLY values explicitly stated in the scenario.
+2. If a value is calculated/implied but not stated, set it to null.
+3. If every input of a field with a formula is stated but the field is not, calculate it.
+4. Monetary values are in millions (e.g., "150 million" = 150) and must be non-negative.
+5. Percentages are numbers from 0 to 100 (e.g., "14.5%" = 14.5).
+
+I found these amounts in the text: {{amounts_found}}
+"""
+
+HUMAN_PROMPT = """REGULATORY CONTEXT:
+{{context}}
+
+REPORTING SCENARIO:
+{{scenario}}
+
+Extract the values and return ONLY JSON matching this exact format:
+{example}
+
+Return ONLY the JSON, no other text."""
+
+FIELD_EXAMPLE = [
+    "{{{{",
+    '    "field_code": "{code}",',
+    '    "description": "{description}",',
+    '    "value": <number or null>,',
+    '    "confidence": <0.0 to 1.0>,',
+    '    "justification": "<why you extracted this value>",',
+    '    "source_rule": "<regulatory rule from context>"',
+    "}}}},",
+]
+
+
+def _report_example(code: str, indent: str = "") -> str:
+    template = get_template(code)
+    first, *rest = template.spec.rows
+    lines = ["{{", f'    "template": "{code}",', '    "fields": [']
+    lines += ["        " + line.format(code=first.code, description=first.description) for line in FIELD_EXAMPLE]
+    if rest:
+        lines.append(f"        ... repeat for {', '.join(row.code for row in rest)}")
+    lines += ["    ]", "}}"]
+    return "\n".join(indent + line for line in lines)
+
+
+@lru_cache(maxsize=None)
+def build_report_prompt(templates: Tuple[str, ...] = ("C 01.00",)) -> ChatPromptTemplate:
+    """
+    Prompt generated from the template registry, built once per template set.
+    One template returns a single report object; several return
+    {"reports": [...]} so one call fills all of them.
+    Input variables: context, scenario, amounts_found.
+    """
+    sections = "\n\n".join(get_template(code).prompt_section for code in templates)
+    if len(templates) == 1:
+        example = _report_example(templates[0])
+    else:
+        reports = ",\n".join(_report_example(code, indent="        ") for code in templates)
+        example = '{{\n    "reports": [\n' + reports + "\n    ]\n}}"
+    return ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT.format(sections=sections)),
+        ("human", HUMAN_PROMPT.format(example=example)),
+    ])
@@ -0,0 +1,148 @@
+"""
+Deterministic repair of near-valid report JSON.
+
+LLM output is often almost JSON: wrapped in prose or a ``` fence, with
+trailing commas, Python literals, comments, or cut off before the last
+brackets. load_json fixes those locally instead of paying for another
+call; validate_fields then keeps every valid field and reports the
+invalid ones by code so only those need to be asked for again.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.schemas import COREPField
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+_LINE_COMMENT = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*')
+_TRAILING_COMMA = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])')
+_LITERALS = re.compile(r'("(?:\\.|[^"\\])*")|\b(None|True|False|NaN)\b')
+_LITERAL_VALUES = {"None": "null", "True": "true", "False": "false", "NaN": "null"}
+
+
+class RepairError(ValueError):
+    """The text could not be turned into a JSON object."""
+
+
+def _extract_object(text: str) -> str:
+    fenced = _FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        raise RepairError("No JSON object in response")
+    return text[start:]
+
+
+def _close_brackets(text: str) -> Tuple[str, bool]:
+    """
+    Cut anything after the root object, or close a truncated one.
+    An object cut off inside an array (a field entry) is dropped rather
+    than closed, since its last value may itself be cut short ("15" of
+    "150"). Returns (text, closed) where closed means the text was cut
+    or brackets were added.
+    """
+    # (closing bracket, position of the opening one)
+    stack, in_string, escaped = [], False, False
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(("}" if char == "{" else "]", position))
+        elif char in "}]":
+            if not stack or stack.pop()[0] != char:
+                raise RepairError(f"Unbalanced '{char}' in response")
+            if not stack:
+                return text[:position + 1], False
+    # Truncated inside an array element object: drop the whole element
+    for depth in range(1, len(stack)):
+        if stack[depth][0] == "}" and stack[depth - 1][0] == "]":
+            text = re.sub(r",\s*$", "", text[:stack[depth][1]].rstrip())
+            return text + "".join(closer for closer, _ in reversed(stack[:depth])), True
+    # Otherwise drop a dangling key or partial value, then close
+    if in_string:
+        text += '"'
+    text = re.sub(r'(?:,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', "", text.rstrip())
+    if text.endswith(":"):
+        text += "null"
+    return text + "".join(closer for closer, _ in reversed(stack)), True
+
+
+def load_json(text: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse the JSON object in text, repairing it if needed.
+    Returns (data, repaired). Raises RepairError if nothing works.
+    """
+    candidate = _extract_object(text.strip())
+    closed, truncated = _close_brackets(candidate)
+    try:
+        data = json.loads(closed)
+    except ValueError:
+        pass
+    else:
+        if not isinstance(data, dict):
+            raise RepairError("Response JSON is not an object")
+        return data, truncated
+    repaired = _LINE_COMMENT.sub(lambda m: m.group(1) or "", candidate)
+    repaired = _LITERALS.sub(lambda m: m.group(1) or _LITERAL_VALUES[m.group(2)], repaired)
+    repaired, _ = _close_brackets(repaired)
+    repaired = _TRAILING_COMMA.sub(lambda m: m.group(1) or m.group(2), repaired)
+    try:
+        data = json.loads(repaired)
+    except ValueError as e:
+        raise RepairError(f"Failed to parse LLM response as JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise RepairError("Response JSON is not an object")
+    return data, True
+
+
+def validate_fields(entries: List[Any], expected: Sequence[str] = ()) -> Tuple[List[COREPField], Dict[str, str]]:
+    """
+    Validate field entries one by one.
+    Returns (valid fields, {field code: error}) so one bad field does not
+    discard the others. Codes in expected that are not in entries at all
+    are reported as failed too, so they can be asked for again.
+    """
+    valid, failed = [], {}
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            failed[f"fields[{position}]"] = "not a JSON object"
+            continue
+        code = entry.get("field_code")
+        try:
+            valid.append(COREPField(**entry))
+        except (ValueError, TypeError) as e:
+            message = e.errors()[0]["msg"] if hasattr(e, "errors") else str(e)
+            failed[code or f"fields[{position}]"] = message
+    answered = {field.field_code for field in valid} | set(failed)
+    for code in expected:
+        if code not in answered:
+            failed[code] = "missing from response"
+    return valid, failed
+
+
+def retry_prompt(failed: Dict[str, str]) -> str:
+    """Follow-up message asking again only for the fields that failed."""
+    lines = [f"- {code}: {error}" for code, error in failed.items()]
+    return (
+        "These fields in your JSON were invalid:\n" + "\n".join(lines) + "\n\n"
+        'Return ONLY JSON of the form {"fields": [...]} containing corrected '
+        "entries for these field codes, in the same field format. No other text."
+    )
+
+
+def parse_fields_reply(content: str) -> Optional[List[Any]]:
+    """Field entries from a reply to retry_prompt, or None if unusable."""
+    try:
+        data, _ = load_json(content)
+    except RepairError:
+        return None
+    entries = data.get("fields")
+    return entries if isinstance(entries, list) else None
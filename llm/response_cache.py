@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from core.schemas import COREPReport
+from llm.amounts import find_amounts
+
+RESPONSE_CACHE_PATH = os.getenv("COREP_RESPONSE_CACHE", ".corep_cache/responses.sqlite")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("COREP_RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_AGE = float(os.getenv("COREP_RESPONSE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+# Cosine similarity for the near-duplicate level; 0 disables it
+SIMILARITY_THRESHOLD = float(os.getenv("COREP_RESPONSE_CACHE_SIMILARITY", "0"))
+
+
+def normalize_scenario(scenario: str) -> str:
+    return " ".join(scenario.lower().split())
+
+
+def _sha256(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _amounts_key(scenario: str) -> str:
+    # Near-duplicate hits are only allowed between scenarios stating the
+    # same amounts, so "CET1 150m" never answers "CET1 160m".
+    mentions = sorted((m.key, round(m.value, 6), m.currency or "") for m in find_amounts(scenario))
+    return _sha256(json.dumps(mentions))
+
+
+class ResponseCache:
+    """
+    Persistent cache of validated reports in SQLite.
+    - Exact level: hash of normalised scenario, context, prompt version and model.
+    - Similarity level (optional): nearest cached scenario embedding with the
+      same context, prompt, model and extracted amounts, above a threshold.
+    Entries expire after max_age seconds; beyond max_entries the least
+    recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str = RESPONSE_CACHE_PATH,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_age: float = RESPONSE_CACHE_MAX_AGE,
+        embeddings=None,
+        similarity_threshold: float = SIMILARITY_THRESHOLD
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.embeddings = embeddings if similarity_threshold > 0 else None
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, group_key TEXT NOT NULL, report TEXT NOT NULL, "
+            "embedding BLOB, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_group ON responses (group_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_access ON responses (last_access)")
+        self._conn.commit()
+
+    def _keys(self, scenario: str, context: str, prompt_version: str, model: str) -> Tuple[str, str]:
+        normalized = normalize_scenario(scenario)
+        key = _sha256(normalized, context, prompt_version, model)
+        group_key = _sha256(context, prompt_version, model, _amounts_key(scenario))
+        return key, group_key
+
+    def _embed(self, scenario: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(normalize_scenario(scenario)), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, scenario: str, context: str, prompt_version: str, model: str) -> Optional[Tuple[COREPReport, str]]:
+        """Return (report, "exact" | "similar") on a hit, None on a miss."""
+        key, group_key = self._keys(scenario, context, prompt_version, model)
+        now = time.time()
+        oldest = now - self.max_age
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, report FROM responses WHERE key = ? AND created_at >= ?", (key, oldest)
+            ).fetchone()
+            level = "exact"
+
+            if row is None and self.embeddings is not None:
+                rows = self._conn.execute(
+                    "SELECT key, report, embedding FROM responses "
+                    "WHERE group_key = ? AND created_at >= ? AND embedding IS NOT NULL",
+                    (group_key, oldest)
+                ).fetchall()
+                if rows:
+                    matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, _, blob in rows])
+                    scores = matrix @ self._embed(scenario)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        row = rows[best][:2]
+                        level = "similar"
+
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+            self.hits += 1
+        return COREPReport.model_validate_json(row[1]), level
+
+    def put(self, scenario: str, context: str, prompt_version: str, model: str, report: COREPReport) -> None:
+        key, group_key = self._keys(scenario, context, prompt_version, model)
+        embedding = self._embed(scenario).tobytes() if self.embeddings is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, group_key, report, embedding, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, group_key, report.model_dump_json(), embedding, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size, "max_entries": self.max_entries}
@@ -0,0 +1,124 @@
+"""
+Incremental parsing of a streamed report completion.
+
+ReportStreamParser is fed the completion a token at a time. It tracks
+string/escape state and the bracket stack, so each object of the
+"fields" array is parsed and validated as a COREPField as soon as its
+closing brace arrives. A field that fails validation is recorded and
+streaming goes on, so only that field needs asking for again. Output
+that cannot be a report (unbalanced brackets, too much prose before or
+after the JSON) raises StreamError while the completion is still
+streaming, so the caller can cancel the request.
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+from core.schemas import COREPField
+
+# Characters allowed before the opening brace (e.g. "Here is the JSON:" or a ``` fence)
+MAX_PREAMBLE = 200
+# Characters allowed after the root object closes (e.g. a closing fence)
+MAX_TRAILER = 200
+
+_FIELDS_KEY = re.compile(r'"fields"\s*:\s*$')
+_CLOSING = {"}": "{", "]": "["}
+
+
+class StreamError(ValueError):
+    """The streamed completion cannot be a valid report."""
+
+
+class ReportStreamParser:
+    """
+    Parser for the single-report format {"template": ..., "fields": [{...}, ...]}.
+    feed() returns the valid fields completed by a chunk; text is the JSON
+    seen so far. Invalid fields are in failed ({field code: error}, keyed
+    "fields[<position>]" when the object has no code), as validate_fields
+    reports them.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._fields_depth = None  # stack depth inside the "fields" array
+        self._field_start = None
+        self._started = False
+        self._preamble = 0
+        self._trailer = 0
+        self.done = False
+        self.fields: List[COREPField] = []
+        self.failed: Dict[str, str] = {}
+
+    @property
+    def text(self) -> str:
+        return "".join(self._buffer)
+
+    def feed(self, chunk: str) -> List[COREPField]:
+        completed = []
+        for char in chunk:
+            if self.done:
+                if not char.isspace():
+                    self._trailer += 1
+                    if self._trailer > MAX_TRAILER:
+                        raise StreamError("Unexpected text after the report JSON")
+                continue
+            if not self._started:
+                if char != "{":
+                    self._preamble += 1
+                    if self._preamble > MAX_PREAMBLE:
+                        raise StreamError("No JSON object at the start of the response")
+                    continue
+                self._started = True
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "[" and len(self._stack) == 1 and _FIELDS_KEY.search("".join(self._buffer[-32:-1])):
+                    self._fields_depth = 2
+                elif char == "{" and len(self._stack) == self._fields_depth:
+                    self._field_start = len(self._buffer) - 1
+                self._stack.append(char)
+            elif char in "}]":
+                if not self._stack or self._stack[-1] != _CLOSING[char]:
+                    raise StreamError(f"Unbalanced '{char}' in response")
+                self._stack.pop()
+                if char == "}" and self._field_start is not None and len(self._stack) == self._fields_depth:
+                    field = self._parse_field()
+                    if field is not None:
+                        completed.append(field)
+                elif char == "]" and len(self._stack) == 1:
+                    self._fields_depth = None
+                if not self._stack:
+                    self.done = True
+        return completed
+
+    def _parse_field(self) -> Optional[COREPField]:
+        raw = "".join(self._buffer[self._field_start:])
+        self._field_start = None
+        position = len(self.fields) + len(self.failed)
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            self.failed[f"fields[{position}]"] = "not valid JSON"
+            return None
+        try:
+            field = COREPField(**entry)
+        except (ValueError, TypeError) as e:
+            message = e.errors()[0]["msg"] if hasattr(e, "errors") else str(e)
+            self.failed[entry.get("field_code") or f"fields[{position}]"] = message
+            return None
+        self.fields.append(field)
+        return field
@@ -0,0 +1,186 @@
+import os
+import math
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+# Index type: flat (exact), ivf_flat, hnsw or ivf_pq
+INDEX_TYPE = os.getenv("COREP_INDEX_TYPE", "flat")
+
+# Build-time settings; part of the persisted index key
+IVF_NLIST = int(os.getenv("COREP_IVF_NLIST", "0"))  # 0 = about 4 * sqrt(n)
+HNSW_M = int(os.getenv("COREP_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("COREP_HNSW_EF_CONSTRUCTION", "200"))
+PQ_M = int(os.getenv("COREP_PQ_M", "48"))
+PQ_NBITS = int(os.getenv("COREP_PQ_NBITS", "8"))
+TRAIN_SAMPLE_SIZE = int(os.getenv("COREP_TRAIN_SAMPLE_SIZE", "50000"))
+
+# Query-time settings; applied on load and not part of the key
+IVF_NPROBE = int(os.getenv("COREP_IVF_NPROBE", "8"))
+HNSW_EF_SEARCH = int(os.getenv("COREP_HNSW_EF_SEARCH", "64"))
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# FAISS k-means wants roughly 39 training points per centroid
+_POINTS_PER_CENTROID = 39
+
+
+def index_settings(kind: Optional[str] = None) -> Dict:
+    """Build settings that determine the contents of an index of this type."""
+    kind = kind or INDEX_TYPE
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {INDEX_TYPES}")
+    settings = {"index_type": kind}
+    if kind in ("ivf_flat", "ivf_pq"):
+        settings["nlist"] = IVF_NLIST
+    if kind == "hnsw":
+        settings.update({"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION})
+    if kind == "ivf_pq":
+        settings.update({"pq_m": PQ_M, "pq_nbits": PQ_NBITS})
+    return settings
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """
+    Whether vectors can be removed in place, keeping langchain's
+    position -> docstore id map valid. Only flat indexes renumber the
+    remaining vectors on removal; IVF lists keep their old labels, so
+    later additions would collide, and HNSW graphs cannot drop vectors
+    at all. Every other type is rebuilt on change.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def _nlist(n_vectors: int) -> int:
+    nlist = IVF_NLIST or int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // _POINTS_PER_CENTROID))
+
+
+def _factory_string(kind: str, dim: int, n_vectors: int) -> str:
+    if kind == "ivf_flat":
+        return f"IVF{_nlist(n_vectors)},Flat"
+    if kind == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if kind == "ivf_pq":
+        if dim % PQ_M:
+            raise ValueError(f"COREP_PQ_M={PQ_M} must divide the embedding dimension {dim}")
+        return f"IVF{_nlist(n_vectors)},PQ{PQ_M}x{PQ_NBITS}"
+    return "Flat"
+
+
+def _effective_kind(kind: str, n_vectors: int) -> str:
+    # Too few vectors to train centroids or codebooks: exact search is
+    # both faster and exact at that size.
+    if kind == "ivf_flat" and n_vectors < _POINTS_PER_CENTROID:
+        return "flat"
+    if kind == "ivf_pq" and n_vectors < _POINTS_PER_CENTROID * (1 << PQ_NBITS):
+        return "flat"
+    return kind
+
+
+def apply_search_params(index: faiss.Index) -> faiss.Index:
+    """Set nprobe / efSearch from configuration on a built or loaded index."""
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(IVF_NPROBE, inner.nlist)
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def _sample(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_index(vectors: np.ndarray, kind: Optional[str] = None, batch_size: int = 65536) -> faiss.Index:
+    """
+    Build an index of the configured type over float32 vectors, training
+    IVF centroids / PQ codebooks on a sample of TRAIN_SAMPLE_SIZE vectors.
+    """
+    kind = _effective_kind(kind or INDEX_TYPE, len(vectors))
+    index_settings(kind)
+    dim = vectors.shape[1]
+    index = faiss.index_factory(dim, _factory_string(kind, dim, len(vectors)))
+
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(_sample(vectors, TRAIN_SAMPLE_SIZE)))
+
+    for start in range(0, len(vectors), batch_size):
+        index.add(np.ascontiguousarray(vectors[start:start + batch_size]))
+    return apply_search_params(index)
+
+
+def index_vectors(index: faiss.Index) -> np.ndarray:
+    """All vectors of an exact (flat) index as one float32 array."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def convert_index(flat_index: faiss.Index, kind: Optional[str] = None) -> faiss.Index:
+    """Rebuild a flat index as the configured ANN type, keeping vector order."""
+    kind = kind or INDEX_TYPE
+    if kind == "flat":
+        return flat_index
+    return build_index(index_vectors(flat_index), kind)
+
+
+def recall_at_k(index: faiss.Index, reference: faiss.Index, queries: np.ndarray, k: int = 5) -> float:
+    """Share of the exact top-k neighbours that index also returns."""
+    _, expected = reference.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(e[e >= 0]) & set(f[f >= 0])) for e, f in zip(expected, found))
+    total = int((expected >= 0).sum())
+    return hits / total if total else 1.0
+
+
+def compare_index_types(vectors: np.ndarray, queries: np.ndarray, k: int = 5, kinds: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Build every index type over vectors and report build time, mean query
+    latency and recall@k against the flat index.
+    """
+    reference = build_index(vectors, "flat")
+    results = []
+    for kind in kinds or INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(vectors, kind)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.search(queries, k)
+        query_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+        results.append({
+            "index_type": kind,
+            "built_as": _effective_kind(kind, len(vectors)),
+            "build_seconds": round(build_seconds, 4),
+            "query_ms": round(query_ms, 4),
+            f"recall@{k}": round(recall_at_k(index, reference, queries, k), 4),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    # Recall / latency check over the regulatory corpus:
+    #   python -m rag.ann [k] [n_queries]
+    import sys
+    from rag.loader import iter_chunk_batches
+    from rag.retriever import get_embeddings
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    embeddings = get_embeddings()
+    vectors = np.concatenate([
+        embeddings.embed_array([chunk.page_content for chunk in chunks])
+        for chunks, _ in iter_chunk_batches()
+    ])
+    queries = _sample(vectors, n_queries, seed=1)
+    for row in compare_index_types(vectors, queries, k):
+        print(row)
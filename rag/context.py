@@ -0,0 +1,173 @@
+"""
+Token-budgeted assembly of retrieved chunks into the prompt context.
+
+Retrieved chunks overlap (CHUNK_OVERLAP characters) and often repeat
+each other, and joining them verbatim lets the prompt size vary freely.
+build_context merges overlapping and adjacent chunks of the same source
+using their start offsets, drops near-duplicate passages and packs the
+best-ranked passages into a token budget, cutting a passage at a
+sentence boundary when it does not fit whole.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Sequence
+
+from langchain_core.documents import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("COREP_CONTEXT_TOKENS", "1024"))
+# Jaccard similarity of word 3-shingles above which a passage is a duplicate
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("COREP_CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+# Chunks at most this many characters apart are merged as adjacent
+ADJACENT_GAP = 2
+# Smallest remainder of the budget worth filling with a truncated passage
+MIN_PARTIAL_TOKENS = 32
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?:])\s+|\n+")
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> Callable[[str], int]:
+    """
+    tiktoken's cl100k_base when installed, otherwise a count of words and
+    punctuation marks, which is close for English regulatory text.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: len(_WORD.findall(text))
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter()(text)
+
+
+class Passage(NamedTuple):
+    source: str
+    start: int  # -1 when the chunk has no start_index
+    end: int
+    text: str
+    rank: int  # best retrieval rank of the merged chunks, 0 = best
+
+
+class ContextResult(NamedTuple):
+    text: str
+    tokens: int
+    raw_tokens: int  # tokens of the chunks joined verbatim
+    passages: List[Passage]
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.raw_tokens - self.tokens)
+
+
+def _header(source: str) -> str:
+    return f"--- Excerpt from {source} ---"
+
+
+def join_passages(passages: Sequence) -> str:
+    """Passages or documents as header + text blocks, the prompt context format."""
+    parts = []
+    for passage in passages:
+        if isinstance(passage, Document):
+            parts += [_header(passage.metadata.get("source", "Regulatory Text")), passage.page_content.strip()]
+        else:
+            parts += [_header(passage.source), passage.text.strip()]
+    return "\n\n".join(parts)
+
+
+def merge_chunks(docs: Sequence[Document]) -> List[Passage]:
+    """
+    Merge chunks of the same source that overlap or touch, in source order,
+    keeping the best rank of the merged chunks. Returned in rank order.
+    """
+    passages = [
+        Passage(
+            doc.metadata.get("source", "Regulatory Text"),
+            doc.metadata.get("start_index", -1),
+            doc.metadata.get("start_index", -1) + len(doc.page_content),
+            doc.page_content,
+            rank
+        )
+        for rank, doc in enumerate(docs)
+    ]
+    passages.sort(key=lambda p: (p.source, p.start < 0, p.start))
+
+    merged: List[Passage] = []
+    for passage in passages:
+        previous = merged[-1] if merged else None
+        if (
+            previous is None or passage.start < 0 or previous.start < 0
+            or previous.source != passage.source or passage.start > previous.end + ADJACENT_GAP
+        ):
+            merged.append(passage)
+            continue
+        if passage.end <= previous.end:
+            text = previous.text
+        elif passage.start >= previous.end:
+            text = previous.text + "\n" + passage.text
+        else:
+            text = previous.text + passage.text[previous.end - passage.start:]
+        merged[-1] = previous._replace(
+            end=max(previous.end, passage.end), text=text, rank=min(previous.rank, passage.rank)
+        )
+    return sorted(merged, key=lambda p: p.rank)
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def drop_near_duplicates(passages: Sequence[Passage], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[Passage]:
+    """Keep passages (in rank order) unless too similar to a better-ranked one."""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _truncate(text: str, budget: int) -> str:
+    """Longest prefix of whole sentences within budget tokens."""
+    result = ""
+    for sentence_end in _SENTENCE_END.finditer(text):
+        candidate = text[:sentence_end.start()]
+        if count_tokens(candidate) > budget:
+            break
+        result = candidate
+    return result
+
+
+def build_context(docs: Sequence[Document], budget: int = CONTEXT_TOKEN_BUDGET) -> ContextResult:
+    """
+    Context for docs (ranked best first) within budget tokens, headers
+    included. Passages are kept in rank order.
+    """
+    raw_tokens = count_tokens(join_passages(docs))
+    passages = drop_near_duplicates(merge_chunks(docs))
+
+    packed, used = [], 0
+    for passage in passages:
+        cost = count_tokens(join_passages([passage])) + (1 if packed else 0)
+        if used + cost <= budget:
+            packed.append(passage)
+            used += cost
+            continue
+        # Too long: fill what is left with its leading sentences, and keep
+        # looking for shorter passages that still fit whole
+        remaining = budget - used - count_tokens(_header(passage.source)) - 1
+        if remaining >= MIN_PARTIAL_TOKENS:
+            text = _truncate(passage.text, remaining)
+            if text:
+                packed.append(passage._replace(text=text))
+                used += count_tokens(join_passages([packed[-1]])) + 1
+
+    text = join_passages(packed)
+    return ContextResult(text, count_tokens(text), raw_tokens, packed)
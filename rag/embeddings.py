@@ -0,0 +1,152 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.tracing import span
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Encoding settings: chunks per forward pass and CPU threads used by torch
+# (0 keeps the torch default).
+EMBED_BATCH_SIZE = int(os.getenv("COREP_EMBED_BATCH_SIZE", "64"))
+EMBED_THREADS = int(os.getenv("COREP_EMBED_THREADS", "0"))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 of a chunk's text, used to deduplicate and cache embeddings."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent text-hash -> vector store backed by SQLite.
+    Vectors are stored as raw float32 bytes per embedding model.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the hashes that are present."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _SQL_BATCH):
+                batch = hashes[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        rows = [(model, key, np.ascontiguousarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Sentence-transformers embeddings with deduplication, tunable CPU batches
+    and an optional persistent cache.
+    Output is normalised float32 so the index never depends on how a
+    vector was produced (fresh or cached).
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBED_BATCH_SIZE,
+        threads: int = EMBED_THREADS,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.cache = cache
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Loaded on first encode so cache-only runs never import torch
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    with span("load_embedding_model", model=self.model_name):
+                        from sentence_transformers import SentenceTransformer
+                        if self.threads > 0:
+                            import torch
+                            torch.set_num_threads(self.threads)
+                        self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into one contiguous (len(texts), dim) float32 array.
+        Identical texts are encoded once; cached texts are not encoded at all.
+        """
+        with span("embed", texts=len(texts)) as current:
+            hashes = [text_hash(text) for text in texts]
+            unique = dict(zip(hashes, texts))
+            keys = list(unique)
+
+            vectors = self.cache.get_many(self.model_name, keys) if self.cache else {}
+            missing = [key for key in keys if key not in vectors]
+            current.set("cached", len(keys) - len(missing))
+            current.set("encoded", len(missing))
+            if missing:
+                encoded = self._encode([unique[key] for key in missing])
+                vectors.update(zip(missing, encoded))
+                if self.cache:
+                    self.cache.put_many(self.model_name, zip(missing, encoded))
+
+        if not keys:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        unique_array = np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+        position = {key: i for i, key in enumerate(keys)}
+        return unique_array[[position[key] for key in hashes]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries bypass the persistent cache to keep it limited to corpus chunks
+        return self._encode([text])[0].tolist()
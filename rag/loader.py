@@ -1,29 +1,149 @@
 import os
-from typing import List
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
+import glob
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def load_regulatory_documents(data_dir: str = "data/regulatory") -> List:
+DEFAULT_DATA_DIR = "data/regulatory"
+FALLBACK_FILE = "data/regulatory_text.txt"
+
+# Chunker settings. These are part of the persisted index key, so changing
+# any of them invalidates indexes saved by rag.retriever.
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# Ingestion settings: number of processes splitting files and the number
+# of chunks handed to the embedder at a time.
+LOADER_WORKERS = int(os.getenv("COREP_LOADER_WORKERS", str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.getenv("COREP_INGEST_BATCH_SIZE", "256"))
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        separators=SEPARATORS,
+        add_start_index=True
+    )
+
+
+def chunker_settings() -> Dict:
+    """Settings that determine how source files are split into chunks."""
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "separators": SEPARATORS,
+        "add_start_index": True,
+    }
+
+
+def list_source_files(data_dir: str = DEFAULT_DATA_DIR) -> List[str]:
     """
-    Load all regulatory text files from directory.
+    List the regulatory text files that are chunked and indexed.
     """
     if not os.path.exists(data_dir):
-        return TextLoader("data/regulatory_text.txt").load_and_split()
-    
-    loader = DirectoryLoader(
-        data_dir,
-        glob="**/*.txt",
-        loader_cls=TextLoader,
-        loader_kwargs={"encoding": "utf-8"}
-    )
+        return [FALLBACK_FILE] if os.path.exists(FALLBACK_FILE) else []
+    pattern = os.path.join(data_dir, "**", "*.txt")
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(relpath: str, file_hash: str, position: int) -> str:
+    """Stable chunk ID derived from the file path, its content hash and position."""
+    return f"{relpath}::{file_hash[:16]}::{position}"
+
+
+def load_source_file(path: str, data_dir: str = DEFAULT_DATA_DIR, file_hash: Optional[str] = None) -> Tuple[List, List[str]]:
+    """
+    Load and split a single regulatory file.
+    Returns (chunks, chunk_ids) so the file can be re-indexed on its own.
+    """
+    file_hash = file_hash or hash_file(path)
+    relpath = os.path.relpath(path, data_dir)
+    documents = TextLoader(path, encoding="utf-8").load()
+    chunks = get_text_splitter().split_documents(documents)
+    ids = [chunk_id(relpath, file_hash, i) for i in range(len(chunks))]
+    return chunks, ids
+
+
+def _split_file_task(task: Tuple[str, str, Optional[str]]) -> Tuple[str, str, List, List[str]]:
+    # Module-level so it can be pickled into worker processes
+    path, data_dir, file_hash = task
+    file_hash = file_hash or hash_file(path)
+    chunks, ids = load_source_file(path, data_dir, file_hash)
+    return os.path.relpath(path, data_dir), file_hash, chunks, ids
+
+
+def iter_file_chunks(
+    files: Iterable[Tuple[str, Optional[str]]],
+    data_dir: str = DEFAULT_DATA_DIR,
+    workers: Optional[int] = None
+) -> Iterator[Tuple[str, str, List, List[str]]]:
+    """
+    Split files in a process pool and yield (relpath, file_hash, chunks, chunk_ids)
+    one file at a time, in input order.
+    files is an iterable of (path, file_hash); pass None as hash to compute it.
+    At most 2 * workers files are in flight, so memory is bounded by the
+    largest files rather than by the corpus.
+    """
+    workers = workers or LOADER_WORKERS
+    tasks = ((path, data_dir, file_hash) for path, file_hash in files)
     
-    documents = loader.load()
+    if workers <= 1:
+        for task in tasks:
+            yield _split_file_task(task)
+        return
     
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_split_file_task, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_chunk_batches(
+    data_dir: str = DEFAULT_DATA_DIR,
+    batch_size: int = INGEST_BATCH_SIZE,
+    workers: Optional[int] = None
+) -> Iterator[Tuple[List, List[str]]]:
+    """
+    Stream (chunks, chunk_ids) batches of at most batch_size over every
+    source file, ready to be handed straight to the embedder.
+    """
+    files = ((path, None) for path in list_source_files(data_dir))
+    pairs = (
+        pair
+        for _, _, chunks, ids in iter_file_chunks(files, data_dir, workers)
+        for pair in zip(chunks, ids)
     )
-    
-    return text_splitter.split_documents(documents)
+    for batch in batched(pairs, batch_size):
+        chunks, ids = zip(*batch)
+        yield list(chunks), list(ids)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
@@ -1,33 +1,400 @@
-import streamlit as st
+import os
+import json
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
-from typing import List
+from langchain_core.documents import Document
+
+from rag.ann import apply_search_params, convert_index, index_settings, supports_removal
+from rag.context import CONTEXT_TOKEN_BUDGET, ContextResult, build_context
+from rag.embeddings import EMBEDDING_MODEL, CachedEmbeddings, EmbeddingCache
+from rag.loader import (
+    DEFAULT_DATA_DIR,
+    INGEST_BATCH_SIZE,
+    batched,
+    chunker_settings,
+    hash_file,
+    iter_file_chunks,
+    list_source_files,
+)
+from rag.sparse import SparseIndex, exact_keys, reciprocal_rank_fusion
+from utils.cache import TTLCache
+from utils.tracing import current_span, span
+
+INDEX_DIR = os.getenv("COREP_INDEX_DIR", ".corep_index")
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+META_FILE = "meta.json"
+EMBEDDING_CACHE_FILE = "embeddings.sqlite"
+SPARSE_FILE = "sparse.npz"
+
+# Hybrid retrieval: BM25 and dense candidates fused by reciprocal rank
+HYBRID_SEARCH = os.getenv("COREP_HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("COREP_HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("COREP_RRF_K", "60"))
+
+# In-process caches for query embeddings and top-k results
+QUERY_CACHE_SIZE = int(os.getenv("COREP_QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_TTL = float(os.getenv("COREP_QUERY_CACHE_TTL", "3600"))
+
+_query_embedding_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+_retrieval_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Embedding model shared by every vector store in this process.
+    Chunk vectors are cached next to the index, so rebuilding the index
+    (e.g. after changing its type) does not re-run the transformer.
+    """
+    cache = EmbeddingCache(os.path.join(INDEX_DIR, EMBEDDING_CACHE_FILE))
+    return CachedEmbeddings(EMBEDDING_MODEL, cache=cache)
+
+
+def compute_settings_key() -> str:
+    """
+    Hash of the chunker and embedding settings.
+    A saved index is only reusable while this key is unchanged.
+    """
+    payload = {
+        "chunker": chunker_settings(),
+        "embedding_model": EMBEDDING_MODEL,
+        "normalize_embeddings": True,
+        "index": index_settings(),
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def scan_sources(data_dir: str = DEFAULT_DATA_DIR) -> Dict[str, Tuple[str, str]]:
+    """Map each source file's path relative to data_dir to (path, content hash)."""
+    return {
+        os.path.relpath(path, data_dir): (path, hash_file(path))
+        for path in list_source_files(data_dir)
+    }
+
+
+def _replace_file(path: str, write) -> None:
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def compute_index_key(file_hashes: Dict[str, str]) -> str:
+    """
+    Hash of the source file contents plus chunker and embedding settings.
+    Identifies one version of the index.
+    """
+    payload = {
+        "settings": compute_settings_key(),
+        "files": file_hashes,
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def read_manifest(index_dir: str = INDEX_DIR) -> Optional[Dict]:
+    """
+    Read the saved meta file: settings key, index key and the per-file
+    manifest of content hashes and chunk IDs. None if nothing valid is saved.
+    """
+    meta_path = os.path.join(index_dir, META_FILE)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if "settings_key" not in meta or "files" not in meta:
+        return None
+    return meta
+
+
+def save_vector_store(db: FAISS, manifest: Dict, index_dir: str = INDEX_DIR) -> str:
+    """
+    Save index, chunk metadata, the BM25 index over the same chunks and the
+    per-file manifest to index_dir. The meta file is written last so a
+    partial save is never loaded. Returns the index key.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path = os.path.join(index_dir, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    
+    chunks = []
+    for position in range(db.index.ntotal):
+        doc_id = db.index_to_docstore_id[position]
+        doc = db.docstore.search(doc_id)
+        chunks.append({
+            "id": doc_id,
+            "page_content": doc.page_content,
+            "metadata": doc.metadata
+        })
+    
+    sparse = SparseIndex.build((chunk["id"], chunk["page_content"]) for chunk in chunks)
+    
+    key = compute_index_key({relpath: entry["sha256"] for relpath, entry in manifest.items()})
+    meta = {
+        "key": key,
+        "settings_key": compute_settings_key(),
+        "embedding_model": EMBEDDING_MODEL,
+        "count": len(chunks),
+        "files": manifest,
+    }
+    
+    def write_docstore(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(chunks, f)
+    
+    def write_meta(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    
+    _replace_file(os.path.join(index_dir, INDEX_FILE), lambda path: faiss.write_index(db.index, path))
+    _replace_file(os.path.join(index_dir, DOCSTORE_FILE), write_docstore)
+    _replace_file(os.path.join(index_dir, SPARSE_FILE), sparse.save)
+    _replace_file(meta_path, write_meta)
+    db.sparse_index = sparse
+    return key
+
+
+def load_vector_store(index_dir: str = INDEX_DIR, mmap: bool = True) -> Optional[FAISS]:
+    """
+    Load a saved index, memory-mapped by default.
+    Use mmap=False when the index is going to be modified in place.
+    """
+    meta = read_manifest(index_dir)
+    if meta is None:
+        return None
+    
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    try:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP if mmap else 0)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            index = faiss.read_index(index_path)
+        with open(os.path.join(index_dir, DOCSTORE_FILE), encoding="utf-8") as f:
+            chunks = json.load(f)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    
+    if index.ntotal != len(chunks):
+        return None
+    
+    docstore = InMemoryDocstore({
+        chunk["id"]: Document(id=chunk["id"], page_content=chunk["page_content"], metadata=chunk["metadata"])
+        for chunk in chunks
+    })
+    index_to_docstore_id = {i: chunk["id"] for i, chunk in enumerate(chunks)}
+    db = FAISS(get_embeddings(), apply_search_params(index), docstore, index_to_docstore_id)
+    db.index_version = meta["key"]
+    
+    sparse = SparseIndex.load(os.path.join(index_dir, SPARSE_FILE))
+    if sparse is None or sparse.doc_ids != [chunk["id"] for chunk in chunks]:
+        # Saved before the BM25 index existed or out of step with the docstore
+        sparse = SparseIndex.build((chunk["id"], chunk["page_content"]) for chunk in chunks)
+    db.sparse_index = sparse
+    return db
+
+
+def _index_file_chunks(db: Optional[FAISS], file_chunks: Iterable, manifest: Dict) -> Optional[FAISS]:
+    """
+    Embed chunks streamed from iter_file_chunks in INGEST_BATCH_SIZE batches,
+    adding them to db (created from the first batch if None) and recording
+    each file in manifest.
+    """
+    def pairs():
+        for relpath, file_hash, chunks, ids in file_chunks:
+            manifest[relpath] = {"sha256": file_hash, "chunk_ids": ids}
+            yield from zip(chunks, ids)
+    
+    embeddings = get_embeddings()
+    batches = batched(pairs(), INGEST_BATCH_SIZE)
+    while True:
+        # Files are read and split as the next batch is pulled
+        with span("load_split") as current:
+            batch = next(batches, None)
+            current.set("chunks", len(batch) if batch else 0)
+        if batch is None:
+            break
+        chunks, ids = (list(items) for items in zip(*batch))
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        vectors = embeddings.embed_array(texts)
+        if db is None:
+            db = FAISS.from_embeddings(zip(texts, vectors), embeddings, metadatas=metadatas, ids=ids)
+        else:
+            db.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+    return db
+
+
+def update_vector_store(db: FAISS, manifest: Dict, data_dir: str, sources: Dict[str, Tuple[str, str]]) -> Dict:
+    """
+    Re-index only the files whose content hash changed.
+    Vectors of changed and deleted files are removed from the index and
+    chunks of changed and new files are embedded and added.
+    sources maps relpath to (path, file_hash). Returns the updated manifest.
+    """
+    manifest = dict(manifest)
+    
+    stale_ids = []
+    for relpath, entry in list(manifest.items()):
+        if relpath not in sources or sources[relpath][1] != entry["sha256"]:
+            stale_ids.extend(entry["chunk_ids"])
+            del manifest[relpath]
+    if stale_ids:
+        db.delete(stale_ids)
+    
+    changed = [source for relpath, source in sources.items() if relpath not in manifest]
+    _index_file_chunks(db, iter_file_chunks(changed, data_dir), manifest)
+    return manifest
+
+
+def load_or_build_vector_store(data_dir: str = DEFAULT_DATA_DIR, index_dir: str = INDEX_DIR) -> FAISS:
+    """
+    Load the persisted index for data_dir.
+    - Unchanged sources: memory-map the saved index.
+    - Some files changed, flat index: re-embed only those files and save.
+    - Chunker/embedding/index settings changed, nothing saved, or files
+      changed under an ANN index (see supports_removal): full rebuild, streaming chunks from the
+      process-pool loader in batches, then converting to the configured
+      index type (cached embeddings make this cheap).
+    """
+    with span("load_or_build_vector_store", data_dir=data_dir) as current:
+        db = _load_or_build(data_dir, index_dir, current)
+        current.set("chunks", db.index.ntotal)
+        return db
+
 
-@st.cache_resource(show_spinner=False)
-def build_vector_store(documents):
+def _load_or_build(data_dir: str, index_dir: str, current) -> FAISS:
+    sources = scan_sources(data_dir)
+    file_hashes = {relpath: file_hash for relpath, (_, file_hash) in sources.items()}
+    saved = read_manifest(index_dir)
+    
+    if saved is not None and saved["settings_key"] == compute_settings_key():
+        manifest = saved["files"]
+        unchanged = {relpath: entry["sha256"] for relpath, entry in manifest.items()} == file_hashes
+        db = load_vector_store(index_dir, mmap=unchanged)
+        if db is not None and (unchanged or supports_removal(db.index)):
+            if unchanged:
+                current.set("mode", "loaded")
+                return db
+            current.set("mode", "updated")
+            manifest = update_vector_store(db, manifest, data_dir, sources)
+            db.index_version = save_vector_store(db, manifest, index_dir)
+            return db
+    
+    current.set("mode", "rebuilt")
+    manifest = {}
+    db = _index_file_chunks(None, iter_file_chunks(sources.values(), data_dir), manifest)
+    if db is None:
+        raise ValueError(f"No regulatory documents found in {data_dir}")
+    db.index = convert_index(db.index)
+    db.index_version = save_vector_store(db, manifest, index_dir)
+    return db
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as cache key."""
+    return " ".join(query.lower().split())
+
+
+def _cached_query_embedding(db, normalized_query: str) -> List[float]:
+    key = (getattr(db.embedding_function, "model_name", None), normalized_query)
+    embedding = _query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = db.embedding_function.embed_query(normalized_query)
+        _query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def _dense_ids(db, normalized_query: str, k: int) -> List[str]:
+    embedding = np.asarray([_cached_query_embedding(db, normalized_query)], dtype=np.float32)
+    _, positions = db.index.search(embedding, k)
+    return [db.index_to_docstore_id[position] for position in positions[0] if position != -1]
+
+
+def _hybrid_search(db, sparse: SparseIndex, normalized_query: str, k: int) -> List[Document]:
     """
-    Build and cache FAISS vector store.
-    Called only once per session.
+    Exact article references or field codes found together in some chunks
+    answer the query from the inverted index alone. Otherwise the top
+    HYBRID_CANDIDATES of BM25 and of the dense index are fused by RRF.
     """
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    return FAISS.from_documents(documents, embeddings)
+    keys = exact_keys(normalized_query)
+    hits = sparse.lookup(keys, normalized_query, k) if keys else []
+    if hits:
+        current_span().set("search", "exact")
+        ids = [doc_id for doc_id, _ in hits]
+    else:
+        current_span().set("search", "hybrid")
+        candidates = max(k, HYBRID_CANDIDATES)
+        lexical = [doc_id for doc_id, _ in sparse.search(normalized_query, candidates)]
+        fused = reciprocal_rank_fusion([_dense_ids(db, normalized_query, candidates), lexical], RRF_K)
+        ids = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [db.docstore.search(doc_id) for doc_id in ids]
+
+
+def retrieve_documents(db, query: str, k: int = 3) -> List[Document]:
+    """
+    Top-k chunks for query, served from cache for repeated queries.
+    Results are keyed by normalised query, k and index version; the query
+    embedding is cached separately so a new index version skips the
+    transformer too. With HYBRID_SEARCH, BM25 and dense results are fused
+    (see _hybrid_search).
+    """
+    with span("retrieve_documents", k=k) as current:
+        normalized = normalize_query(query)
+        key = (normalized, k, getattr(db, "index_version", id(db)))
+        docs = _retrieval_cache.get(key)
+        current.set("cache_hit", docs is not None)
+        if docs is None:
+            sparse = getattr(db, "sparse_index", None)
+            if HYBRID_SEARCH and sparse is not None and len(sparse):
+                docs = _hybrid_search(db, sparse, normalized, k)
+            else:
+                current.set("search", "dense")
+                embedding = _cached_query_embedding(db, normalized)
+                docs = db.similarity_search_by_vector(embedding, k=k)
+            _retrieval_cache.set(key, docs)
+        current.set("chunk_ids", [doc.id for doc in docs])
+        return docs
+
+
+def retrieval_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Hit/miss counters of the query-embedding and retrieval caches."""
+    return {
+        "query_embeddings": _query_embedding_cache.stats(),
+        "retrieval": _retrieval_cache.stats(),
+    }
+
+
+def retrieve_context(db, query: str, k: int = 3, budget: int = CONTEXT_TOKEN_BUDGET) -> ContextResult:
+    """
+    Top-k chunks assembled into a context of at most budget tokens, with
+    overlapping chunks merged and near-duplicates dropped (see rag.context).
+    """
+    with span("retrieve_context", budget=budget) as current:
+        docs = retrieve_documents(db, query, k=k)
+        with span("assemble_context"):
+            result = build_context(docs, budget)
+        current.set("tokens", result.tokens)
+        current.set("tokens_saved", result.tokens_saved)
+        return result
+
 
-def retrieve_relevant_context(db, query: str, k: int = 3) -> str:
+def retrieve_relevant_context(db, query: str, k: int = 3, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
     """
     Retrieve relevant context from vector store.
     """
     try:
-        docs = db.similarity_search(query, k=k)
-        context_parts = []
-        
-        for i, doc in enumerate(docs, 1):
-            source = doc.metadata.get('source', 'Regulatory Text')
-            context_parts.append(f"--- Excerpt from {source} ---")
-            context_parts.append(doc.page_content.strip())
-        
-        return "\n\n".join(context_parts)
+        return retrieve_context(db, query, k=k, budget=budget).text
     
     except Exception as e:
         return f"Error retrieving context: {str(e)}\n\nUsing basic regulatory knowledge."
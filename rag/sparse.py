@@ -0,0 +1,192 @@
+"""
+BM25 inverted index over the regulatory chunks.
+
+Dense MiniLM embeddings match exact tokens such as "Article 72", "CET1"
+or "OF_030" poorly; this index scores them lexically. Postings are kept
+in CSR form (one offsets array, one chunk-position array, one term
+frequency array) so the index is a handful of NumPy arrays, saved with
+np.savez next to the FAISS index.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bump when tokenisation changes so saved indexes are rebuilt
+SPARSE_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z]{2,3}_\d{3}|[a-z0-9]+")
+_ARTICLE = re.compile(r"\barticles?\s+(\d+[a-z]?)\b", re.IGNORECASE)
+_FIELD_CODE = re.compile(r"\b[A-Za-z]{2,3}_\d{3}\b")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens without stopwords, plus one "article:<n>" token
+    per article reference so "Article 72" is matched as a unit.
+    """
+    tokens = [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+    tokens += [f"article:{number.lower()}" for number in _ARTICLE.findall(text)]
+    return tokens
+
+
+def exact_keys(query: str) -> List[str]:
+    """Article references and field codes in a query, as index tokens."""
+    keys = [f"article:{number.lower()}" for number in _ARTICLE.findall(query)]
+    keys += [code.lower() for code in _FIELD_CODE.findall(query)]
+    return list(dict.fromkeys(keys))
+
+
+class SparseIndex:
+    """
+    BM25 index over chunks identified by their docstore ids.
+    """
+
+    def __init__(
+        self,
+        doc_ids: Sequence[str],
+        vocabulary: Sequence[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+        doc_lengths: np.ndarray
+    ):
+        self.doc_ids = list(doc_ids)
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        n = len(self.doc_ids)
+        document_frequency = np.diff(offsets)
+        self.idf = np.log1p((n - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        self.avg_length = float(doc_lengths.mean()) if n else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]]) -> "SparseIndex":
+        """Index (doc_id, text) pairs."""
+        doc_ids, lengths, counts = [], [], {}
+        for position, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            lengths.append(len(tokens))
+            for token in tokens:
+                per_doc = counts.setdefault(token, {})
+                per_doc[position] = per_doc.get(position, 0) + 1
+
+        vocabulary = sorted(counts)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        postings, frequencies = [], []
+        for i, term in enumerate(vocabulary):
+            per_doc = counts[term]
+            offsets[i + 1] = offsets[i] + len(per_doc)
+            postings.extend(per_doc)
+            frequencies.extend(per_doc.values())
+        return cls(
+            doc_ids,
+            vocabulary,
+            offsets,
+            np.asarray(postings, dtype=np.int32),
+            np.asarray(frequencies, dtype=np.float32),
+            np.asarray(lengths, dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        i = self.vocabulary.get(term)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.postings[start:end], self.frequencies[start:end], self.idf[i]
+
+    def scores(self, tokens: Iterable[str]) -> np.ndarray:
+        """BM25 score of every chunk for the given query tokens."""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avg_length or 1.0))
+        for token in tokens:
+            entry = self._postings(token)
+            if entry is None:
+                continue
+            docs, tf, idf = entry
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, score) pairs with a positive score."""
+        return self._top(self.scores(tokenize(query)), k)
+
+    def lookup(self, keys: Sequence[str], query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Chunks containing every key (article references, field codes),
+        ranked by BM25 for the full query. Empty if no chunk has them all.
+        """
+        matched = None
+        for key in keys:
+            entry = self._postings(key)
+            if entry is None:
+                return []
+            docs = entry[0]
+            matched = docs if matched is None else np.intersect1d(matched, docs)
+        if matched is None or not len(matched):
+            return []
+        scores = np.full(len(self.doc_ids), -np.inf, dtype=np.float32)
+        scores[matched] = self.scores(tokenize(query))[matched]
+        return self._top(scores, min(k, len(matched)), positive=False)
+
+    def _top(self, scores: np.ndarray, k: int, positive: bool = True) -> List[Tuple[str, float]]:
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if not positive or scores[i] > 0]
+
+    def save(self, path: str) -> None:
+        # Written through a file object so np.savez does not append ".npz"
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(SPARSE_VERSION),
+                doc_ids=np.array(self.doc_ids, dtype=str),
+                vocabulary=np.array(list(self.vocabulary), dtype=str),
+                offsets=self.offsets,
+                postings=self.postings,
+                frequencies=self.frequencies,
+                doc_lengths=self.doc_lengths
+            )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SparseIndex"]:
+        """Saved index, or None if missing or written by another SPARSE_VERSION."""
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != SPARSE_VERSION:
+                    return None
+                return cls(
+                    data["doc_ids"].tolist(),
+                    data["vocabulary"].tolist(),
+                    data["offsets"],
+                    data["postings"],
+                    data["frequencies"],
+                    data["doc_lengths"]
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """RRF score per doc id: sum over rankings of 1 / (k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,225 @@
+"""
+Long-lived inference service for the UI and scripts.
+
+Usage:
+    uvicorn service:app --host 127.0.0.1 --port 8000
+    python service.py --port 8000
+
+The embedding model, FAISS index and LLM client are loaded once at
+startup and shared by every request, so Streamlit reruns and scripts
+neither reload the corpus nor pay model start-up. LLM calls run
+concurrently on the event loop (bounded by COREP_LLM_CONCURRENCY) and
+CPU-bound retrieval runs in the thread pool. Prefer one uvicorn worker:
+each extra worker holds its own copy of the model and index.
+
+Endpoints:
+    GET  /health                  index version, chunk count and
+                                  retrieval cache hit rates
+    POST /retrieve                {"query", "k", "budget"} -> context
+    POST /generate                {"scenario", "question" | "context"} -> report
+    POST /generate/stream         same, as NDJSON: one {"field"} line per
+                                  field as it is parsed, then {"result"}
+    POST /batch                   {"items": [...], "concurrency"} -> results
+    GET  /traces/{trace_id}       span rows of a finished request
+    GET  /metrics                 Prometheus text format
+
+Point the app at it with COREP_SERVICE_URL=http://127.0.0.1:8000.
+"""
+import sys
+import json
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from llm.generator import DEFAULT_QUESTION, MAX_CONCURRENCY, ReportGenerator
+from rag.context import CONTEXT_TOKEN_BUDGET
+from rag.loader import DEFAULT_DATA_DIR
+from rag.retriever import load_or_build_vector_store, retrieval_cache_stats, retrieve_context
+from utils._init_ import validate_scenario
+from utils.tracing import metrics, span_rows, trace, tracer
+
+# Upper bound on rows per /batch request
+MAX_BATCH_ITEMS = 10000
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    k: int = Field(3, ge=1, le=50)
+    budget: int = Field(CONTEXT_TOKEN_BUDGET, ge=1)
+
+
+class GenerateRequest(BaseModel):
+    scenario: str
+    question: str = DEFAULT_QUESTION
+    # Retrieved context; retrieved for question when omitted
+    context: Optional[str] = None
+    templates: Optional[List[str]] = None
+
+
+class BatchRequest(BaseModel):
+    items: List[GenerateRequest] = Field(max_length=MAX_BATCH_ITEMS)
+    concurrency: int = Field(MAX_CONCURRENCY, ge=1)
+
+
+class Pipeline:
+    """Warm vector store and generator shared by every request."""
+
+    def __init__(self, data_dir: str = DEFAULT_DATA_DIR):
+        self.db = load_or_build_vector_store(data_dir)
+        self.generator = ReportGenerator()
+        # Bounds LLM calls across all requests, not just within one batch
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def retrieve(self, query: str, k: int = 3, budget: int = CONTEXT_TOKEN_BUDGET) -> Dict[str, Any]:
+        result = await run_in_threadpool(retrieve_context, self.db, query, k, budget)
+        return {
+            "text": result.text,
+            "tokens": result.tokens,
+            "raw_tokens": result.raw_tokens,
+            "tokens_saved": result.tokens_saved,
+        }
+
+    async def generate(self, request: GenerateRequest, on_field=None) -> Dict[str, Any]:
+        """Report for one request, in the record format of batch.py."""
+        is_valid, message = validate_scenario(request.scenario)
+        if not is_valid:
+            return {"error": message}
+        context = request.context
+        if context is None:
+            context = (await self.retrieve(request.question))["text"]
+        async with self.semaphore:
+            if request.templates and list(request.templates) != ["C 01.00"]:
+                result = await self.generator.agenerate_reports(context, request.scenario, request.templates)
+            else:
+                result = await self.generator.agenerate_report(context, request.scenario, on_field=on_field)
+        return serialize_result(result)
+
+
+def serialize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready copy of a generator result."""
+    record = {key: value for key, value in result.items() if key not in ("report", "reports", "partial_report")}
+    if "report" in result:
+        record["report"] = result["report"].model_dump()
+    if "reports" in result:
+        record["reports"] = {code: report.model_dump() for code, report in result["reports"].items()}
+    return record
+
+
+pipeline: Optional[Pipeline] = None
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    global pipeline
+    if pipeline is None:
+        pipeline = await run_in_threadpool(Pipeline)
+    yield
+
+
+app = FastAPI(title="COREP Reporting Service", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    return {
+        "status": "ok",
+        "index_version": getattr(pipeline.db, "index_version", None),
+        "chunks": pipeline.db.index.ntotal,
+        "model": pipeline.generator.model_name,
+        "retrieval_cache": retrieval_cache_stats(),
+    }
+
+
+@app.post("/retrieve")
+async def retrieve(request: RetrieveRequest) -> Dict[str, Any]:
+    with trace("service_retrieve") as request_span:
+        result = await pipeline.retrieve(request.query, request.k, request.budget)
+    return {**result, "trace_id": request_span.trace_id}
+
+
+@app.post("/generate")
+async def generate(request: GenerateRequest) -> Dict[str, Any]:
+    with trace("service_generate") as request_span:
+        result = await pipeline.generate(request)
+    return {**result, "trace_id": request_span.trace_id}
+
+
+@app.post("/generate/stream")
+async def generate_stream(request: GenerateRequest) -> StreamingResponse:
+    """
+    Stream fields as NDJSON while the report is generated. The last line
+    is {"result": ...} with the same content /generate returns.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run():
+        with trace("service_generate", streamed=True) as request_span:
+            try:
+                result = await pipeline.generate(request, on_field=lambda field: queue.put_nowait({"field": field.model_dump()}))
+            except Exception as e:
+                result = {"error": f"Generation failed: {str(e)}"}
+        queue.put_nowait({"result": {**result, "trace_id": request_span.trace_id}})
+
+    async def lines():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                message = await queue.get()
+                yield json.dumps(message) + "\n"
+                if "result" in message:
+                    break
+        finally:
+            # Client went away: stop generating
+            task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/batch")
+async def generate_batch(request: BatchRequest) -> Dict[str, Any]:
+    """Generate every item concurrently; results keep input order."""
+    limit = asyncio.Semaphore(request.concurrency)
+
+    async def run(item: GenerateRequest) -> Dict[str, Any]:
+        async with limit:
+            with trace("service_generate", batch=True) as request_span:
+                result = await pipeline.generate(item)
+            return {**result, "trace_id": request_span.trace_id}
+
+    results = await asyncio.gather(*(run(item) for item in request.items))
+    return {"results": results, "failed": sum("error" in result for result in results)}
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    spans = tracer.get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Unknown or unfinished trace")
+    return span_rows(spans)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    exporter = metrics()
+    return exporter.render() if exporter else ""
+
+
+def main(argv=None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve retrieval and report generation over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
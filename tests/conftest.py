@@ -0,0 +1,80 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+import pytest
+
+import rag.loader
+import rag.retriever
+from rag.embeddings import CachedEmbeddings, EmbeddingCache
+
+DIM = 64
+
+CORPUS = {
+    "crr_capital.txt": (
+        "Article 26 Common Equity Tier 1 items. Common Equity Tier 1 items of institutions consist of "
+        "capital instruments, share premium accounts, retained earnings and other reserves.\n\n"
+        "Article 51 Additional Tier 1 items. Additional Tier 1 items consist of capital instruments "
+        "that meet the conditions laid down in Article 52."
+    ),
+    "corep/instructions.txt": (
+        "Row 010 OF_010 Common Equity Tier 1 capital as defined in Article 50 of CRR.\n\n"
+        "Row 040 OF_040 Total own funds, the sum of Tier 1 and Tier 2 capital as in Article 72."
+    ),
+}
+
+
+class HashEncoder:
+    """
+    Deterministic stand-in for the sentence-transformers model: a hashed
+    bag of words, normalised, so texts sharing words are close.
+    Records every text it encodes.
+    """
+
+    def __init__(self):
+        self.encoded = []
+
+    def __call__(self, texts):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % DIM] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    """Replaces the embedding model of every CachedEmbeddings with a HashEncoder."""
+    encoder = HashEncoder()
+    monkeypatch.setattr(CachedEmbeddings, "_encode", lambda self, texts: encoder(texts))
+    return encoder
+
+
+def write_corpus(data_dir, files=CORPUS):
+    for relpath, text in files.items():
+        path = os.path.join(data_dir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    data_dir = str(tmp_path / "regulatory")
+    write_corpus(data_dir)
+    return data_dir
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch, encoder):
+    """Index directory of a fresh retriever: own embedding cache, no query caches, in-process loader."""
+    index_dir = str(tmp_path / "index")
+    embeddings = CachedEmbeddings(cache=EmbeddingCache(os.path.join(index_dir, "embeddings.sqlite")))
+    monkeypatch.setattr(rag.retriever, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(rag.loader, "LOADER_WORKERS", 1)
+    rag.retriever._query_embedding_cache.clear()
+    rag.retriever._retrieval_cache.clear()
+    return index_dir
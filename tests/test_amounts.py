@@ -0,0 +1,61 @@
+import pytest
+
+from llm.amounts import amounts_by_type, find_amounts
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("CET1 capital is £500m", [("cet1", 500.0, "GBP")]),
+    ("Common Equity Tier 1 of 500 million euros", [("cet1", 500.0, "EUR")]),
+    ("CET1 capital is €1.5bn", [("cet1", 1500.0, "EUR")]),
+    ("AT1 of $300k", [("at1", 0.3, "USD")]),
+    ("CET1 of GBP 1,234.5 thousand", [("cet1", 1.2345, "GBP")]),
+    ("Additional Tier 1 instruments of 50 million", [("at1", 50.0, None)]),
+    ("Tier 2 capital of 80 mn pounds sterling", [("tier2", 80.0, "GBP")]),
+    ("Total own funds are £700m", [("total", 700.0, "GBP")]),
+    ("Total £275m", [("total", 275.0, "GBP")]),
+    ("CET1: GBP150m", [("cet1", 150.0, "GBP")]),
+    ("AT1 of EUR50m and Tier 2 of USD75m", [("at1", 50.0, "EUR"), ("tier2", 75.0, "USD")]),
+    (
+        "Total capital of £700m (CET1: £500m)",
+        [("total", 700.0, "GBP"), ("cet1", 500.0, "GBP")],
+    ),
+    # "at 1,200" and "at 1 January" are not the AT1 abbreviation
+    ("Tier 2 capital stood at 1,200 million", [("tier2", 1200.0, None)]),
+    (
+        "As at 1 January 2025, CET1 was £500m and AT1 was £50m",
+        [("cet1", 500.0, "GBP"), ("at1", 50.0, "GBP")],
+    ),
+    ("As at 1 January, Tier 2 capital of £200m", [("tier2", 200.0, "GBP")]),
+    ("at1 of 5 million", []),
+    # Signs before or after the currency; a range is not a negative amount
+    ("CET1 of -£50m", [("cet1", -50.0, "GBP")]),
+    ("CET1 of £-50m", [("cet1", -50.0, "GBP")]),
+    ("CET1 of −£50m", [("cet1", -50.0, "GBP")]),
+    ("CET1 of 150-200 million", [("cet1", 200.0, None)]),
+    # Bare numbers without currency or magnitude are ignored
+    ("CET1 5-year plan", []),
+    ("The bank has 3 branches", []),
+    ("£500m of retained earnings", []),
+])
+def test_find_amounts(text, expected):
+    assert [(m.key, pytest.approx(m.value), m.currency) for m in find_amounts(text)] == expected
+
+
+def test_later_amounts_of_a_label_are_not_primary():
+    mentions = find_amounts("CET1 of £500m before a deduction of £20m. AT1 of £50m")
+    assert [(m.key, m.value, m.primary) for m in mentions] == [
+        ("cet1", 500.0, True), ("cet1", 20.0, False), ("at1", 50.0, True),
+    ]
+
+
+def test_amount_spans_point_into_the_text():
+    text = "Tier 2 capital of £80m"
+    (mention,) = find_amounts(text)
+    assert text[mention.start:mention.end] == "£80m"
+    assert mention.scale == 1e6
+
+
+def test_amounts_by_type():
+    grouped = amounts_by_type("CET1 of £500m, AT1 of £50m and CET1 adjustments of £5m")
+    assert sorted(grouped) == ["at1", "cet1"]
+    assert [m.value for m in grouped["cet1"]] == [500.0, 5.0]
@@ -0,0 +1,56 @@
+import faiss
+import numpy as np
+import pytest
+
+import rag.ann
+from rag.ann import build_index, convert_index, index_settings, recall_at_k, supports_removal
+from rag.retriever import load_or_build_vector_store, read_manifest
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    data = np.random.default_rng(0).normal(size=(2000, 16)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("kind, index_type, removable", [
+    ("flat", faiss.IndexFlat, True),
+    ("ivf_flat", faiss.IndexIVFFlat, False),
+    ("hnsw", faiss.IndexHNSW, False),
+])
+def test_build_index(vectors, kind, index_type, removable):
+    index = build_index(vectors, kind)
+    assert isinstance(faiss.downcast_index(index), index_type)
+    assert index.ntotal == len(vectors)
+    assert supports_removal(index) is removable
+    assert recall_at_k(index, build_index(vectors, "flat"), vectors[:50], k=5) >= 0.8
+
+
+def test_small_ivf_falls_back_to_flat(vectors):
+    assert isinstance(faiss.downcast_index(build_index(vectors[:10], "ivf_flat")), faiss.IndexFlat)
+
+
+def test_convert_index_keeps_vector_order(vectors):
+    flat = build_index(vectors, "flat")
+    converted = convert_index(flat, "ivf_flat")
+    _, positions = converted.search(vectors[:20], 1)
+    assert (positions[:, 0] == np.arange(20)).mean() >= 0.9
+
+
+def test_unknown_index_type():
+    with pytest.raises(ValueError):
+        index_settings("lsh")
+
+
+def test_ann_index_is_rebuilt_on_change(corpus, index_dir, monkeypatch):
+    """IVF/HNSW indexes cannot remove vectors in place, so a changed file rebuilds them."""
+    monkeypatch.setattr(rag.ann, "INDEX_TYPE", "hnsw")
+    db = load_or_build_vector_store(corpus, index_dir)
+    assert not supports_removal(db.index)
+    with open(f"{corpus}/crr_capital.txt", "a", encoding="utf-8") as f:
+        f.write("\n\nArticle 62 Tier 2 items consist of capital instruments and subordinated loans.")
+    rebuilt = load_or_build_vector_store(corpus, index_dir)
+    ids = [rebuilt.index_to_docstore_id[i] for i in range(rebuilt.index.ntotal)]
+    assert ids == [chunk for entry in read_manifest(index_dir)["files"].values() for chunk in entry["chunk_ids"]]
+    (hit,) = rebuilt.similarity_search("Article 62 Tier 2 items consist of capital instruments and subordinated loans.", k=1)
+    assert "Article 62" in hit.page_content
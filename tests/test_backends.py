@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import llm.backends
+from llm.backends import ReplayChatModel, get_llm, messages_key, synthesize_response
+from llm.generator import ReportGenerator
+
+MESSAGES = [SystemMessage(content="system"), HumanMessage(content="REPORTING SCENARIO: CET1 of £150m")]
+
+
+def test_messages_key_covers_role_and_content():
+    assert messages_key(MESSAGES) == messages_key(list(MESSAGES))
+    assert messages_key(MESSAGES) != messages_key([HumanMessage(content="system"), MESSAGES[1]])
+    assert messages_key(MESSAGES) != messages_key(MESSAGES[:1])
+
+
+def test_synthesize_response():
+    fields = {f["field_code"]: f["value"] for f in json.loads(synthesize_response(MESSAGES))["fields"]}
+    assert fields == {"OF_010": 150.0, "OF_020": None, "OF_030": None, "OF_040": None}
+
+
+def test_recorded_response_is_replayed(tmp_path):
+    path = tmp_path / "responses.jsonl"
+    path.write_text(json.dumps({"key": messages_key(MESSAGES), "response": "recorded"}) + "\n", encoding="utf-8")
+    model = ReplayChatModel.from_file(str(path))
+    assert model.invoke(MESSAGES).content == "recorded"
+    assert "".join(chunk.content for chunk in model.stream(MESSAGES)) == "recorded"
+    assert model.misses == 0
+
+
+def test_miss_without_record_model_is_synthesised(tmp_path):
+    path = tmp_path / "responses.jsonl"
+    model = ReplayChatModel.from_file(str(path))
+    assert model.invoke(MESSAGES).content == synthesize_response(MESSAGES)
+    assert model.misses == 1
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_miss_is_recorded_from_the_record_model(tmp_path, run_async):
+    path = tmp_path / "replay" / "responses.jsonl"
+    record_llm = FakeListChatModel(responses=["live answer"])
+    model = ReplayChatModel.from_file(str(path), record_llm=record_llm)
+    if run_async:
+        content = asyncio.run(model.ainvoke(MESSAGES)).content
+    else:
+        content = model.invoke(MESSAGES).content
+    assert content == "live answer"
+    # A new process replays it without the record model
+    replayed = ReplayChatModel.from_file(str(path))
+    assert replayed.invoke(MESSAGES).content == "live answer"
+    assert replayed.misses == 0
+
+
+def test_generator_on_replay_backend():
+    generator = ReportGenerator(llm=ReplayChatModel(), rules_first=False, cache=None, output_mode="text")
+    result = generator.generate_report("context", "CET1 of £150m, AT1 of £50m and Tier 2 of £75m")
+    assert result["success"]
+    assert {f.field_code: f.value for f in result["report"].fields} == {
+        "OF_010": 150.0, "OF_020": 50.0, "OF_030": 75.0, "OF_040": 275.0,
+    }
+
+
+def test_get_llm(monkeypatch, tmp_path):
+    with pytest.raises(ValueError, match="Unknown LLM backend"):
+        get_llm("openai")
+    monkeypatch.setattr(llm.backends, "REPLAY_PATH", str(tmp_path / "responses.jsonl"))
+    llm.backends._create_llm.cache_clear()
+    try:
+        model = get_llm("replay")
+        assert isinstance(model, ReplayChatModel)
+        # One model per process
+        assert get_llm("replay") is model
+    finally:
+        llm.backends._create_llm.cache_clear()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+import batch
+from batch import compact_output, read_checkpoint, run_batch, truncate_partial_line
+from core.schemas import COREPField, COREPReport
+
+
+class FakeGenerator:
+    """Reports CET1 = the row number; scenarios containing "fail" error."""
+
+    calls = []
+
+    async def agenerate_report(self, context, scenario):
+        FakeGenerator.calls.append(scenario)
+        if "fail" in scenario:
+            return {"error": "Generation failed: boom"}
+        value = float(scenario.split()[-1])
+        field = COREPField(field_code="OF_010", description="CET1", value=value, confidence=0.9)
+        return {"success": True, "report": COREPReport(fields=[field]), "method": "llm"}
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(batch, "load_or_build_vector_store", lambda data_dir: object())
+    monkeypatch.setattr(batch, "retrieve_relevant_context", lambda db, question: "context")
+    monkeypatch.setattr(batch, "ReportGenerator", FakeGenerator)
+    FakeGenerator.calls = []
+
+
+def write_rows(path, scenarios):
+    with open(path, "w", encoding="utf-8") as f:
+        for n, scenario in enumerate(scenarios, 1):
+            f.write(json.dumps({"id": str(n), "scenario": scenario}) + "\n")
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def run(input_path, output_path, **kwargs):
+    return asyncio.run(run_batch(str(input_path), str(output_path), concurrency=2, **kwargs))
+
+
+def test_resume_after_half_written_line(tmp_path, offline):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_rows(input_path, [f"CET1 capital is {n}" for n in (1, 2, 3)])
+    # Interrupted run: row 1 written, row 2 cut off mid-record
+    run(input_path, output_path)
+    lines = output_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    first = next(line for line in lines if json.loads(line)["id"] == "1")
+    second = next(line for line in lines if json.loads(line)["id"] == "2")
+    output_path.write_text(first + second[:len(second) // 2], encoding="utf-8")
+
+    counts = run(input_path, output_path)
+    assert counts == {"processed": 2, "skipped": 1, "failed": 0}
+    records = read_records(output_path)
+    assert sorted(record["id"] for record in records) == ["1", "2", "3"]
+    assert {record["id"]: record["report"]["fields"][0]["value"] for record in records} == {"1": 1.0, "2": 2.0, "3": 3.0}
+
+    # Nothing left to do on the next resume
+    assert run(input_path, output_path) == {"processed": 0, "skipped": 3, "failed": 0}
+
+
+def test_retry_errors_replaces_error_records(tmp_path, offline):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    write_rows(input_path, ["CET1 capital is 1", "fail", "CET1 capital is 3"])
+    assert run(input_path, output_path)["failed"] == 1
+    assert run(input_path, output_path) == {"processed": 0, "skipped": 3, "failed": 0}
+
+    write_rows(input_path, ["CET1 capital is 1", "CET1 capital is 2", "CET1 capital is 3"])
+    FakeGenerator.calls = []
+    assert run(input_path, output_path, retry_errors=True) == {"processed": 1, "skipped": 2, "failed": 0}
+    assert FakeGenerator.calls == ["CET1 capital is 2"]
+    records = read_records(output_path)
+    assert sorted(record["id"] for record in records) == ["1", "2", "3"]
+    assert not any("error" in record for record in records)
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("", ""),
+    ('{"id": "1"}\n', '{"id": "1"}\n'),
+    ('{"id": "1"}\n{"id": "2', '{"id": "1"}\n'),
+    ('{"id": "1', ""),
+    ('{"id": "1"}\n' + "x" * 70000, '{"id": "1"}\n'),
+])
+def test_truncate_partial_line(tmp_path, content, expected):
+    path = tmp_path / "out.jsonl"
+    path.write_text(content, encoding="utf-8")
+    truncate_partial_line(str(path))
+    assert path.read_text(encoding="utf-8") == expected
+
+
+def test_checkpoint_and_compaction(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"id": "a", "error": "x"}\n{"id": "b", "report": {}}\n{"id": "a", "report": {}}\n', encoding="utf-8")
+    assert read_checkpoint(str(path)) == {"a", "b"}
+    assert compact_output(str(path)) == 1
+    assert [record["id"] for record in read_records(path)] == ["b", "a"]
+    assert read_checkpoint(str(tmp_path / "missing.jsonl")) == set()
@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from rag.context import (
+    MIN_PARTIAL_TOKENS, Passage, build_context, count_tokens, drop_near_duplicates, join_passages, merge_chunks,
+)
+
+TEXT = (
+    "Article 92 Own funds requirements. Institutions shall at all times satisfy the own funds requirements. "
+    "The CET1 capital ratio is CET1 capital expressed as a percentage of the total risk exposure amount. "
+    "The Tier 1 capital ratio is Tier 1 capital expressed as a percentage of the total risk exposure amount."
+)
+
+
+def chunk(start, end, source="crr.txt", text=TEXT):
+    return Document(page_content=text[start:end], metadata={"source": source, "start_index": start})
+
+
+def test_overlapping_and_adjacent_chunks_are_merged():
+    # Ranked: middle chunk first, then the overlapping start, then an adjacent tail
+    docs = [chunk(90, 200), chunk(0, 120), chunk(201, len(TEXT))]
+    (passage,) = merge_chunks(docs)
+    assert passage.text == TEXT[:200] + "\n" + TEXT[201:]
+    assert (passage.start, passage.end, passage.rank) == (0, len(TEXT), 0)
+
+
+def test_distant_chunks_and_other_sources_stay_apart():
+    docs = [chunk(150, 250), chunk(0, 50), chunk(0, 50, source="other.txt"), Document(page_content="No offsets")]
+    passages = merge_chunks(docs)
+    assert [p.rank for p in passages] == [0, 1, 2, 3]
+    assert passages[3] == Passage("Regulatory Text", -1, len("No offsets") - 1, "No offsets", 3)
+
+
+def test_near_duplicates_keep_the_better_ranked():
+    first = Passage("a.txt", 0, 10, TEXT, 0)
+    copy = Passage("b.txt", 0, 10, TEXT.replace("Institutions", "institutions"), 1)
+    other = Passage("c.txt", 0, 10, "Tier 2 items consist of subordinated loans.", 2)
+    assert drop_near_duplicates([first, copy, other]) == [first, other]
+
+
+def test_context_fits_the_budget():
+    docs = [chunk(0, len(TEXT), source=f"doc{n}.txt", text=TEXT.replace("92", str(n))) for n in range(20)]
+    result = build_context(docs, budget=200)
+    assert result.tokens <= 200
+    assert result.text == join_passages(result.passages)
+    assert result.tokens_saved == result.raw_tokens - result.tokens > 0
+
+
+def test_long_passage_is_cut_at_a_sentence():
+    result = build_context([chunk(0, len(TEXT))], budget=MIN_PARTIAL_TOKENS + 15)
+    (passage,) = result.passages
+    assert passage.text.endswith(".")
+    assert TEXT.startswith(passage.text) and passage.text != TEXT
+    assert result.tokens <= MIN_PARTIAL_TOKENS + 15
+
+
+def test_small_budget_skips_long_passage_but_keeps_short_ones():
+    short = Document(page_content="CET1 is Common Equity Tier 1.", metadata={"source": "glossary.txt"})
+    budget = count_tokens(join_passages([short])) + 5
+    result = build_context([chunk(0, len(TEXT)), short], budget=budget)
+    assert [p.source for p in result.passages] == ["glossary.txt"]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from rag.embeddings import CachedEmbeddings, EmbeddingCache, text_hash
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite"))
+
+
+def test_duplicates_are_encoded_once_and_order_kept(encoder):
+    embeddings = CachedEmbeddings()
+    texts = ["tier one", "tier two", "tier one", "own funds"]
+    vectors = embeddings.embed_array(texts)
+    assert encoder.encoded == ["tier one", "tier two", "own funds"]
+    assert vectors.dtype == np.float32 and vectors.flags["C_CONTIGUOUS"]
+    assert vectors.shape == (4, 64)
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_array_equal(vectors[3], encoder(["own funds"])[0])
+
+
+def test_cached_texts_are_not_encoded_again(encoder, cache):
+    first = CachedEmbeddings(cache=cache).embed_array(["tier one", "tier two"])
+    encoder.encoded.clear()
+    # A new instance, as in a new process, reads the same cache
+    second = CachedEmbeddings(cache=cache).embed_array(["tier two", "own funds", "tier one"])
+    assert encoder.encoded == ["own funds"]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[2], first[0])
+
+
+def test_cache_is_keyed_by_model(encoder, cache):
+    CachedEmbeddings(model_name="model-a", cache=cache).embed_array(["tier one"])
+    encoder.encoded.clear()
+    CachedEmbeddings(model_name="model-b", cache=cache).embed_array(["tier one"])
+    assert encoder.encoded == ["tier one"]
+
+
+def test_queries_bypass_the_persistent_cache(encoder, cache):
+    CachedEmbeddings(cache=cache).embed_query("what is CET1?")
+    assert cache.get_many("sentence-transformers/all-MiniLM-L6-v2", [text_hash("what is CET1?")]) == {}
+
+
+def test_get_many_beyond_sqlite_parameter_limit(cache):
+    vectors = {text_hash(str(n)): np.full(4, n, dtype=np.float32) for n in range(1200)}
+    cache.put_many("model", vectors.items())
+    found = cache.get_many("model", list(vectors) + ["missing"])
+    assert len(found) == 1200
+    np.testing.assert_array_equal(found[text_hash("7")], vectors[text_hash("7")])
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import List
+
+import httpx
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import llm.generator as generator_module
+from llm.backends import synthesize_response
+from llm.generator import BACKOFF_MAX, ReportGenerator, _retry_delay
+
+
+class ProviderError(Exception):
+    """Stands in for a provider SDK error carrying the HTTP status and response."""
+
+    def __init__(self, status_code: int, retry_after: str = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = httpx.Response(status_code, headers=headers)
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Answers with synthesize_response after delay seconds, raising the
+    queued errors first. Records call start times and peak concurrency.
+    """
+
+    delay: float = 0.0
+    errors: List[Exception] = []
+    calls: List[float] = []
+    in_flight: int = 0
+    peak: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls.append(time.monotonic())
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=synthesize_response(messages)))])
+        finally:
+            self.in_flight -= 1
+
+
+def make_generator(**kwargs):
+    model = FakeChatModel(**kwargs)
+    return ReportGenerator(llm=model, rules_first=False, cache=None, output_mode="text"), model
+
+
+def scenario(cet1):
+    return f"CET1 capital of £{cet1}m, AT1 of £10m and Tier 2 of £5m."
+
+
+def cet1(result):
+    return next(field.value for field in result["report"].fields if field.field_code == "OF_010")
+
+
+@pytest.mark.parametrize("limit", [1, 3, 8])
+def test_generate_many_bounds_concurrency_and_keeps_order(limit):
+    generator, model = make_generator(delay=0.01)
+    results = asyncio.run(generator.generate_many([scenario(n) for n in range(1, 11)], "context", max_concurrency=limit))
+    assert [cet1(result) for result in results] == [float(n) for n in range(1, 11)]
+    assert model.peak == limit
+    assert len(model.calls) == 10
+
+
+def test_rate_limit_waits_for_retry_after():
+    generator, model = make_generator(errors=[ProviderError(429, retry_after="0.2")])
+    result = asyncio.run(generator.agenerate_report("context", scenario(100)))
+    assert result["success"]
+    assert cet1(result) == 100.0
+    assert len(model.calls) == 2
+    assert model.calls[1] - model.calls[0] >= 0.2
+
+
+def test_rate_limit_pauses_calls_that_start_during_backoff():
+    generator, model = make_generator(errors=[ProviderError(429, retry_after="0.3")])
+
+    async def run():
+        async def later():
+            await asyncio.sleep(0.05)
+            return await generator.agenerate_report("context", scenario(2))
+
+        return await asyncio.gather(generator.agenerate_report("context", scenario(1)), later())
+
+    results = asyncio.run(run())
+    assert [cet1(result) for result in results] == [1.0, 2.0]
+    failed_at, *later_calls = model.calls
+    # The second request started during the first one's backoff and waited too
+    assert all(start - failed_at >= 0.3 for start in later_calls)
+
+
+def test_non_retryable_error_is_not_retried():
+    generator, model = make_generator(errors=[ProviderError(400)])
+    result = asyncio.run(generator.agenerate_report("context", scenario(100)))
+    assert "HTTP 400" in result["error"]
+    assert len(model.calls) == 1
+
+
+def test_retries_stop_after_max_retries(monkeypatch):
+    monkeypatch.setattr(generator_module, "MAX_RETRIES", 2)
+    generator, model = make_generator(errors=[ProviderError(503, retry_after="0")] * 5)
+    result = asyncio.run(generator.agenerate_report("context", scenario(100)))
+    assert "HTTP 503" in result["error"]
+    assert len(model.calls) == 3
+
+
+@pytest.mark.parametrize("error, attempt, low, high", [
+    (ProviderError(429, retry_after="5"), 0, 5.0, 5.0),
+    (ProviderError(429, retry_after="1.5"), 3, 1.5, 1.5),
+    (ProviderError(429, retry_after="100000"), 0, BACKOFF_MAX, BACKOFF_MAX),
+    # Without a usable header: jittered exponential backoff
+    (ProviderError(429), 2, 2.0, 4.0),
+    (ProviderError(503, retry_after="soon"), 0, 0.5, 1.0),
+    (ProviderError(500), 20, BACKOFF_MAX / 2, BACKOFF_MAX),
+    (APIConnectionError("reset"), 1, 1.0, 2.0),
+])
+def test_retry_delay(error, attempt, low, high):
+    assert low <= _retry_delay(error, attempt) <= high
+
+
+@pytest.mark.parametrize("error", [ProviderError(400), ProviderError(401), ValueError("bad"), RuntimeError()])
+def test_retry_delay_not_retryable(error):
+    assert _retry_delay(error, 0) is None
@@ -0,0 +1,108 @@
+import math
+
+import pytest
+
+from core.history import HistoryStore
+from core.schemas import COREPField, COREPReport
+
+
+def report(cet1, at1=10.0, tier2=5.0):
+    fields = [
+        COREPField(field_code="OF_010", description="CET1", value=cet1, confidence=0.9),
+        COREPField(field_code="OF_020", description="AT1", value=at1, confidence=0.9),
+        COREPField(field_code="OF_030", description="Tier 2", value=tier2, confidence=0.9),
+    ]
+    return COREPReport(template="C 01.00", fields=fields)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    yield store
+    store.close()
+
+
+def test_add_and_get_round_trip(store):
+    original = report(100.0, at1=None)
+    report_id = store.add(original, entity="Bank A", reference_date="2025-03-31", scenario="Q1")
+    assert store.get(report_id) == original
+    assert store.get(report_id + 1) is None
+    assert store.entities() == ["Bank A"]
+
+
+def test_query_keeps_latest_submission(store):
+    store.add(report(100.0), "Bank A", "2025-03-31")
+    store.add(report(120.0), "Bank A", "2025-03-31")
+    store.add(report(90.0), "Bank B", "2025-03-31")
+
+    latest = store.query()
+    assert latest[["entity", "OF_010"]].values.tolist() == [["Bank A", 120.0], ["Bank B", 90.0]]
+    assert len(store.query(all_submissions=True)) == 3
+    assert store.query(entity="Bank B")["OF_010"].tolist() == [90.0]
+    assert math.isnan(store.query()["OF_040"][0])
+
+
+def test_query_date_range(store):
+    for quarter, day in enumerate(["2025-03-31", "2025-06-30", "2025-09-30"]):
+        store.add(report(100.0 + quarter), "Bank A", day)
+    frame = store.query(start="2025-04-01", end="2025-09-30")
+    assert frame["reference_date"].tolist() == ["2025-06-30", "2025-09-30"]
+
+
+def test_invalid_reference_date(store):
+    with pytest.raises(ValueError):
+        store.add(report(100.0), "Bank A", "31/03/2025")
+
+
+def test_movements(store):
+    store.add_many(
+        [report(100.0), report(110.0), report(80.0)],
+        ["Bank A", "Bank A", "Bank B"],
+        ["2025-03-31", "2025-06-30", "2025-06-30"],
+    )
+    frame = store.movements()
+    bank_a = frame[frame["entity"] == "Bank A"]
+    assert math.isnan(bank_a["OF_010_change"].iloc[0])
+    assert bank_a["OF_010_change"].iloc[1] == pytest.approx(10.0)
+    assert bank_a["OF_010_pct"].iloc[1] == pytest.approx(0.1)
+    # First period of another entity has no previous value
+    assert math.isnan(frame[frame["entity"] == "Bank B"]["OF_010_prev"].iloc[0])
+
+
+def test_outliers_flag_unusual_movement(store):
+    entities = [f"Bank {n}" for n in range(6)]
+    for entity in entities:
+        store.add(report(100.0), entity, "2025-03-31")
+    for n, entity in enumerate(entities):
+        store.add(report(300.0 if n == 4 else 101.0 + n * 0.5), entity, "2025-06-30")
+
+    flagged = store.outliers(fields=["OF_010"])
+    assert flagged["entity"].tolist() == ["Bank 4"]
+    assert flagged["change_pct"].iloc[0] == pytest.approx(2.0)
+
+
+def test_outliers_with_identical_movements(store):
+    entities = [f"Bank {n}" for n in range(6)]
+    for entity in entities:
+        store.add(report(100.0), entity, "2025-03-31")
+    # Four movements of exactly +10%: the MAD is 0
+    changes = {"Bank 4": 110.5, "Bank 5": 150.0}
+    for entity in entities:
+        store.add(report(changes.get(entity, 110.0)), entity, "2025-06-30")
+
+    # Half a point off the others is not an outlier; +50% is
+    flagged = store.outliers(fields=["OF_010"])
+    assert flagged["entity"].tolist() == ["Bank 5"]
+    assert flagged["score"].iloc[0] == pytest.approx(0.6745 * 0.4 / 0.01)
+    assert store.outliers(fields=["OF_010"], mad_floor=0).empty
+
+
+def test_diff(store):
+    first = store.add(report(100.0), "Bank A", "2025-03-31")
+    second = store.add(report(100.0, at1=None, tier2=7.0), "Bank A", "2025-06-30")
+    frame = store.diff(first, second).set_index("field_code")
+    assert frame.loc["OF_010", "change"] == 0
+    assert frame.loc["OF_030", "change"] == pytest.approx(2.0)
+    assert math.isnan(frame.loc["OF_020", "after"])
+    with pytest.raises(KeyError):
+        store.diff(first, 999)
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from rag.loader import CHUNK_SIZE, batched, chunk_id, hash_file, iter_chunk_batches, iter_file_chunks, list_source_files
+from tests.conftest import write_corpus
+
+LONG_CORPUS = {
+    f"part_{n}.txt": "\n\n".join(f"Paragraph {n}.{p}: " + "own funds requirement " * 12 for p in range(8))
+    for n in range(5)
+}
+
+
+@pytest.fixture
+def long_corpus(tmp_path):
+    data_dir = str(tmp_path / "regulatory")
+    write_corpus(data_dir, LONG_CORPUS)
+    return data_dir
+
+
+def files(data_dir):
+    return [(path, None) for path in list_source_files(data_dir)]
+
+
+def test_list_source_files_is_sorted_and_recursive(corpus):
+    assert [os.path.relpath(path, corpus) for path in list_source_files(corpus)] == [
+        os.path.normpath("corep/instructions.txt"), "crr_capital.txt",
+    ]
+
+
+def test_iter_file_chunks(long_corpus):
+    results = list(iter_file_chunks(files(long_corpus), long_corpus, workers=1))
+    assert [relpath for relpath, *_ in results] == sorted(LONG_CORPUS)
+    for relpath, file_hash, chunks, ids in results:
+        assert file_hash == hash_file(os.path.join(long_corpus, relpath))
+        assert ids == [chunk_id(relpath, file_hash, i) for i in range(len(chunks))]
+        assert len(chunks) > 1
+        assert all(len(chunk.page_content) <= CHUNK_SIZE for chunk in chunks)
+
+
+def test_process_pool_matches_in_process(long_corpus):
+    def flatten(results):
+        return [(relpath, ids, [c.page_content for c in chunks]) for relpath, _, chunks, ids in results]
+
+    serial = flatten(iter_file_chunks(files(long_corpus), long_corpus, workers=1))
+    parallel = flatten(iter_file_chunks(files(long_corpus), long_corpus, workers=2))
+    assert parallel == serial
+
+
+def test_iter_chunk_batches(long_corpus):
+    batches = list(iter_chunk_batches(long_corpus, batch_size=7, workers=1))
+    all_ids = [i for _, ids in batches for i in ids]
+    assert all(len(ids) == 7 for _, ids in batches[:-1])
+    assert 0 < len(batches[-1][1]) <= 7
+    assert len(all_ids) == len(set(all_ids))
+    assert all(len(chunks) == len(ids) for chunks, ids in batches)
+
+
+def test_chunk_ids_change_with_content(corpus):
+    path = os.path.join(corpus, "crr_capital.txt")
+    ((_, _, _, before),) = iter_file_chunks([(path, None)], corpus, workers=1)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(" Amended.")
+    ((_, _, _, after),) = iter_file_chunks([(path, None)], corpus, workers=1)
+    assert len(before) == len(after)
+    assert not set(before) & set(after)
+
+
+@pytest.mark.parametrize("items, size, expected", [
+    (range(5), 2, [[0, 1], [2, 3], [4]]),
+    (range(4), 2, [[0, 1], [2, 3]]),
+    ([], 3, []),
+])
+def test_batched(items, size, expected):
+    assert list(batched(items, size)) == expected
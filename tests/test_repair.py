@@ -0,0 +1,71 @@
+import pytest
+
+from llm.repair import RepairError, _close_brackets, load_json, parse_fields_reply, validate_fields
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', ('{"a": 1}', False)),
+    ('{"a": 1} trailing prose', ('{"a": 1}', False)),
+    ('{"a": "}"}', ('{"a": "}"}', False)),
+    ('{"a": {"b": 1', ('{"a": {"b": 1}}', True)),
+    ('{"a": [1, 2', ('{"a": [1, 2]}', True)),
+    ('{"a": "abc', ('{"a": "abc"}', True)),
+    ('{"a": "x\\"y', ('{"a": "x\\"y"}', True)),
+    ('{"a": 1,', ('{"a": 1}', True)),
+    ('{"a": 1, "b":', ('{"a": 1}', True)),
+    ('{"a": 1, "b"', ('{"a": 1}', True)),
+    # A field object cut short is dropped whole: "5" may be the start of "50"
+    (
+        '{"fields": [{"field_code": "OF_010", "value": 150}, {"field_code": "OF_020", "value": 5',
+        ('{"fields": [{"field_code": "OF_010", "value": 150}]}', True),
+    ),
+    ('{"fields": [{"field_code": "OF_010", "va', ('{"fields": []}', True)),
+])
+def test_close_brackets(text, expected):
+    assert _close_brackets(text) == expected
+
+
+def test_close_brackets_rejects_mismatched_brackets():
+    with pytest.raises(RepairError):
+        _close_brackets('{"a": 1]')
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', ({"a": 1}, False)),
+    ('Here is the JSON:\n```json\n{"a": 1}\n```', ({"a": 1}, False)),
+    ('```json\n{"a": 1,}\n```', ({"a": 1}, True)),
+    ('{"a": [1, 2,]}', ({"a": [1, 2]}, True)),
+    ('{"a": None, "b": True, // comment\n "c": NaN}', ({"a": None, "b": True, "c": None}, True)),
+    ('{"a": "None // not a comment"}', ({"a": "None // not a comment"}, False)),
+    ('{"a": [1, 2,', ({"a": [1, 2]}, True)),
+    (
+        '{"template": "C 01.00", "fields": [{"field_code": "OF_010"},]}',
+        ({"template": "C 01.00", "fields": [{"field_code": "OF_010"}]}, True),
+    ),
+])
+def test_load_json(text, expected):
+    assert load_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["no json here", "[1, 2]", "{'a': 1}", '{"a": 1]'])
+def test_load_json_errors(text):
+    with pytest.raises(RepairError):
+        load_json(text)
+
+
+def test_validate_fields_keeps_valid_fields_and_reports_the_rest():
+    entries = [
+        {"field_code": "OF_010", "description": "CET1", "value": 150},
+        {"field_code": "OF_020", "description": "AT1", "value": -5},
+        "not an object",
+    ]
+    valid, failed = validate_fields(entries, expected=["OF_010", "OF_020", "OF_030"])
+    assert [field.field_code for field in valid] == ["OF_010"]
+    assert sorted(failed) == ["OF_020", "OF_030", "fields[2]"]
+    assert failed["OF_030"] == "missing from response"
+
+
+def test_parse_fields_reply():
+    assert parse_fields_reply('{"fields": [{"field_code": "OF_020"}]}') == [{"field_code": "OF_020"}]
+    assert parse_fields_reply('{"template": "C 01.00"}') is None
+    assert parse_fields_reply("Sorry, I cannot help") is None
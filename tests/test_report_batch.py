@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from core.batch import JSON_BLOCK, ReportBatch
+from core.schemas import COREPField, COREPReport
+
+
+def reports(count):
+    result = []
+    for n in range(count):
+        fields = [
+            COREPField(field_code="OF_010", description="CET1", value=float(n), confidence=0.9, source_rule="Article 26"),
+            COREPField(field_code="OF_020", description="AT1", value=None if n % 3 else 1.5, justification='Said "1.5"\n'),
+        ]
+        if n % 2:
+            # Not every report has every field
+            fields.append(COREPField(field_code="OF_030", description="Tier 2", value=2.0, confidence=0.5))
+        result.append(COREPReport(template="C 01.00", fields=fields))
+    return result
+
+
+def test_iter_json_matches_model_dump_json():
+    originals = reports(JSON_BLOCK + 3)
+    batch = ReportBatch.from_reports(originals)
+    assert list(batch.iter_json()) == [report.model_dump_json() for report in originals]
+
+
+def test_iter_json_escaping_and_number_format():
+    description = "CET1 {capital} \\ \u00e9"
+    originals = [
+        COREPReport(template="C 01.00", fields=[
+            COREPField(field_code="OF_010", description=description, value=1e16, confidence=1e-7,
+                       justification="Tab\tbrace {0} \u2028 \U0001f600 \x7f", source_rule="£ {}"),
+        ]),
+        COREPReport(template="C 02.00", fields=[]),
+        COREPReport(template="C 01.00", fields=[
+            COREPField(field_code="OF_010", description=description, value=0.1 + 0.2, confidence=1.0),
+        ]),
+    ]
+    batch = ReportBatch.from_reports(originals)
+    assert list(batch.iter_json()) == [report.model_dump_json() for report in originals]
+    assert list(ReportBatch.from_reports(originals[1:2]).iter_json()) == [originals[1].model_dump_json()]
+
+
+def test_jsonl_round_trip(tmp_path):
+    originals = reports(10)
+    path = tmp_path / "reports.jsonl"
+    with open(path, "w", encoding="utf-8") as out:
+        assert ReportBatch.from_reports(originals).to_jsonl(out) == 10
+    with open(path, encoding="utf-8") as f:
+        restored = ReportBatch.from_jsonl(f)
+    assert list(restored) == originals
+
+
+def test_columns():
+    batch = ReportBatch.from_reports(reports(4))
+    assert batch.codes == ["OF_010", "OF_020", "OF_030"]
+    assert batch.present[:, 2].tolist() == [False, True, False, True]
+    assert np.isnan(batch.values[1, 1])
+    assert batch.is_empty().tolist() == [False] * 4
+    assert batch.confidence_scores()[0] == pytest.approx(0.45)
+    assert batch.to_frame().columns.tolist() == ["OF_010", "OF_020", "OF_030"]
+
+
+def test_empty_batch():
+    batch = ReportBatch.from_reports([])
+    assert len(batch) == 0
+    assert list(batch.iter_json()) == []
@@ -0,0 +1,84 @@
+import itertools
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from core.schemas import COREPField, COREPReport
+from llm.backends import synthesize_response
+from llm.generator import ReportGenerator
+from llm.response_cache import ResponseCache
+from rag.embeddings import CachedEmbeddings
+
+SCENARIO = "CET1 capital of £150m held at year end"
+
+
+def report(value):
+    return COREPReport(fields=[COREPField(field_code="OF_010", description="CET1", value=value, confidence=0.9)])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.sqlite"))
+
+
+def test_exact_hit_on_normalised_scenario(cache):
+    cache.put(SCENARIO, "context", "v1", "model", report(150.0))
+    hit, level = cache.get("  cet1 capital of £150M   held at year end ", "context", "v1", "model")
+    assert level == "exact"
+    assert hit.fields[0].value == 150.0
+    assert cache.stats() == {"hits": 1, "misses": 0, "size": 1, "max_entries": cache.max_entries}
+
+
+@pytest.mark.parametrize("context, prompt_version, model", [
+    ("other context", "v1", "model"),
+    ("context", "v2", "model"),
+    ("context", "v1", "other-model"),
+])
+def test_keyed_by_context_prompt_and_model(cache, context, prompt_version, model):
+    cache.put(SCENARIO, "context", "v1", "model", report(150.0))
+    assert cache.get(SCENARIO, context, prompt_version, model) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path).put(SCENARIO, "context", "v1", "model", report(150.0))
+    assert ResponseCache(path).get(SCENARIO, "context", "v1", "model") is not None
+
+
+def test_expired_and_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_entries=2, max_age=100)
+    now = time.time()
+    clock = itertools.count()
+    monkeypatch.setattr(time, "time", lambda: now + next(clock))
+    cache.put("CET1 of £1m", "context", "v1", "model", report(1.0))
+    cache.put("CET1 of £2m", "context", "v1", "model", report(2.0))
+    # Touch the first entry so the second is least recently used
+    assert cache.get("CET1 of £1m", "context", "v1", "model") is not None
+    cache.put("CET1 of £3m", "context", "v1", "model", report(3.0))
+    assert cache.get("CET1 of £2m", "context", "v1", "model") is None
+    assert cache.stats()["size"] == 2
+
+    monkeypatch.setattr(time, "time", lambda: now + 200)
+    assert cache.get("CET1 of £1m", "context", "v1", "model") is None
+
+
+def test_similar_scenarios_hit_only_with_the_same_amounts(tmp_path, encoder):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), embeddings=CachedEmbeddings(), similarity_threshold=0.5)
+    cache.put(SCENARIO, "context", "v1", "model", report(150.0))
+    hit, level = cache.get("CET1 capital of £150m held at the year end", "context", "v1", "model")
+    assert level == "similar" and hit.fields[0].value == 150.0
+    assert cache.get("CET1 capital of £160m held at year end", "context", "v1", "model") is None
+
+
+def test_generator_answers_repeats_from_the_cache(cache):
+    llm = FakeListChatModel(responses=[synthesize_response([HumanMessage(content=SCENARIO)]), "not called"])
+    generator = ReportGenerator(llm=llm, rules_first=False, cache=cache, output_mode="text")
+    first = generator.generate_report("context", SCENARIO)
+    second = generator.generate_report("context", SCENARIO.upper())
+    assert not first.get("cached")
+    assert second["cached"] and second["cache_level"] == "exact"
+    assert second["report"].fields[0].value == 150.0
+    assert llm.i == 1
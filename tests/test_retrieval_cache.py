@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from rag.retriever import load_or_build_vector_store, retrieval_cache_stats, retrieve_documents
+from utils.cache import TTLCache
+
+
+@pytest.fixture
+def db(corpus, index_dir):
+    return load_or_build_vector_store(corpus, index_dir)
+
+
+def test_repeated_query_is_served_from_cache(db, encoder):
+    first = retrieve_documents(db, "What are Additional Tier 1 items?", k=2)
+    encoded = len(encoder.encoded)
+    # Same query up to case and whitespace
+    second = retrieve_documents(db, "  what are additional   tier 1 items? ", k=2)
+    assert [d.id for d in second] == [d.id for d in first]
+    assert len(encoder.encoded) == encoded
+    assert retrieval_cache_stats()["retrieval"]["hits"] == 1
+
+
+def test_cache_is_keyed_by_k_and_index_version(db, encoder):
+    retrieve_documents(db, "Common Equity Tier 1 items", k=1)
+    assert len(retrieve_documents(db, "Common Equity Tier 1 items", k=2)) == 2
+    db.index_version = "new-version"
+    encoded = len(encoder.encoded)
+    retrieve_documents(db, "Common Equity Tier 1 items", k=2)
+    # A new index version misses the result cache but reuses the query embedding
+    assert retrieval_cache_stats()["retrieval"]["hits"] == 0
+    assert len(encoder.encoded) == encoded
+
+
+def test_ttl_cache_expiry_and_lru(monkeypatch):
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    # "b" was least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a", "expired") == "expired"
+    assert cache.stats() == {"hits": 2, "misses": 2, "size": 1, "maxsize": 2, "hit_rate": 0.5}
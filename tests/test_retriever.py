@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+import rag.loader
+from rag.retriever import META_FILE, load_or_build_vector_store, read_manifest
+from tests.conftest import CORPUS
+from utils.tracing import trace, tracer
+
+
+def build(data_dir, index_dir):
+    """Vector store and the mode load_or_build_vector_store reported on its span."""
+    with trace("test") as root:
+        db = load_or_build_vector_store(data_dir, index_dir)
+    (current,) = [s for s in tracer.get_trace(root.trace_id) if s.name == "load_or_build_vector_store"]
+    return db, current.attributes["mode"]
+
+
+def chunk_texts(db):
+    return sorted(db.docstore.search(db.index_to_docstore_id[i]).page_content for i in range(db.index.ntotal))
+
+
+def test_first_build_is_saved(corpus, index_dir):
+    db, mode = build(corpus, index_dir)
+    assert mode == "rebuilt"
+    manifest = read_manifest(index_dir)
+    assert sorted(manifest["files"]) == sorted(os.path.normpath(path) for path in CORPUS)
+    assert manifest["key"] == db.index_version
+    assert manifest["count"] == db.index.ntotal
+
+
+def test_unchanged_corpus_is_loaded_without_embedding(corpus, index_dir, encoder):
+    built, _ = build(corpus, index_dir)
+    encoded = len(encoder.encoded)
+    loaded, mode = build(corpus, index_dir)
+    assert mode == "loaded"
+    assert len(encoder.encoded) == encoded
+    assert loaded.index_version == built.index_version
+    assert chunk_texts(loaded) == chunk_texts(built)
+    query = "Additional Tier 1 items"
+    assert [d.id for d in loaded.similarity_search(query, k=2)] == [d.id for d in built.similarity_search(query, k=2)]
+
+
+def test_settings_change_rebuilds(corpus, index_dir, monkeypatch):
+    build(corpus, index_dir)
+    monkeypatch.setattr(rag.loader, "CHUNK_SIZE", 200)
+    db, mode = build(corpus, index_dir)
+    assert mode == "rebuilt"
+    assert read_manifest(index_dir)["key"] == db.index_version
+
+
+def test_partial_save_is_not_loaded(corpus, index_dir):
+    build(corpus, index_dir)
+    os.remove(os.path.join(index_dir, META_FILE))
+    _, mode = build(corpus, index_dir)
+    assert mode == "rebuilt"
+
+
+def test_empty_corpus(tmp_path, index_dir):
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    with pytest.raises(ValueError):
+        load_or_build_vector_store(str(empty), index_dir)
+
+
+def ids_by_file(db):
+    files = {}
+    for i in range(db.index.ntotal):
+        doc_id = db.index_to_docstore_id[i]
+        files.setdefault(doc_id.split("::")[0], set()).add(doc_id)
+    return files
+
+
+def test_changed_file_is_reindexed_alone(corpus, index_dir, encoder):
+    before, _ = build(corpus, index_dir)
+    unchanged_ids = ids_by_file(before)["crr_capital.txt"]
+    changed = os.path.join(corpus, "corep", "instructions.txt")
+    with open(changed, "a", encoding="utf-8") as f:
+        f.write("\n\nRow 020 OF_020 Additional Tier 1 capital as defined in Article 61.")
+    encoder.encoded.clear()
+
+    db, mode = build(corpus, index_dir)
+    assert mode == "updated"
+    assert ids_by_file(db)["crr_capital.txt"] == unchanged_ids
+    assert all("OF_" in text for text in encoder.encoded)
+    assert any("OF_020" in text for text in chunk_texts(db))
+    # Positions still map to the right chunks after the old vectors were removed
+    (hit,) = db.similarity_search("Row 020 OF_020 Additional Tier 1 capital as defined in Article 61.", k=1)
+    assert "OF_020" in hit.page_content
+
+    reloaded, mode = build(corpus, index_dir)
+    assert mode == "loaded"
+    assert reloaded.index_version == db.index_version
+
+
+def test_added_and_deleted_files(corpus, index_dir):
+    build(corpus, index_dir)
+    os.remove(os.path.join(corpus, "crr_capital.txt"))
+    with open(os.path.join(corpus, "eba_q_and_a.txt"), "w", encoding="utf-8") as f:
+        f.write("Question 2024_7001 on the deduction of intangible assets from CET1.")
+
+    db, mode = build(corpus, index_dir)
+    assert mode == "updated"
+    assert sorted(ids_by_file(db)) == ["corep/instructions.txt", "eba_q_and_a.txt"]
+    assert sorted(read_manifest(index_dir)["files"]) == ["corep/instructions.txt", "eba_q_and_a.txt"]
+    assert db.sparse_index.doc_ids == [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.rules import Expression
+from core.templates import ValidationRule
+from core.validation import RuleEngine
+
+TOTAL = "OF_040 = OF_010 + OF_020 + OF_030"
+
+
+@pytest.mark.parametrize("source, values, expected", [
+    (TOTAL, {"OF_040": 210, "OF_010": 150, "OF_020": 50, "OF_030": 10}, True),
+    (TOTAL, {"OF_040": 210.005, "OF_010": 150, "OF_020": 50, "OF_030": 10}, True),
+    (TOTAL, {"OF_040": 211, "OF_010": 150, "OF_020": 50, "OF_030": 10}, False),
+    (TOTAL, {"OF_040": None, "OF_010": 150, "OF_020": 50, "OF_030": 10}, None),
+    (TOTAL, {"OF_010": 150}, None),
+    ("OF_010 + OF_020", {"OF_010": 1, "OF_020": 2}, 3),
+    ("-A / 2", {"A": 4}, -2),
+    ("A / B", {"A": 1, "B": 0}, None),
+    ("CA_010 <= CA_020", {"CA_010": 1, "CA_020": 2}, True),
+    ("CA_010 > CA_020", {"CA_010": 1, "CA_020": 2}, False),
+    ("A != B", {"A": 1, "B": 2}, True),
+    ("A <= B <= C", {"A": 1, "B": 2, "C": 3}, True),
+    ("A <= B <= C", {"A": 1, "B": 4, "C": 3}, False),
+])
+def test_evaluate(source, values, expected):
+    assert Expression(source).evaluate(values) == expected
+
+
+def test_fields_and_kind():
+    expression = Expression(TOTAL)
+    assert expression.fields == {"OF_010", "OF_020", "OF_030", "OF_040"}
+    assert expression.is_comparison
+    assert not Expression("OF_010 + OF_020").is_comparison
+
+
+def test_tolerance():
+    values = {"A": 100.5, "B": 100}
+    assert not Expression("A = B").evaluate(values)
+    assert Expression("A = B", tolerance=1).evaluate(values)
+
+
+def test_evaluate_columns_matches_evaluate():
+    expression = Expression("A <= B + C <= D")
+    rows = [
+        {"A": 1.0, "B": 1.0, "C": 1.0, "D": 2.0},
+        {"A": 3.0, "B": 1.0, "C": 1.0, "D": 2.0},
+        {"A": 0.0, "B": 2.0, "C": 1.0, "D": 2.0},
+    ]
+    columns = {name: np.array([row[name] for row in rows]) for name in "ABCD"}
+    assert expression.evaluate_columns(columns).tolist() == [expression.evaluate(row) for row in rows]
+
+
+def test_division_by_zero_does_not_apply_on_both_paths():
+    rule = ValidationRule(rule_id="ratio", expression="100 * A / B >= 8")
+    rows = [{"A": 10.0, "B": 100.0}, {"A": 5.0, "B": 100.0}, {"A": 10.0, "B": 0.0}, {"A": 0.0, "B": 0.0}]
+    expression = Expression(rule.expression)
+    assert [expression.evaluate(row) for row in rows] == [True, False, None, None]
+
+    violations = RuleEngine([rule]).evaluate(pd.DataFrame(rows))
+    assert violations["ratio"].tolist() == [False, True, pd.NA, pd.NA]
+
+
+def test_defined_columns():
+    columns = {"A": np.array([1.0, 1.0, 1.0]), "B": np.array([1.0, 0.0, 2.0]), "C": np.array([1.0, 1.0, 3.0])}
+    assert Expression("A / (B - C) + A / 2").defined_columns(columns).tolist() == [False, True, True]
+    assert Expression("A + B").defined_columns(columns) is True
+
+
+@pytest.mark.parametrize("source", ["A ** 2", "f(A)", "A and B", "True", '"x"', "A in B", "A is B"])
+def test_unsupported_syntax(source):
+    with pytest.raises(ValueError):
+        Expression(source)
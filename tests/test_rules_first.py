@@ -0,0 +1,32 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from llm.generator import RULES_CONFIDENCE, ReportGenerator
+
+
+@pytest.fixture
+def generator():
+    return ReportGenerator(llm=FakeListChatModel(responses=[]), rules_first=True, cache=None, output_mode="text")
+
+
+def values(report):
+    return {field.field_code: field.value for field in report.fields}
+
+
+def test_stated_amounts_are_reported_without_the_llm(generator):
+    report = generator.try_rules_report("", "CET1 capital of £150m, AT1 capital of £50m and Tier 2 capital of £75m.")
+    assert values(report) == {"OF_010": 150, "OF_020": 50, "OF_030": 75, "OF_040": 275}
+    assert report.fields[0].confidence == RULES_CONFIDENCE
+
+
+@pytest.mark.parametrize("scenario", [
+    "CET1 capital of 150-200 million, AT1 capital of 50 million and Tier 2 capital of 75 million.",
+    "CET1 capital of 150–200 million, AT1 capital of 50 million and Tier 2 capital of 75 million.",
+    "CET1 capital of 150 to 200 million, AT1 capital of 50 million and Tier 2 capital of 75 million.",
+    "CET1 capital of £150m or £200m, AT1 capital of £50m and Tier 2 capital of £75m.",
+    "CET1 capital requirement of £150m, AT1 capital of £50m and Tier 2 capital of £75m.",
+    "Minimum CET1 capital of £150m, AT1 capital of £50m and Tier 2 capital of £75m.",
+    "CET1 ratio of 12.5, AT1 capital of £50m and Tier 2 capital of £75m.",
+])
+def test_ranges_and_requirements_go_to_the_llm(generator, scenario):
+    assert generator.try_rules_report("", scenario) is None
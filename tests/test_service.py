@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag.retriever
+import service
+from llm.backends import ReplayChatModel
+from llm.generator import ReportGenerator
+
+SCENARIO = "CET1 capital of £150m, AT1 capital of £50m and Tier 2 capital of £75m."
+
+
+@pytest.fixture
+def client(corpus, index_dir, monkeypatch):
+    monkeypatch.setattr(service, "load_or_build_vector_store",
+                        lambda data_dir: rag.retriever.load_or_build_vector_store(data_dir, index_dir))
+    monkeypatch.setattr(service, "ReportGenerator",
+                        lambda: ReportGenerator(llm=ReplayChatModel(), rules_first=False, cache=None, output_mode="text"))
+    monkeypatch.setattr(service, "pipeline", service.Pipeline(corpus))
+    with TestClient(service.app) as client:
+        yield client
+
+
+def values(report):
+    return {field["field_code"]: field["value"] for field in report["fields"]}
+
+
+def test_health(client):
+    body = client.get("/health").json()
+    assert body["status"] == "ok"
+    assert body["chunks"] == service.pipeline.db.index.ntotal > 0
+    assert body["model"] == "replay"
+    assert set(body["retrieval_cache"]) == {"retrieval", "query_embeddings"}
+
+
+def test_retrieve(client):
+    body = client.post("/retrieve", json={"query": "Additional Tier 1 items", "k": 2}).json()
+    assert "Article 51" in body["text"]
+    assert body["tokens"] <= body["raw_tokens"]
+    assert client.post("/retrieve", json={"query": "x", "k": 0}).status_code == 422
+
+
+def test_generate_and_its_trace(client):
+    body = client.post("/generate", json={"scenario": SCENARIO}).json()
+    assert body["success"]
+    assert values(body["report"]) == {"OF_010": 150.0, "OF_020": 50.0, "OF_030": 75.0, "OF_040": 275.0}
+
+    stages = [row["Stage"].strip() for row in client.get(f"/traces/{body['trace_id']}").json()]
+    assert stages[0] == "service_generate"
+    assert "retrieve_documents" in stages and "llm_call" in stages
+    assert client.get("/traces/unknown").status_code == 404
+
+
+def test_generate_rejects_a_scenario_without_amounts(client):
+    assert "error" in client.post("/generate", json={"scenario": "Hello there, how are you?"}).json()
+
+
+def test_generate_stream(client):
+    with client.stream("POST", "/generate/stream", json={"scenario": SCENARIO, "context": "context"}) as response:
+        messages = [json.loads(line) for line in response.iter_lines() if line]
+    fields = [message["field"]["field_code"] for message in messages[:-1]]
+    assert fields[:3] == ["OF_010", "OF_020", "OF_030"]
+    result = messages[-1]["result"]
+    assert result["success"] and values(result["report"])["OF_040"] == 275.0
+
+
+def test_batch(client):
+    items = [{"scenario": SCENARIO, "context": "context"}, {"scenario": "too short"}]
+    body = client.post("/batch", json={"items": items, "concurrency": 2}).json()
+    assert body["failed"] == 1
+    assert body["results"][0]["success"] and "error" in body["results"][1]
+    assert len({result["trace_id"] for result in body["results"]}) == 2
+
+
+def test_metrics(client):
+    client.post("/generate", json={"scenario": SCENARIO, "context": "context"})
+    assert 'corep_span_seconds_count{span="service_generate"}' in client.get("/metrics").text
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import rag.sparse
+from rag.retriever import load_or_build_vector_store, retrieve_documents
+from rag.sparse import SparseIndex, exact_keys, reciprocal_rank_fusion, tokenize
+from utils.tracing import trace, tracer
+
+DOCS = [
+    ("a", "Article 26 Common Equity Tier 1 items consist of capital instruments."),
+    ("b", "Article 51 Additional Tier 1 items. See Article 52 for the conditions."),
+    ("c", "Row 040 OF_040 Total own funds, the sum of Tier 1 and Tier 2 capital."),
+    ("d", "Tier 2 items consist of subordinated loans; Tier 2 instruments amortise."),
+]
+
+
+@pytest.fixture
+def index():
+    return SparseIndex.build(DOCS)
+
+
+def test_tokenize():
+    assert tokenize("The OF_040 row of Article 72a") == ["of_040", "row", "article", "72a", "article:72a"]
+    assert exact_keys("Is OF_010 in Article 26 or article 26?") == ["article:26", "of_010"]
+
+
+def test_search_ranks_by_bm25(index):
+    ids = [doc_id for doc_id, _ in index.search("tier 2 subordinated", 4)]
+    assert ids[0] == "d"
+    assert [doc_id for doc_id, _ in index.search("subordinated loans", 4)] == ["d"]
+    assert index.search("liquidity coverage", 3) == []
+
+
+def test_lookup_needs_every_key(index):
+    assert [doc_id for doc_id, _ in index.lookup(["article:51", "article:52"], "additional tier 1", 3)] == ["b"]
+    assert index.lookup(["article:26", "article:51"], "tier 1", 3) == []
+    assert index.lookup(["article:99"], "tier 1", 3) == []
+    assert [doc_id for doc_id, _ in index.lookup(["of_040"], "OF_040", 3)] == ["c"]
+
+
+def test_save_and_load(index, tmp_path, monkeypatch):
+    path = str(tmp_path / "sparse.npz")
+    index.save(path)
+    loaded = SparseIndex.load(path)
+    assert loaded.doc_ids == index.doc_ids
+    np.testing.assert_array_equal(loaded.scores(["tier", "2"]), index.scores(["tier", "2"]))
+
+    monkeypatch.setattr(rag.sparse, "SPARSE_VERSION", rag.sparse.SPARSE_VERSION + 1)
+    assert SparseIndex.load(path) is None
+    assert SparseIndex.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b"]], k=60)
+    assert fused["b"] == pytest.approx(2 / 62)
+    assert fused["a"] == pytest.approx(1 / 61)
+    # Ranked by both lists beats first in only one
+    assert sorted(fused, key=fused.get, reverse=True) == ["c", "b", "a"]
+
+
+def search_mode(db, query, k=1):
+    with trace("test") as root:
+        docs = retrieve_documents(db, query, k=k)
+    (current,) = [s for s in tracer.get_trace(root.trace_id) if s.name == "retrieve_documents"]
+    return docs, current.attributes["search"]
+
+
+def test_hybrid_retrieval(corpus, index_dir):
+    db = load_or_build_vector_store(corpus, index_dir)
+    assert len(db.sparse_index) == db.index.ntotal
+
+    (doc,), mode = search_mode(db, "What does Article 51 say?")
+    assert mode == "exact" and "Article 51" in doc.page_content
+    (doc,), mode = search_mode(db, "how is OF_040 filled")
+    assert mode == "exact" and "OF_040" in doc.page_content
+
+    docs, mode = search_mode(db, "share premium accounts and retained earnings", k=2)
+    assert mode == "hybrid"
+    assert "Article 26" in docs[0].page_content
+
+    # The saved BM25 index is loaded with the vector store
+    reloaded = load_or_build_vector_store(corpus, index_dir)
+    assert reloaded.sparse_index.doc_ids == db.sparse_index.doc_ids
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from llm.generator import ReportGenerator
+from llm.streaming import MAX_PREAMBLE, MAX_TRAILER, ReportStreamParser, StreamError
+
+REPORT = json.dumps({
+    "template": "C 01.00",
+    "fields": [
+        {"field_code": "OF_010", "description": "CET1 {note}", "value": 150.0, "confidence": 0.9,
+         "justification": "Stated \"as is\" [sic]", "source_rule": "Article 26"},
+        {"field_code": "OF_020", "description": "AT1", "value": 50.0, "confidence": 0.8,
+         "justification": "", "source_rule": "Article 51"},
+    ],
+}, indent=2)
+
+
+def feed_all(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.append([field.field_code for field in parser.feed(text[start:start + size])])
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 16, len(REPORT)])
+def test_fields_are_parsed_as_their_objects_close(size):
+    parser = ReportStreamParser()
+    completed = feed_all(parser, REPORT, size)
+    assert [code for chunk in completed for code in chunk] == ["OF_010", "OF_020"]
+    assert parser.done
+    assert parser.text == REPORT
+    assert parser.fields[0].justification == 'Stated "as is" [sic]'
+
+
+def test_field_is_emitted_by_the_chunk_holding_its_closing_brace():
+    parser = ReportStreamParser()
+    first_end = REPORT.index("}", REPORT.index("Article 26")) + 1
+    assert parser.feed(REPORT[:first_end - 1]) == []
+    assert [field.field_code for field in parser.feed(REPORT[first_end - 1:first_end])] == ["OF_010"]
+
+
+@pytest.mark.parametrize("text", [
+    "Here is the report:\n```json\n" + REPORT + "\n```",
+    "   " + REPORT + "\n\n",
+])
+def test_preamble_and_trailer_within_limits(text):
+    parser = ReportStreamParser()
+    parser.feed(text)
+    assert parser.done
+    assert len(parser.fields) == 2
+
+
+def test_nested_objects_outside_fields_are_not_fields():
+    parser = ReportStreamParser()
+    parser.feed('{"meta": {"field_code": "x"}, "fields": [{"field_code": "OF_010", "description": "CET1"}]}')
+    assert [field.field_code for field in parser.fields] == ["OF_010"]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("x" * (MAX_PREAMBLE + 1) + REPORT, "No JSON object"),
+    (REPORT + "x" * (MAX_TRAILER + 1), "after the report"),
+    ('{"fields": [{"field_code": "OF_010"]', "Unbalanced"),
+    ('{"fields": [}', "Unbalanced"),
+])
+def test_malformed_output_fails_while_streaming(text, message):
+    parser = ReportStreamParser()
+    with pytest.raises(StreamError, match=message):
+        for char in text:
+            parser.feed(char)
+
+
+def test_truncated_stream_is_not_done():
+    parser = ReportStreamParser()
+    parser.feed(REPORT[:REPORT.index("OF_020")])
+    assert not parser.done
+    assert [field.field_code for field in parser.fields] == ["OF_010"]
+
+
+def test_invalid_fields_are_recorded_and_streaming_goes_on():
+    parser = ReportStreamParser()
+    text = (
+        '{"fields": [{"field_code": "OF_010", "description": "CET1", "value": -5}, {"description": "x"}, '
+        '{"field_code": "OF_020" "description"}, {"field_code": "OF_030", "description": "T2", "value": 75}]}'
+    )
+    completed = [field.field_code for char in text for field in parser.feed(char)]
+    assert completed == ["OF_030"]
+    assert parser.done
+    assert list(parser.failed) == ["OF_010", "fields[1]", "fields[2]"]
+    assert "Negative value" in parser.failed["OF_010"]
+
+
+def field(code, value):
+    return {"field_code": code, "description": code, "value": value, "confidence": 0.9, "justification": "Stated"}
+
+
+NEGATIVE_AT1 = json.dumps({"template": "C 01.00", "fields": [
+    field("OF_010", 150), field("OF_020", -50), field("OF_030", 75),
+]})
+AT1_REPLY = json.dumps({"fields": [field("OF_020", 50)]})
+
+
+def streamed(responses, run_async=False):
+    llm = FakeListChatModel(responses=responses + ["not called"])
+    generator = ReportGenerator(llm=llm, rules_first=False, cache=None, output_mode="text")
+    emitted = []
+    if run_async:
+        result = asyncio.run(generator.agenerate_report("context", "scenario", on_field=lambda f: emitted.append(f.field_code)))
+    else:
+        result = generator.generate_report("context", "scenario", on_field=lambda f: emitted.append(f.field_code))
+    return result, emitted, llm.i
+
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_invalid_streamed_field_is_asked_for_alone(run_async):
+    result, emitted, calls = streamed([NEGATIVE_AT1, AT1_REPLY], run_async)
+    # The stream and one follow-up for OF_020, not a second full completion
+    assert calls == 2
+    assert result["success"] and result["repaired"] == "retry"
+    assert emitted[:2] == ["OF_010", "OF_030"]
+    assert {f.field_code: f.value for f in result["report"].fields}["OF_020"] == 50
+
+
+def test_structural_error_falls_back_to_a_full_completion():
+    valid = json.dumps({"template": "C 01.00", "fields": [field("OF_010", 150), field("OF_020", 50), field("OF_030", 75)]})
+    result, _, calls = streamed(["x" * (MAX_PREAMBLE + 1), valid])
+    assert calls == 2
+    assert result["success"]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+from typing import List
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from core.schemas import COREPField
+from core.templates import TemplateRow, TemplateSpec, fill_derived_values, get_template, register_template
+from llm.generator import ReportGenerator
+
+
+class RecordingChatModel(FakeListChatModel):
+    """FakeListChatModel that keeps the last message of every call."""
+
+    prompts: List[str] = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(str(messages[-1].content))
+        return super()._call(messages, stop, run_manager, **kwargs)
+
+
+def field(code, value):
+    return {"field_code": code, "description": code, "value": value, "confidence": 0.9, "justification": "Stated"}
+
+
+def reports(*entries):
+    return json.dumps({"reports": [{"template": code, "fields": fields} for code, fields in entries]})
+
+
+OWN_FUNDS = [field("OF_010", 150), field("OF_020", 50), field("OF_030", 75)]
+REQUIREMENTS = [field("OFR_010", 1000), field("OFR_020", 800), field("OFR_030", 100), field("OFR_040", 100)]
+
+
+def generate(responses, *templates):
+    llm = RecordingChatModel(responses=responses + ["not called"], prompts=[])
+    generator = ReportGenerator(llm=llm, rules_first=False, cache=None, output_mode="text")
+    return generator.generate_reports("context", "scenario", list(templates)), llm
+
+
+def values(report):
+    return {f.field_code: f.value for f in report.fields}
+
+
+def test_unknown_template():
+    with pytest.raises(ValueError):
+        get_template("C 99.00")
+
+
+def test_row_codes_are_unique_across_templates():
+    with pytest.raises(ValueError):
+        register_template(TemplateSpec(code="C 98.00", name="Clash", rows=[TemplateRow(code="OF_010", description="x")]))
+
+
+def test_model_completes_rows_and_rejects_unknown_codes():
+    model = get_template("C 01.00").model
+    report = model(fields=[COREPField(field_code="OF_020", description="AT1", value=50)])
+    assert [f.field_code for f in report.fields] == ["OF_010", "OF_020", "OF_030", "OF_040"]
+    with pytest.raises(ValueError):
+        model(fields=[COREPField(field_code="XX_999", description="x")])
+
+
+def test_derived_rows_across_templates():
+    own_funds = get_template("C 01.00").model(fields=[COREPField(**f) for f in OWN_FUNDS])
+    ratios = get_template("C 03.00").model()
+    requirements = get_template("C 02.00").model(fields=[COREPField(**f) for f in REQUIREMENTS])
+    fill_derived_values({"C 01.00": own_funds, "C 02.00": requirements, "C 03.00": ratios})
+    assert values(own_funds)["OF_040"] == 275
+    assert values(ratios) == {"CA_010": 15.0, "CA_020": 20.0, "CA_030": 27.5}
+
+
+def test_generate_reports_in_one_call():
+    result, llm = generate([reports(("C 01.00", OWN_FUNDS), ("C 02.00", REQUIREMENTS))], "C 01.00", "C 02.00", "C 03.00")
+    assert result["success"] and len(llm.prompts) == 1
+    assert values(result["reports"]["C 03.00"])["CA_030"] == 27.5
+    assert result["violations"] == []
+
+
+def test_unknown_field_codes_are_dropped():
+    result, llm = generate([reports(("C 01.00", OWN_FUNDS + [field("XX_999", 1)]))], "C 01.00")
+    assert result["success"] and len(llm.prompts) == 1
+    assert list(values(result["reports"]["C 01.00"])) == ["OF_010", "OF_020", "OF_030", "OF_040"]
+
+
+def test_invalid_field_is_asked_for_again():
+    bad = [field("OF_010", 150), field("OF_020", -50), field("OF_030", 75)]
+    retry = json.dumps({"fields": [field("OF_020", 50), field("OFR_010", 1)]})
+    result, llm = generate([reports(("C 01.00", bad), ("C 02.00", REQUIREMENTS)), retry], "C 01.00", "C 02.00")
+    assert result["success"] and result["repaired"] == "retry"
+    assert len(llm.prompts) == 2
+    assert "OF_020" in llm.prompts[1] and "OFR_010" not in llm.prompts[1]
+    assert values(result["reports"]["C 01.00"])["OF_020"] == 50
+    # A reply field for another template does not overwrite its answer
+    assert values(result["reports"]["C 02.00"])["OFR_010"] == 1000
+
+
+def test_missing_template_rows_are_asked_for_again():
+    retry = json.dumps({"fields": REQUIREMENTS})
+    result, llm = generate([reports(("C 01.00", OWN_FUNDS)), retry], "C 01.00", "C 02.00")
+    assert result["success"] and len(llm.prompts) == 2
+    assert values(result["reports"]["C 02.00"])["OFR_020"] == 800
+
+
+def test_unanswered_failures_are_an_error():
+    bad = [field("OF_010", 150), field("OF_020", -50), field("OF_030", 75)]
+    result, llm = generate([reports(("C 01.00", bad)), "{}", "{}"], "C 01.00")
+    assert set(result["failed_fields"]) == {"OF_020"}
+    assert "reports" not in result
+
+
+def test_agenerate_reports():
+    llm = RecordingChatModel(responses=[reports(("C 01.00", OWN_FUNDS))], prompts=[])
+    generator = ReportGenerator(llm=llm, rules_first=False, cache=None, output_mode="text")
+    result = asyncio.run(generator.agenerate_reports("context", "scenario", ["C 01.00"]))
+    assert values(result["reports"]["C 01.00"])["OF_040"] == 275
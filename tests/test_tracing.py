@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from rag.retriever import load_or_build_vector_store
+from utils.tracing import PrometheusMetrics, current_span, span, span_rows, trace, tracer
+
+
+def names(spans):
+    return [s.name for s in spans]
+
+
+def test_spans_nest_within_a_trace():
+    with trace("request") as root:
+        with span("retrieve", k=3) as child:
+            with span("embed") as grandchild:
+                grandchild.set("texts", 2)
+            assert current_span() is child
+    spans = tracer.get_trace(root.trace_id)
+    assert names(spans) == ["request", "retrieve", "embed"]
+    assert [s.parent_id for s in spans] == [None, root.span_id, child.span_id]
+    assert spans[1].attributes == {"k": 3}
+    assert [row["Stage"] for row in span_rows(spans)] == ["request", "  retrieve", "    embed"]
+    assert all(row["Thread CPU ms"] is not None for row in span_rows(spans))
+
+
+def test_errors_are_recorded_and_reraised():
+    with pytest.raises(ValueError):
+        with trace("request") as root:
+            with span("parse"):
+                raise ValueError("bad json")
+    (_, parse) = tracer.get_trace(root.trace_id)
+    assert parse.status == "ValueError: bad json"
+    assert parse.to_dict()["status"]["code"] == "ERROR"
+
+
+def test_no_thread_cpu_time_on_the_event_loop():
+    async def request():
+        with trace("request") as root:
+            await asyncio.sleep(0)
+        return root
+
+    (root,) = tracer.get_trace(asyncio.run(request()).trace_id)
+    assert root.cpu_ms is None
+    assert "thread_cpu_ms" not in root.to_dict()["attributes"]
+
+
+def test_prometheus_metrics():
+    metrics = PrometheusMetrics()
+    with trace("request") as root:
+        with span("llm_call", prompt_tokens=100, completion_tokens=20):
+            pass
+        with span("response_cache", cache_hit=True):
+            pass
+    metrics.export(tracer.get_trace(root.trace_id))
+    text = metrics.render()
+    assert 'corep_span_seconds_count{span="llm_call"} 1' in text
+    assert 'corep_tokens_total{span="llm_call",kind="prompt"} 100' in text
+    assert 'corep_cache_lookups_total{span="response_cache",result="hit"} 1' in text
+    assert 'corep_span_thread_cpu_seconds_total{span="request"}' in text
+
+
+def index_spans(corpus, index_dir):
+    with trace("test") as root:
+        load_or_build_vector_store(corpus, index_dir)
+    return tracer.get_trace(root.trace_id)
+
+
+def test_loading_and_embedding_are_traced_on_rebuild(corpus, index_dir):
+    spans = index_spans(corpus, index_dir)
+    loads = [s for s in spans if s.name == "load_split"]
+    embedded = sum(s.attributes["texts"] for s in spans if s.name == "embed")
+    assert sum(s.attributes["chunks"] for s in loads) == embedded > 0
+    (build,) = [s for s in spans if s.name == "load_or_build_vector_store"]
+    assert all(s.parent_id == build.span_id for s in loads)
+
+    # Loading the saved index reads no source files
+    assert "load_split" not in names(index_spans(corpus, index_dir))
@@ -0,0 +1,92 @@
+"""
+HTTP client of service.py, used by the app when COREP_SERVICE_URL is set.
+Imports only httpx and the report schema, so the UI starts without
+loading torch, FAISS or LangChain.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from core.schemas import COREPField, COREPReport
+
+# Generation can wait on rate-limited LLM calls
+SERVICE_TIMEOUT = httpx.Timeout(10.0, read=300.0)
+
+
+class ServiceError(RuntimeError):
+    """The service could not be reached or rejected the request."""
+
+
+class ServiceClient:
+    def __init__(self, base_url: str, timeout: httpx.Timeout = SERVICE_TIMEOUT):
+        self._http = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Any:
+        try:
+            response = self._http.post(path, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise ServiceError(f"Service request {path} failed: {e}") from e
+        return response.json()
+
+    def health(self) -> Dict[str, Any]:
+        try:
+            response = self._http.get("/health")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise ServiceError(f"Service unavailable: {e}") from e
+        return response.json()
+
+    def retrieve(self, query: str, k: int = 3) -> Dict[str, Any]:
+        """{"text", "tokens", "raw_tokens", "tokens_saved", "trace_id"}"""
+        return self._post("/retrieve", {"query": query, "k": k})
+
+    def generate_report(
+        self, context: str, scenario: str, on_field: Optional[Callable[[COREPField], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Same result as ReportGenerator.generate_report, plus the service's
+        "trace_id". With on_field the report is streamed field by field.
+        """
+        payload = {"scenario": scenario, "context": context}
+        if on_field is None:
+            return _deserialize(self._post("/generate", payload))
+        try:
+            with self._http.stream("POST", "/generate/stream", json=payload) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if "field" in message:
+                        on_field(COREPField(**message["field"]))
+                    elif "result" in message:
+                        return _deserialize(message["result"])
+        except httpx.HTTPError as e:
+            raise ServiceError(f"Service request /generate/stream failed: {e}") from e
+        raise ServiceError("Service stream ended without a result")
+
+    def generate_batch(self, items: List[Dict[str, Any]], concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Results for items ({"scenario", "question" | "context"}), in input order."""
+        payload = {"items": items}
+        if concurrency:
+            payload["concurrency"] = concurrency
+        return [_deserialize(result) for result in self._post("/batch", payload)["results"]]
+
+    def trace_rows(self, trace_id: str) -> List[Dict[str, Any]]:
+        """Span rows (utils.tracing.span_rows) of a finished service request."""
+        try:
+            response = self._http.get(f"/traces/{trace_id}")
+            response.raise_for_status()
+        except httpx.HTTPError:
+            return []
+        return response.json()
+
+
+def _deserialize(result: Dict[str, Any]) -> Dict[str, Any]:
+    if "report" in result:
+        result["report"] = COREPReport(**result["report"])
+    if "reports" in result:
+        result["reports"] = {code: COREPReport(**report) for code, report in result["reports"].items()}
+    return result
@@ -0,0 +1,318 @@
+"""
+Lightweight tracing of the RAG + generation pipeline.
+
+    with trace("report_request") as root:
+        with span("retrieve", k=3) as s:
+            ...
+            s.set("chunk_ids", ids)
+
+Spans nest through a context variable, so they work across threads and
+asyncio tasks, and record wall time, thread CPU time and attributes such
+as token counts, cache hits and chunk ids. Thread CPU time is only
+measured for spans opened outside an event loop: on the loop thread it
+would include every other task that ran while the span awaited. When a
+root span ends its trace is kept in memory for the UI's debug panel and
+handed to the exporters:
+- COREP_TRACE_FILE: one OpenTelemetry-style JSON span per line
+- COREP_METRICS_FILE: Prometheus text format (for the node_exporter
+  textfile collector), rewritten after every trace
+COREP_TRACING=0 turns spans into no-ops.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACING_ENABLED = os.getenv("COREP_TRACING", "1") == "1"
+TRACE_FILE = os.getenv("COREP_TRACE_FILE", "")
+METRICS_FILE = os.getenv("COREP_METRICS_FILE", "")
+# Finished traces kept in memory for inspection
+TRACE_HISTORY = int(os.getenv("COREP_TRACE_HISTORY", "100"))
+
+# Wall-time histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Numeric attributes summed into Prometheus counters
+COUNTED_ATTRIBUTES = ("prompt_tokens", "completion_tokens")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("corep_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_time", "wall_ms", "cpu_ms",
+        "attributes", "status", "_start", "_cpu_start"
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.wall_ms = 0.0
+        # Thread CPU time; None on an event loop thread (see module docstring)
+        self.cpu_ms: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._start = time.perf_counter()
+        self._cpu_start = None if _in_event_loop() else time.thread_time()
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def _finish(self) -> None:
+        self.wall_ms = (time.perf_counter() - self._start) * 1000
+        if self._cpu_start is not None:
+            self.cpu_ms = (time.thread_time() - self._cpu_start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        """OpenTelemetry-style span record."""
+        start_ns = int(self.start_time * 1e9)
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": start_ns,
+            "endTimeUnixNano": start_ns + int(self.wall_ms * 1e6),
+            "attributes": {
+                **self.attributes,
+                **({"thread_cpu_ms": round(self.cpu_ms, 3)} if self.cpu_ms is not None else {}),
+            },
+            "status": {"code": "OK" if self.status == "ok" else "ERROR", "message": "" if self.status == "ok" else self.status},
+        }
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class _NoopSpan:
+    trace_id = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """Appends each finished span as one JSON line."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class PrometheusMetrics:
+    """
+    Per span name: wall time histogram, thread CPU time sum (of the spans
+    that measured it), error count, token counters and cache hit counters,
+    rendered in Prometheus text format.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._spans: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[tuple, float] = {}
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            for span in spans:
+                entry = self._spans.setdefault(
+                    span.name, {"count": 0, "errors": 0, "wall": 0.0, "cpu": None, "buckets": [0] * len(LATENCY_BUCKETS)}
+                )
+                seconds = span.wall_ms / 1000
+                entry["count"] += 1
+                entry["errors"] += span.status != "ok"
+                entry["wall"] += seconds
+                if span.cpu_ms is not None:
+                    entry["cpu"] = (entry["cpu"] or 0.0) + span.cpu_ms / 1000
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        entry["buckets"][i] += 1
+                for name in COUNTED_ATTRIBUTES:
+                    if isinstance(span.attributes.get(name), (int, float)):
+                        key = ("corep_tokens_total", span.name, name.replace("_tokens", ""))
+                        self._counters[key] = self._counters.get(key, 0) + span.attributes[name]
+                if span.attributes.get("cache_hit") is not None:
+                    key = ("corep_cache_lookups_total", span.name, "hit" if span.attributes["cache_hit"] else "miss")
+                    self._counters[key] = self._counters.get(key, 0) + 1
+            text = self._render()
+        if self.path:
+            tmp_path = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+
+    def render(self) -> str:
+        with self._lock:
+            return self._render()
+
+    def _render(self) -> str:
+        lines = [
+            "# HELP corep_span_seconds Wall time of pipeline stages.",
+            "# TYPE corep_span_seconds histogram",
+        ]
+        for name, entry in sorted(self._spans.items()):
+            for bound, count in zip(LATENCY_BUCKETS, entry["buckets"]):
+                lines.append(f'corep_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'corep_span_seconds_bucket{{span="{name}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'corep_span_seconds_sum{{span="{name}"}} {entry["wall"]:.6f}')
+            lines.append(f'corep_span_seconds_count{{span="{name}"}} {entry["count"]}')
+        lines += [
+            "# HELP corep_span_thread_cpu_seconds_total Thread CPU time of pipeline stages run outside the event loop.",
+            "# TYPE corep_span_thread_cpu_seconds_total counter",
+        ]
+        lines += [
+            f'corep_span_thread_cpu_seconds_total{{span="{name}"}} {entry["cpu"]:.6f}'
+            for name, entry in sorted(self._spans.items()) if entry["cpu"] is not None
+        ]
+        lines += ["# HELP corep_span_errors_total Failed pipeline stages.", "# TYPE corep_span_errors_total counter"]
+        lines += [f'corep_span_errors_total{{span="{name}"}} {entry["errors"]}' for name, entry in sorted(self._spans.items())]
+        for metric, kind, help_text in (
+            ("corep_tokens_total", "kind", "LLM tokens by stage and kind."),
+            ("corep_cache_lookups_total", "result", "Cache lookups by stage and result."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [
+                f'{metric}{{span="{name}",{kind}="{label}"}} {value:g}'
+                for (counter, name, label), value in sorted(self._counters.items()) if counter == metric
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Collects spans per trace and exports each trace when its root span ends."""
+
+    def __init__(self, exporters: Optional[List] = None, history: int = TRACE_HISTORY):
+        self.exporters = list(exporters or [])
+        self._open: Dict[str, List[Span]] = {}
+        self._finished: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            spans = self._open.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent_id is not None:
+                return
+            del self._open[span.trace_id]
+            self._finished[span.trace_id] = spans
+            while len(self._finished) > self._history:
+                self._finished.popitem(last=False)
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception:
+                # Telemetry must never break a request
+                pass
+
+    def get_trace(self, trace_id: Optional[str]) -> List[Span]:
+        """Spans of a finished trace, in start order."""
+        with self._lock:
+            return sorted(self._finished.get(trace_id, []), key=lambda s: s.start_time)
+
+    def last_trace(self) -> List[Span]:
+        with self._lock:
+            trace_id = next(reversed(self._finished), None)
+        return self.get_trace(trace_id) if trace_id else []
+
+
+def span_rows(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Table rows for a trace's spans, names indented by nesting depth."""
+    depth = {}
+    rows = []
+    for s in spans:
+        depth[s.span_id] = depth.get(s.parent_id, -1) + 1
+        rows.append({
+            "Stage": "  " * depth[s.span_id] + s.name,
+            "Wall ms": round(s.wall_ms, 1),
+            "Thread CPU ms": round(s.cpu_ms, 1) if s.cpu_ms is not None else None,
+            "Status": s.status,
+            "Attributes": json.dumps(s.attributes, default=str),
+        })
+    return rows
+
+
+def _default_exporters() -> List:
+    exporters = [PrometheusMetrics(METRICS_FILE or None)]
+    if TRACE_FILE:
+        exporters.append(JsonlExporter(TRACE_FILE))
+    return exporters
+
+
+tracer = Tracer(_default_exporters())
+
+
+def metrics() -> Optional[PrometheusMetrics]:
+    """The process-wide Prometheus metrics, for serving on /metrics."""
+    return next((e for e in tracer.exporters if isinstance(e, PrometheusMetrics)), None)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator:
+    """
+    Child of the current span, or a new trace's root span if there is none.
+    Exceptions are recorded on the span and re-raised; control-flow
+    exceptions that are not Exception subclasses leave the status "ok".
+    """
+    if not TRACING_ENABLED:
+        yield NOOP_SPAN
+        return
+    parent = _current.get()
+    current = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current._finish()
+        _current.reset(token)
+        tracer._record(current)
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator:
+    """Root span of a new trace, even inside another span."""
+    token = _current.set(None)
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _current.reset(token)
+
+
+def current_span():
+    """The active span, or a no-op span outside any trace."""
+    return _current.get() or NOOP_SPAN
+